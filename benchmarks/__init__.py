@@ -0,0 +1,3 @@
+"""
+Benchmarks for uvotredux, using synthetic data
+"""
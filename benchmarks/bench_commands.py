@@ -0,0 +1,83 @@
+"""
+Benchmark the overhead of each HEASoft tool call, comparing a shell per command
+(with output redirection) to the HEASoft executor, with stub tools.
+
+Usage: python -m benchmarks.bench_commands [--calls N]
+"""
+
+import argparse
+import logging
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import SWIFT_MET_START, make_uvotsource_output
+from uvotredux.utils.heasoft import get_heasoft_executor
+
+
+def get_uvotsource_argv(base_dir: Path, i: int) -> list[str]:
+    """
+    Get the arguments of a stub uvotsource call
+
+    :param base_dir: Directory for the outputs
+    :param i: Index of the call
+    :return: Tool and its arguments
+    """
+    return [
+        "uvotsource",
+        f"image={base_dir / 'UW2.fits'}",
+        f"outfile={base_dir / f'{i}.out'}",
+    ]
+
+
+def main():
+    """
+    Run the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_dir = Path(tmp_dir)
+        template_output = base_dir / "template.out"
+        make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+        with stub_tools(base_dir / "bin", template_output):
+            start = time.perf_counter()
+            for i in range(args.calls):
+                argv = get_uvotsource_argv(base_dir, i)
+                subprocess.run(
+                    f"{' '.join(argv)} > {base_dir / f'{i}.log'}",
+                    shell=True,
+                    check=True,
+                )
+            shell_time = (time.perf_counter() - start) / args.calls
+
+            executor = get_heasoft_executor()
+            start = time.perf_counter()
+            for i in range(args.calls):
+                executor.run(
+                    get_uvotsource_argv(base_dir, i),
+                    stdout_path=base_dir / f"{i}.log",
+                )
+            executor_time = (time.perf_counter() - start) / args.calls
+
+            stats = executor.summarise()["uvotsource"]
+
+    print(f"{args.calls} stub uvotsource calls")
+    print(f"shell per command: {shell_time * 1e3:.1f} ms per call")
+    print(
+        f"HEASoft executor: {executor_time * 1e3:.1f} ms per call "
+        f"({stats['mean_overhead'] * 1e3:.1f} ms not spent on CPU in the tool)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark writing and loading UVOT results in each output format.
+
+Usage: python -m benchmarks.bench_output [n_obs ...]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic import make_output_tree
+from uvotredux.uvot.output import (
+    OUTPUT_FORMATS,
+    get_results_path,
+    load_uvot_results,
+)
+from uvotredux.uvot.parse import parse_uvot_results
+
+
+def main():
+    """
+    Run the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("n_obs", type=int, nargs="*", default=[1000])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    for n_obs in args.n_obs:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = Path(tmp_dir)
+            make_output_tree(directory, n_obs=n_obs)
+
+            reference = None
+            for output_format in OUTPUT_FORMATS:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    parse_uvot_results(
+                        directory, engine="fast", output_format=output_format
+                    )
+
+                start = time.perf_counter()
+                df = load_uvot_results(directory, output_format=output_format)
+                elapsed = time.perf_counter() - start
+
+                if reference is None:
+                    reference = df
+                pd.testing.assert_frame_equal(df, reference)
+
+                size = get_results_path(directory, output_format=output_format)
+                print(
+                    f"{len(df)} rows, {output_format}: load {elapsed * 1e3:.1f} ms, "
+                    f"{size.stat().st_size / 1e6:.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark the engines used to combine uvotsource output files.
+
+Usage: python -m benchmarks.bench_parse [n_obs ...] [--workers N]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic import make_output_tree
+from uvotredux.uvot.parse import SUMMARY_COLUMNS, combine_uvot_results
+
+
+def time_engine(output_files: list[Path], **kwargs) -> tuple[float, pd.DataFrame]:
+    """
+    Time combining the output files with a given engine configuration
+
+    :param output_files: List of uvotsource output files
+    :param kwargs: Arguments for combine_uvot_results
+    :return: Elapsed time in seconds, combined DataFrame
+    """
+    start = time.perf_counter()
+    df = combine_uvot_results(output_files, **kwargs)
+    return time.perf_counter() - start, df
+
+
+def main():
+    """
+    Run the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("n_obs", type=int, nargs="*", default=[100, 1000])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    for n_obs in args.n_obs:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_files = make_output_tree(Path(tmp_dir), n_obs=n_obs)
+
+            reference_time, reference = time_engine(output_files, engine="astropy")
+            print(f"{len(output_files)} files, astropy: {reference_time:.3f}s")
+
+            configs = {
+                "fast": {"engine": "fast"},
+                f"fast, {args.workers} workers": {
+                    "engine": "fast",
+                    "workers": args.workers,
+                },
+                "fast, summary columns": {
+                    "engine": "fast",
+                    "columns": SUMMARY_COLUMNS,
+                },
+            }
+            for label, kwargs in configs.items():
+                elapsed, df = time_engine(output_files, **kwargs)
+                pd.testing.assert_frame_equal(df, reference[df.columns])
+                print(
+                    f"{len(output_files)} files, {label}: {elapsed:.3f}s "
+                    f"({reference_time / elapsed:.1f}x)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark each stage of the UVOT pipeline offline, using synthetic
+observations and stub HEASoft tools.
+
+Usage: python -m benchmarks.bench_pipeline [n_obs ...] [--latency S] [--engine E]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.download.regions import bkg_path, src_path
+from uvotredux.options import PARSE_ENGINES
+from uvotredux.uvot.manifest import get_manifest_path
+from uvotredux.uvot.output import get_results_path, write_uvot_results
+from uvotredux.uvot.parse import combine_uvot_results
+from uvotredux.uvot.reduce import unpack_single_uvot_obs, unpack_uvot_images
+
+
+def measure(func: Callable[[], Any], trace_memory: bool = True) -> tuple[dict, Any]:
+    """
+    Measure the run time and peak python memory of a function
+
+    :param func: Function without arguments
+    :param trace_memory: Whether to trace memory allocations, which slows down
+        python code
+    :return: Dictionary with time (s) and peak memory (MB), function result
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    res = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return {"time": elapsed, "peak_mb": peak}, res
+
+
+def run_benchmark(  # pylint: disable=too-many-locals
+    base_dir: Path,
+    n_obs: int,
+    latency: float = 0.0,
+    engine: str = "astropy",
+    trace_memory: bool = True,
+) -> list[dict]:
+    """
+    Run each pipeline stage on a synthetic target
+
+    :param base_dir: Empty target directory
+    :param n_obs: Number of observations
+    :param latency: Seconds each stub HEASoft call takes
+    :param engine: Engine used to parse the results
+    :param trace_memory: Whether to trace peak memory
+    :return: List of stage measurements
+    """
+    obs_dirs = make_observation_tree(base_dir, n_obs=n_obs)
+    template_output = base_dir / "template.out"
+    make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+    src_region_path, bkg_region_path = src_path(base_dir), bkg_path(base_dir)
+    manifest_path = get_manifest_path(base_dir)
+
+    results = []
+
+    def record(stage: str, func: Callable[[], Any]) -> Any:
+        stats, res = measure(func, trace_memory=trace_memory)
+        results.append({"n_obs": n_obs, "stage": stage, **stats})
+        return res
+
+    with stub_tools(base_dir / "bin", template_output, latency=latency):
+        record(
+            "unpack_uvot_images",
+            lambda: [unpack_uvot_images(x / "uvot/image") for x in obs_dirs],
+        )
+        record(
+            "unpack_single_uvot_obs",
+            lambda: [
+                unpack_single_uvot_obs(
+                    x,
+                    src_region_path=src_region_path,
+                    bkg_region_path=bkg_region_path,
+                    manifest_path=manifest_path,
+                )
+                for x in obs_dirs
+            ],
+        )
+
+    output_files = sorted(base_dir.glob("*/uvot/image/*.out"))
+    if len(output_files) != len(obs_dirs) * 3:
+        raise RuntimeError(f"Expected 3 outputs per observation in {base_dir}")
+
+    df = record(
+        "combine_uvot_results",
+        lambda: combine_uvot_results(output_files, engine=engine),
+    )
+    record(
+        "write_csv",
+        lambda: write_uvot_results(df, get_results_path(base_dir), "csv"),
+    )
+
+    for res in results:
+        res["obs_per_s"] = n_obs / res["time"]
+    return results
+
+
+def main():
+    """
+    Run the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("n_obs", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per stub HEASoft call"
+    )
+    parser.add_argument("--engine", choices=PARSE_ENGINES, default="astropy")
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Do not trace peak memory, for more accurate timings",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'n_obs':>6} {'stage':<24} {'time (s)':>9} {'obs/s':>9} {'peak MB':>8}")
+    for n_obs in args.n_obs:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = run_benchmark(
+                Path(tmp_dir),
+                n_obs=n_obs,
+                latency=args.latency,
+                engine=args.engine,
+                trace_memory=not args.no_memory,
+            )
+        for res in results:
+            peak = (
+                f"{res['peak_mb']:8.1f}" if res["peak_mb"] is not None else "       -"
+            )
+            print(
+                f"{res['n_obs']:>6} {res['stage']:<24} {res['time']:>9.3f} "
+                f"{res['obs_per_s']:>9.1f} {peak}"
+            )
+
+
+if __name__ == "__main__":
+    main()
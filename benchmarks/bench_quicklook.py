@@ -0,0 +1,115 @@
+"""
+Benchmark the quick-look photometry engine on synthetic images, or compare it
+to the uvotsource outputs of targets already reduced with HEASoft.
+
+Usage: python -m benchmarks.bench_quicklook [--images N]
+       python -m benchmarks.bench_quicklook --compare /path/to/data/AT2025mav
+"""
+
+import argparse
+import gzip
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import SOURCE_DEC, SOURCE_RA, make_sky_image
+from uvotredux.download.regions import bkg_path, create_regions, src_path
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.uvot.filters import filter_dict
+from uvotredux.uvot.parse import parse_single_uvot_results
+from uvotredux.uvot.quicklook import (
+    AB_ZERO_POINTS,
+    QUICKLOOK_TOLERANCE_MAG,
+    quicklook_photometry,
+)
+
+
+def compare_with_uvotsource(directory: Path) -> pd.DataFrame:
+    """
+    Measure each image of a reduced target with the quick-look engine,
+    and compare to the uvotsource output of the same image
+
+    :param directory: Target directory, reduced with uvotsource
+    :return: DataFrame with both magnitudes of each image
+    """
+    rows = []
+    for obs_dir in get_observation_dirs(directory):
+        for image in sorted((obs_dir / "uvot/image").glob("*_sk.img")):
+            uvot_filter = filter_dict[image.name[14:16]]
+            output_path = image.parent / f"{uvot_filter}.out"
+            if not output_path.is_file():
+                continue
+            uvotsource = parse_single_uvot_results(output_path).iloc[0]
+            quicklook = quicklook_photometry(
+                image, src_path(directory), bkg_path(directory), uvot_filter
+            )
+            rows.append(
+                {
+                    "obs_id": obs_dir.name,
+                    "filter": uvot_filter,
+                    "uvotsource": uvotsource["AB_MAG"],
+                    "quicklook": quicklook["AB_MAG"],
+                    "nsigma": quicklook["NSIGMA"],
+                }
+            )
+    df = pd.DataFrame(rows)
+    df["diff"] = df["quicklook"] - df["uvotsource"]
+    return df
+
+
+def main():
+    """
+    Run the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=2.0)
+    parser.add_argument("--compare", type=Path, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.compare is not None:
+        df = compare_with_uvotsource(args.compare)
+        detected = df[df["nsigma"] > 10.0]
+        print(df.to_string())
+        print(
+            f"{len(detected)} images with quick-look detections above 10 sigma: "
+            f"median difference {np.median(detected['diff']):.3f} mag, "
+            f"{np.mean(np.abs(detected['diff']) < QUICKLOOK_TOLERANCE_MAG):.0%} "
+            f"within {QUICKLOOK_TOLERANCE_MAG} mag"
+        )
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_dir = Path(tmp_dir)
+        create_regions(ra=SOURCE_RA, dec=SOURCE_DEC, base_dir=base_dir)
+        image = base_dir / "sw00019808000uw2_sk.img"
+        image.write_bytes(
+            gzip.decompress(make_sky_image("UVW2", source_rate=args.rate))
+        )
+
+        start = time.perf_counter()
+        for _ in range(args.images):
+            res = quicklook_photometry(
+                image, src_path(base_dir), bkg_path(base_dir), "UW2"
+            )
+        duration = (time.perf_counter() - start) / args.images
+
+    expected = AB_ZERO_POINTS["UW2"] - 2.5 * np.log10(args.rate)
+    print(f"{args.images} quick-look measurements of a 2 extension image")
+    print(f"{duration * 1e3:.1f} ms per image")
+    print(
+        f"AB_MAG {res['AB_MAG']:.3f} +/- {res['AB_MAG_ERR']:.3f}, "
+        f"injected {expected:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
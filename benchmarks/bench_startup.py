@@ -0,0 +1,74 @@
+"""
+Benchmark the startup time of the uvotredux CLI, and check which
+heavy dependencies are imported just to build it.
+
+Usage: python -m benchmarks.bench_startup [--repeats N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["astropy", "pandas", "swifttools", "requests", "numpy"]
+
+COMMANDS = {
+    "import uvotredux.cli": [sys.executable, "-c", "import uvotredux.cli"],
+    "uvotredux --help": [
+        sys.executable,
+        "-c",
+        "from uvotredux.cli import cli; cli(['--help'])",
+    ],
+    "assign_source_name": [
+        sys.executable,
+        "-c",
+        "from uvotredux.utils.name import assign_source_name; "
+        "assign_source_name(250.0767, 26.9259)",
+    ],
+}
+
+
+def get_heavy_imports() -> list[str]:
+    """
+    Get the heavy modules imported by the CLI module
+
+    :return: List of module names
+    """
+    code = (
+        "import sys, uvotredux.cli; "
+        f"print(' '.join(x for x in {HEAVY_MODULES} if x in sys.modules))"
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return res.stdout.split()
+
+
+def main():
+    """
+    Run the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = [sys.executable, "-c", "pass"]
+    for label, cmd in {"python": baseline, **COMMANDS}.items():
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            subprocess.run(cmd, capture_output=True, check=True)
+            times.append(time.perf_counter() - start)
+        print(f"{label}: median {statistics.median(times) * 1e3:.0f} ms")
+
+    heavy = get_heavy_imports()
+    print(f"Heavy modules imported by the CLI: {heavy if heavy else 'none'}")
+    if heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
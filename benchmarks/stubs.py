@@ -0,0 +1,105 @@
+"""
+Stub HEASoft tools, to run the UVOT reduction without HEASoft.
+
+The stubs mimic the command line interface of uvotimsum, uvotsource and
+xrtpipeline: uvotimsum copies the input image, uvotsource copies a template
+output table, and xrtpipeline copies a template cleaned event file, each after
+an optional latency to mimic the cost of the real tools.
+"""
+
+import contextlib
+import os
+import stat
+import sys
+from pathlib import Path
+
+STUB_LATENCY_ENV = "UVOTREDUX_STUB_LATENCY"
+STUB_TEMPLATE_ENV = "UVOTREDUX_STUB_TEMPLATE"
+STUB_XRT_TEMPLATE_ENV = "UVOTREDUX_STUB_XRT_TEMPLATE"
+
+UVOTIMSUM_STUB = """
+import os, shutil, sys, time
+
+time.sleep(float(os.environ.get("{latency_env}", "0")))
+shutil.copyfile(sys.argv[1], sys.argv[2])
+"""
+
+UVOTSOURCE_STUB = """
+import os, shutil, sys, time
+
+time.sleep(float(os.environ.get("{latency_env}", "0")))
+args = dict(x.split("=", 1) for x in sys.argv[1:] if "=" in x)
+shutil.copyfile(os.environ["{template_env}"], args["outfile"])
+print(f"uvotsource stub: {{args['image']}} -> {{args['outfile']}}")
+"""
+
+
+XRTPIPELINE_STUB = """
+import os, shutil, sys, time
+
+time.sleep(float(os.environ.get("{latency_env}", "0")))
+args = dict(x.split("=", 1) for x in sys.argv[1:] if "=" in x)
+output = os.path.join(args["outdir"], args["stemoutputs"] + "xpcw3po_cl.evt")
+shutil.copyfile(os.environ["{template_env}"], output)
+print(f"xrtpipeline stub: {{args['indir']}} -> {{output}}")
+"""
+
+
+def write_stub(path: Path, code: str):
+    """
+    Write an executable python stub, which skips site initialisation
+    to start quickly
+
+    :param path: Path of the executable
+    :param code: Python code of the stub
+    :return: None
+    """
+    path.write_text(f"#!{sys.executable} -S{code}", encoding="utf8")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+@contextlib.contextmanager
+def stub_tools(
+    bin_dir: Path,
+    template_output: Path,
+    latency: float = 0.0,
+    xrt_template: Path | None = None,
+):
+    """
+    Context manager which installs stub uvotimsum, uvotsource and xrtpipeline
+    executables, and puts them first on PATH until exiting
+
+    :param bin_dir: Directory for the executables
+    :param template_output: uvotsource output table copied by the stub
+    :param latency: Seconds each stub call takes
+    :param xrt_template: Cleaned XRT event file copied by the xrtpipeline stub
+    :return: None
+    """
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    write_stub(
+        bin_dir / "uvotimsum", UVOTIMSUM_STUB.format(latency_env=STUB_LATENCY_ENV)
+    )
+    write_stub(
+        bin_dir / "uvotsource",
+        UVOTSOURCE_STUB.format(
+            latency_env=STUB_LATENCY_ENV, template_env=STUB_TEMPLATE_ENV
+        ),
+    )
+    write_stub(
+        bin_dir / "xrtpipeline",
+        XRTPIPELINE_STUB.format(
+            latency_env=STUB_LATENCY_ENV, template_env=STUB_XRT_TEMPLATE_ENV
+        ),
+    )
+
+    original_env = os.environ.copy()
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    os.environ[STUB_LATENCY_ENV] = str(latency)
+    os.environ[STUB_TEMPLATE_ENV] = str(template_output)
+    if xrt_template is not None:
+        os.environ[STUB_XRT_TEMPLATE_ENV] = str(xrt_template)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(original_env)
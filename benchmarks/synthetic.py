@@ -0,0 +1,264 @@
+"""
+Functions to create synthetic UVOT data for benchmarks
+"""
+
+import gzip
+import io
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+
+from uvotredux.download.regions import create_regions
+
+SWIFT_MET_START = 5.0e8
+
+# Position of the synthetic source (AT2025mav)
+SOURCE_RA, SOURCE_DEC = 250.0767333333, 26.9258638889
+
+# Filter codes used in image names (see uvotredux.uvot.filters), and filter names
+IMAGE_FILTERS = {"w2": "UVW2", "m2": "UVM2", "w1": "UVW1"}
+
+# Number of additional float columns, to mimic the ~100 uvotsource columns
+N_EXTRA_COLUMNS = 90
+
+
+def get_obs_id(index: int) -> str:
+    """
+    Get a synthetic Swift observation ID
+
+    :param index: Index of the observation
+    :return: Observation ID
+    """
+    return f"{19808000 + index:011d}"
+
+
+def make_uvotsource_table(n_extra_columns: int = N_EXTRA_COLUMNS) -> fits.BinTableHDU:
+    """
+    Make a template uvotsource output table with a single row
+
+    :param n_extra_columns: Number of additional float columns
+    :return: Binary table HDU
+    """
+    cols = [
+        fits.Column(name="MET", format="D", array=[0.0]),
+        fits.Column(name="FILTER", format="8A", array=[""]),
+        fits.Column(name="RA", format="D", array=[250.0767]),
+        fits.Column(name="DEC", format="D", array=[26.9259]),
+    ]
+    cols += [
+        fits.Column(name=x, format="E", array=[0.0])
+        for x in ["EXPOSURE", "AB_MAG", "AB_MAG_ERR", "AB_MAG_LIM"]
+    ]
+    cols += [
+        fits.Column(name=f"EXTRA_{i:03d}", format="D", array=[0.0])
+        for i in range(n_extra_columns)
+    ]
+    return fits.BinTableHDU.from_columns(cols)
+
+
+def make_uvotsource_output(
+    output_path: Path,
+    met: float,
+    uvot_filter: str = "UVW2",
+    template: fits.BinTableHDU | None = None,
+):
+    """
+    Write a synthetic uvotsource output table.
+
+    Values are written into the row of a template table, which is much faster
+    than building a new table for each file.
+
+    :param output_path: Path of the output file
+    :param met: Mission elapsed time of the measurement
+    :param uvot_filter: Filter name
+    :param template: Template table (see make_uvotsource_table)
+    :return: None
+    """
+    if template is None:
+        template = make_uvotsource_table()
+
+    rng = np.random.default_rng(int(met))
+    data = template.data
+    data["MET"][0] = met
+    data["FILTER"][0] = uvot_filter
+    data["EXPOSURE"][0] = rng.uniform(50, 1500)
+    data["AB_MAG"][0] = rng.uniform(17, 21)
+    data["AB_MAG_ERR"][0] = rng.uniform(0.02, 0.3)
+    data["AB_MAG_LIM"][0] = rng.uniform(21, 22)
+    for name in data.columns.names:
+        if name.startswith("EXTRA_"):
+            data[name][0] = rng.normal()
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    template.writeto(output_path, overwrite=True)
+
+
+def make_output_tree(
+    base_dir: Path,
+    n_obs: int,
+    filters: tuple[str, ...] = ("UVW2", "UVM2", "UVW1"),
+) -> list[Path]:
+    """
+    Create a target directory with synthetic uvotsource outputs
+    for each observation and filter
+
+    :param base_dir: Target directory
+    :param n_obs: Number of observations
+    :param filters: Filters observed in each observation
+    :return: List of output files
+    """
+    template = make_uvotsource_table()
+    output_files = []
+    for i in range(n_obs):
+        image_dir = base_dir / get_obs_id(i) / "uvot/image"
+        for j, uvot_filter in enumerate(filters):
+            output_path = image_dir / f"{uvot_filter.replace('UV', 'U')}.out"
+            make_uvotsource_output(
+                output_path,
+                met=SWIFT_MET_START + i * 86400.0 + j * 300.0,
+                uvot_filter=uvot_filter,
+                template=template,
+            )
+            output_files.append(output_path)
+    return output_files
+
+
+def make_sky_image(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    uvot_filter: str,
+    n_extensions: int = 2,
+    shape: tuple[int, int] = (256, 256),
+    met: float = SWIFT_MET_START,
+    source_rate: float = 0.0,
+    source_fwhm_pix: float = 2.92,
+) -> bytes:
+    """
+    Make a synthetic gzip-compressed UVOT sky image, with one extension
+    per snapshot, and optionally a source with a Gaussian PSF at the
+    synthetic source position
+
+    :param uvot_filter: Filter name
+    :param n_extensions: Number of image extensions
+    :param shape: Shape of each image
+    :param met: Mission elapsed time of the first snapshot
+    :param source_rate: Count rate of the source, per second
+    :param source_fwhm_pix: FWHM of the source in pixels (of one arcsecond)
+    :return: Compressed FITS file contents
+    """
+    rng = np.random.default_rng(int(met))
+
+    # The source is at the reference pixel, in zero-based coordinates
+    yy, xx = np.mgrid[0 : shape[0], 0 : shape[1]]
+    sigma = source_fwhm_pix / (2.0 * np.sqrt(2.0 * np.log(2.0)))
+    psf = np.exp(
+        -((xx - shape[1] / 2 + 1) ** 2.0 + (yy - shape[0] / 2 + 1) ** 2.0)
+        / (2.0 * sigma**2.0)
+    )
+    psf /= np.sum(psf)
+
+    hdus = [fits.PrimaryHDU()]
+    for i in range(n_extensions):
+        header = fits.Header()
+        header["FILTER"] = uvot_filter
+        header["TSTART"] = met + i * 1000.0
+        header["EXPOSURE"] = 500.0
+        header["CTYPE1"], header["CTYPE2"] = "RA---TAN", "DEC--TAN"
+        header["CRVAL1"], header["CRVAL2"] = SOURCE_RA, SOURCE_DEC
+        header["CRPIX1"], header["CRPIX2"] = shape[1] / 2, shape[0] / 2
+        header["CDELT1"], header["CDELT2"] = -1.0 / 3600.0, 1.0 / 3600.0
+        data = rng.poisson(1.0, shape) + psf * source_rate * header["EXPOSURE"]
+        data = data.astype(np.float32)
+        hdus.append(fits.ImageHDU(data, header=header))
+
+    buffer = io.BytesIO()
+    fits.HDUList(hdus).writeto(buffer)
+    return gzip.compress(buffer.getvalue())
+
+
+def make_xrt_event_file(
+    output_path: Path,
+    n_src: int = 100,
+    n_bkg: int = 2000,
+    met: float = SWIFT_MET_START,
+    exposure: float = 1000.0,
+):
+    """
+    Write a synthetic cleaned XRT event file, with a source at the synthetic
+    source position and a uniform background
+
+    :param output_path: Path of the event file
+    :param n_src: Number of source events
+    :param n_bkg: Number of background events, within 200 pixels
+    :param met: Mission elapsed time of the start of the observation
+    :param exposure: Exposure in seconds
+    :return: None
+    """
+    rng = np.random.default_rng(int(met))
+    centre = 500.5
+    x = np.concatenate(
+        [rng.normal(centre, 2.0, n_src), rng.uniform(centre - 200, centre + 200, n_bkg)]
+    )
+    y = np.concatenate(
+        [rng.normal(centre, 2.0, n_src), rng.uniform(centre - 200, centre + 200, n_bkg)]
+    )
+    cols = [
+        fits.Column(
+            name="TIME", format="D", array=met + rng.uniform(0, exposure, len(x))
+        ),
+        fits.Column(name="X", format="I", array=np.round(x)),
+        fits.Column(name="Y", format="I", array=np.round(y)),
+        fits.Column(name="PI", format="J", array=rng.integers(30, 1000, len(x))),
+    ]
+    hdu = fits.BinTableHDU.from_columns(cols, name="EVENTS")
+    header = hdu.header
+    for n, crval, cdelt in [(2, SOURCE_RA, -6.548e-4), (3, SOURCE_DEC, 6.548e-4)]:
+        header[f"TCTYP{n}"] = "RA---TAN" if n == 2 else "DEC--TAN"
+        header[f"TCRPX{n}"] = centre
+        header[f"TCRVL{n}"] = crval
+        header[f"TCDLT{n}"] = cdelt
+    header["TSTART"], header["TSTOP"] = met, met + exposure
+    header["EXPOSURE"] = exposure
+    header["DATAMODE"] = "PHOTON"
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(output_path, overwrite=True)
+
+
+def make_observation_tree(
+    base_dir: Path,
+    n_obs: int,
+    filter_codes: tuple[str, ...] = tuple(IMAGE_FILTERS),
+    n_extensions: int = 2,
+    shape: tuple[int, int] = (256, 256),
+) -> list[Path]:
+    """
+    Create a target directory with region files and synthetic compressed
+    sky images for each observation and filter.
+
+    One image is generated per filter and written for every observation,
+    so that large trees are created quickly.
+
+    :param base_dir: Target directory
+    :param n_obs: Number of observations
+    :param filter_codes: Filter codes of the images in each observation
+    :param n_extensions: Number of image extensions
+    :param shape: Shape of each image
+    :return: List of observation directories
+    """
+    base_dir.mkdir(parents=True, exist_ok=True)
+    create_regions(ra=SOURCE_RA, dec=SOURCE_DEC, base_dir=base_dir)
+
+    images = {
+        code: make_sky_image(IMAGE_FILTERS[code], n_extensions, shape)
+        for code in filter_codes
+    }
+
+    obs_dirs = []
+    for i in range(n_obs):
+        obs_id = get_obs_id(i)
+        image_dir = base_dir / obs_id / "uvot/image"
+        image_dir.mkdir(parents=True, exist_ok=True)
+        for code, contents in images.items():
+            (image_dir / f"sw{obs_id}u{code}_sk.img.gz").write_bytes(contents)
+        obs_dirs.append(base_dir / obs_id)
+    return obs_dirs
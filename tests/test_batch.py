@@ -0,0 +1,160 @@
+"""
+Module for testing batch mode, offline with synthetic observations,
+stub tools and a cached TNS result
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.batch import (
+    BATCH_STATUS_COLUMNS,
+    BATCH_STATUS_NAME,
+    load_targets,
+    resolve_targets,
+    run_batch,
+)
+from uvotredux.paths import get_tns_cache_path
+from uvotredux.utils.tns import TNSCache
+
+# Name which is cached as not found in TNS, so that it is never queried
+MISSING_NAME = "AT2099zzz"
+
+
+class TestBatch(unittest.TestCase):
+    """
+    Class for testing batch mode
+    """
+
+    def setUp(self):
+        """
+        Make a data directory with a cached TNS result for MISSING_NAME
+
+        :return: None
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.base_dir = Path(self.tmp_dir.name) / "data"
+        self.base_dir.mkdir()
+        TNSCache(get_tns_cache_path(self.base_dir)).put(MISSING_NAME, None)
+
+    def tearDown(self):
+        """
+        Remove the data directory
+
+        :return: None
+        """
+        self.tmp_dir.cleanup()
+
+    def write_targets(self, text: str) -> Path:
+        """
+        Write a target list
+
+        :param text: Contents of the csv file
+        :return: Path to the csv file
+        """
+        targets_path = Path(self.tmp_dir.name) / "targets.csv"
+        targets_path.write_text(text, encoding="utf8")
+        return targets_path
+
+    def test_load_and_resolve(self):
+        """
+        Test loading and resolving targets with names and/or coordinates
+
+        :return: None
+        """
+        targets = load_targets(
+            self.write_targets(
+                f"name,ra,dec\nsn,{SOURCE_RA},{SOURCE_DEC}\n"
+                f",{SOURCE_RA},{SOURCE_DEC}\n{MISSING_NAME},,\n"
+            )
+        )
+        resolved = resolve_targets(targets, base_data_dir=self.base_dir)
+
+        self.assertEqual([x["status"] for x in resolved[:2]], ["resolved"] * 2)
+        self.assertEqual(resolved[0]["output_dir"], self.base_dir / "sn")
+        self.assertNotEqual(resolved[1]["name"], "sn")
+        self.assertEqual(resolved[1]["output_dir"].parent, self.base_dir)
+        self.assertTrue(resolved[2]["status"].startswith("unresolved"))
+
+        with self.assertRaises(ValueError):
+            load_targets(self.write_targets("name,ra\n,10.0\n"))
+
+        self.assertEqual(len(load_targets(self.write_targets("ra,dec\n"))), 0)
+        self.assertEqual(len(load_targets(self.write_targets(""))), 0)
+
+    def test_run_batch(self):
+        """
+        Test that resolved targets are reduced, and that unresolved targets
+        are reported with the same status columns
+
+        :return: None
+        """
+        make_observation_tree(self.base_dir / "sn", n_obs=1, filter_codes=("w2",))
+        template_output = Path(self.tmp_dir.name) / "template.out"
+        make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+        targets = load_targets(
+            self.write_targets(
+                f"name,ra,dec\nsn,{SOURCE_RA},{SOURCE_DEC}\n{MISSING_NAME},,\n"
+            )
+        )
+        with (
+            stub_tools(Path(self.tmp_dir.name) / "bin", template_output),
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            status = run_batch(targets, base_data_dir=self.base_dir, download=False)
+
+        self.assertEqual(list(status.columns), BATCH_STATUS_COLUMNS)
+        self.assertEqual(list(status["name"]), [MISSING_NAME, "sn"])
+        self.assertTrue(status["status"][0].startswith("unresolved"))
+        self.assertEqual(list(status["status"][1:]), ["ok"])
+        self.assertEqual(status["n_results"][1], 1)
+        self.assertTrue((self.base_dir / BATCH_STATUS_NAME).is_file())
+
+    def test_plan_batch(self):
+        """
+        Test that a planned batch records each target as planned,
+        without running anything
+
+        :return: None
+        """
+        make_observation_tree(self.base_dir / "sn", n_obs=1, filter_codes=("w2",))
+        targets = load_targets(
+            self.write_targets(f"name,ra,dec\nsn,{SOURCE_RA},{SOURCE_DEC}\n")
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = run_batch(
+                targets, base_data_dir=self.base_dir, download=False, plan=True
+            )
+
+        self.assertEqual(list(status.columns), BATCH_STATUS_COLUMNS)
+        self.assertEqual(list(status["status"]), ["planned"])
+        self.assertTrue(status["n_results"].isna().all())
+        self.assertEqual(list((self.base_dir / "sn").rglob("*.out")), [])
+
+    def test_nothing_to_run(self):
+        """
+        Test batches without any resolved targets
+
+        :return: None
+        """
+        for text in ["name\n", f"name\n{MISSING_NAME}\n"]:
+            status = run_batch(
+                load_targets(self.write_targets(text)), base_data_dir=self.base_dir
+            )
+            self.assertEqual(list(status.columns), BATCH_STATUS_COLUMNS)
+            self.assertTrue(status["run_time"].isna().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Module for testing the decompression of Swift images
+"""
+
+import gzip
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from uvotredux.utils.compression import GZIP_CHUNK_SIZE, decompress_gzip
+from uvotredux.uvot.reduce import unpack_uvot_images
+
+
+def make_gzip(path: Path, data: bytes) -> Path:
+    """
+    Write gzip compressed data
+
+    :param path: Path of the gzip file
+    :param data: Uncompressed data
+    :return: Path of the gzip file
+    """
+    with gzip.open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+class TestCompression(unittest.TestCase):
+    """
+    Class for testing decompression
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.directory = Path(self.tmp_dir.name)
+        # Several chunks, so that the data is streamed
+        self.data = np.random.default_rng(0).bytes(3 * GZIP_CHUNK_SIZE + 17)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_decompress(self):
+        """
+        Test that the output matches the source, with python and with an
+        external decompressor
+
+        :return: None
+        """
+        compressed = make_gzip(self.directory / "image_sk.img.gz", self.data)
+        output_path = self.directory / "image_sk.img"
+
+        decompress_gzip(compressed, output_path)
+        self.assertEqual(output_path.read_bytes(), self.data)
+
+        executable = shutil.which("gzip")
+        if executable is not None:
+            output_path.unlink()
+            decompress_gzip(compressed, output_path, executable=executable)
+            self.assertEqual(output_path.read_bytes(), self.data)
+
+    def test_atomic_on_failure(self):
+        """
+        Test that a failed decompression leaves neither a partial output
+        nor a temporary file behind
+
+        :return: None
+        """
+        compressed = make_gzip(self.directory / "image_sk.img.gz", self.data)
+        truncated = self.directory / "truncated_sk.img.gz"
+        truncated.write_bytes(compressed.read_bytes()[: GZIP_CHUNK_SIZE * 2])
+        output_path = self.directory / "truncated_sk.img"
+
+        with self.assertRaises(EOFError):
+            decompress_gzip(truncated, output_path)
+
+        self.assertFalse(output_path.exists())
+        self.assertEqual(
+            sorted(x.name for x in self.directory.iterdir()),
+            [compressed.name, truncated.name],
+        )
+
+        # An existing output is left untouched by a failed decompression
+        output_path.write_bytes(b"previous")
+        with self.assertRaises(EOFError):
+            decompress_gzip(truncated, output_path)
+        self.assertEqual(output_path.read_bytes(), b"previous")
+
+    def test_unpack_threads(self):
+        """
+        Test unpacking the images of an observation with a thread pool
+
+        :return: None
+        """
+        for i in range(3):
+            make_gzip(self.directory / f"image{i}_sk.img.gz", self.data + bytes([i]))
+
+        images = unpack_uvot_images(self.directory, workers=2)
+
+        self.assertEqual(
+            sorted(x.name for x in images), [f"image{i}_sk.img" for i in range(3)]
+        )
+        for i in range(3):
+            image = self.directory / f"image{i}_sk.img"
+            self.assertEqual(image.read_bytes(), self.data + bytes([i]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Module for testing the dependency-free coordinate formatting
+"""
+
+import subprocess
+import sys
+import unittest
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+
+from uvotredux.utils.coords import format_sexagesimal, offset_by
+from uvotredux.utils.name import assign_source_name
+
+
+class TestCoords(unittest.TestCase):
+    """
+    Class for testing the dependency-free coordinate formatting
+    """
+
+    def test_matches_astropy(self):
+        """
+        Test that names and region strings match the astropy results
+
+        :return: None
+        """
+        rng = np.random.default_rng(42)
+        ras = np.append(rng.uniform(0.0, 360.0, 2000), [0.0, 250.0767333333])
+        decs = np.append(rng.uniform(-89.0, 89.0, 2000), [-1.0e-7, 26.9258638889])
+
+        coords = SkyCoord(ras, decs, unit="deg")
+        ra_names = coords.ra.to_string(unit=u.hour, sep="", precision=2, pad=True)
+        dec_names = coords.dec.to_string(
+            unit=u.deg, sep="", precision=2, alwayssign=True, pad=True
+        )
+        offsets = coords.directional_offset_by(45 * u.deg, 50 * u.arcsec)
+        bkg_ra_strs = offsets.ra.to_string(unit="hour", sep=":", precision=2)
+        bkg_dec_strs = offsets.dec.to_string(unit="deg", sep=":", precision=2)
+
+        for i, (ra, dec) in enumerate(zip(ras, decs)):
+            self.assertEqual(
+                assign_source_name(ra, dec), f"J{ra_names[i]}{dec_names[i]}"
+            )
+            bkg_ra, bkg_dec = offset_by(ra, dec, 45.0, 50.0 / 3600.0)
+            self.assertEqual(format_sexagesimal(bkg_ra / 15.0), bkg_ra_strs[i])
+            self.assertEqual(format_sexagesimal(bkg_dec), bkg_dec_strs[i])
+
+    def test_cli_imports(self):
+        """
+        Test that the CLI does not import heavy dependencies at startup
+
+        :return: None
+        """
+        code = (
+            "import sys, uvotredux.cli; "
+            "print([x for x in ['astropy', 'pandas', 'swifttools'] "
+            "if x in sys.modules])"
+        )
+        res = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(res.stdout.strip(), "[]")
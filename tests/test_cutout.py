@@ -0,0 +1,96 @@
+"""
+Module for testing the cutouts and cubes of the summed images,
+with synthetic observations and stub tools
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    SWIFT_MET_START,
+    get_obs_id,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.uvot.cutout import get_cutout_path, make_target_cutouts
+from uvotredux.uvot.iterate import iterate_uvot_reduction
+
+
+def get_target_value(hdu: fits.ImageHDU) -> float:
+    """
+    Get the value of the pixel at the synthetic source position
+
+    :param hdu: Image extension
+    :return: Pixel value
+    """
+    x, y = WCS(hdu.header).world_to_pixel_values(SOURCE_RA, SOURCE_DEC)
+    return float(hdu.data[int(np.round(y)), int(np.round(x))])
+
+
+class TestCutout(unittest.TestCase):
+    """
+    Class for testing cutouts and cubes
+    """
+
+    def test_cutouts_and_cubes(self):
+        """
+        Test that the cutouts keep the pixels and WCS of the summed images,
+        and that each filter is stacked into a cube of count rates
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            make_observation_tree(
+                output_dir, n_obs=2, filter_codes=("w2",), shape=(512, 512)
+            )
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            with (
+                stub_tools(Path(tmp_dir) / "bin", template_output),
+                contextlib.redirect_stdout(io.StringIO()),
+            ):
+                iterate_uvot_reduction(output_dir)
+
+            cubes = make_target_cutouts(output_dir)
+            self.assertEqual(list(cubes), ["UW2"])
+
+            summed_image = output_dir / get_obs_id(0) / "uvot/image/UW2.fits"
+            cutout_path = get_cutout_path(summed_image)
+            with fits.open(summed_image) as full, fits.open(cutout_path) as cutout:
+                self.assertLess(cutout[1].data.size, full[1].data.size / 10)
+                target_value = get_target_value(cutout[1])
+                self.assertEqual(target_value, get_target_value(full[1]))
+
+            with fits.open(cubes["UW2"]) as cube:
+                self.assertEqual(cube[0].data.shape[0], 2)
+                self.assertEqual(
+                    list(cube["PLANES"].data["PARENT_DIR"]),
+                    [get_obs_id(0), get_obs_id(1)],
+                )
+                centre = cube[0].data.shape[1] // 2
+                self.assertAlmostEqual(
+                    cube[0].data[0, centre, centre],
+                    target_value / cube["PLANES"].data["EXPOSURE"][0],
+                    places=5,
+                )
+
+            # Unchanged inputs are not processed again
+            mtime = cutout_path.stat().st_mtime_ns
+            make_target_cutouts(output_dir)
+            self.assertEqual(cutout_path.stat().st_mtime_ns, mtime)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Module for testing the download of observations, with local fetchers
+"""
+
+import gzip
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from uvotredux.download.data import TMP_DOWNLOAD_PREFIX, download_observation
+
+OBS_ID = "00019808001"
+
+IMAGE_PATH = "uvot/image/sw00019808001uw2_sk.img.gz"
+
+
+class TestDownload(unittest.TestCase):
+    """
+    Class for testing downloads
+    """
+
+    def setUp(self):
+        """
+        Make a local archive with a single observation
+
+        :return: None
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.archive_dir = Path(self.tmp_dir.name) / "archive"
+        self.directory = Path(self.tmp_dir.name) / "target"
+        self.directory.mkdir()
+
+        image = self.archive_dir / OBS_ID / IMAGE_PATH
+        image.parent.mkdir(parents=True)
+        with gzip.open(image, "wb") as f:
+            f.write(b"new image")
+
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def fetcher(self, obs_id: str, download_dir: Path):
+        """
+        Copy an observation from the local archive, recording each call
+
+        :param obs_id: Observation ID
+        :param download_dir: Directory to copy the observation to
+        :return: None
+        """
+        self.calls.append(obs_id)
+        shutil.copytree(self.archive_dir / obs_id, download_dir / obs_id)
+
+    def flaky_fetcher(self, obs_id: str, download_dir: Path):
+        """
+        Fetcher which leaves a partial download and fails on its first call
+
+        :param obs_id: Observation ID
+        :param download_dir: Directory to copy the observation to
+        :return: None
+        """
+        if len(self.calls) == 0:
+            self.calls.append(obs_id)
+            (download_dir / obs_id).mkdir()
+            raise ConnectionError("Connection reset")
+        self.fetcher(obs_id, download_dir)
+
+    def get_tmp_dirs(self) -> list[Path]:
+        """
+        Get the temporary download directories left in the target directory
+
+        :return: List of directories
+        """
+        return list(self.directory.glob(f"{TMP_DOWNLOAD_PREFIX}*"))
+
+    def test_retry(self):
+        """
+        Test that a failed download is retried, and only placed once complete
+
+        :return: None
+        """
+        download_observation(
+            OBS_ID, self.directory, fetcher=self.flaky_fetcher, backoff=0.0
+        )
+        self.assertEqual(len(self.calls), 2)
+        self.assertTrue((self.directory / OBS_ID / IMAGE_PATH).is_file())
+        self.assertEqual(self.get_tmp_dirs(), [])
+
+    def test_failure(self):
+        """
+        Test that a download which always fails raises, without leaving
+        a partial observation or temporary directory behind
+
+        :return: None
+        """
+
+        def fetcher(obs_id: str, download_dir: Path):
+            self.calls.append(obs_id)
+            (download_dir / obs_id).mkdir()
+            raise ConnectionError("Connection reset")
+
+        with self.assertRaises(ConnectionError):
+            download_observation(
+                OBS_ID, self.directory, fetcher=fetcher, retries=2, backoff=0.0
+            )
+        self.assertEqual(len(self.calls), 3)
+        self.assertFalse((self.directory / OBS_ID).exists())
+        self.assertEqual(self.get_tmp_dirs(), [])
+
+    def test_existing(self):
+        """
+        Test that existing observations are skipped, and that overwriting them
+        only replaces their raw files
+
+        :return: None
+        """
+        obs_dir = self.directory / OBS_ID
+        image = obs_dir / IMAGE_PATH
+        image.parent.mkdir(parents=True)
+        image.write_bytes(b"old image")
+        uncompressed_image = image.with_suffix("")
+        uncompressed_image.write_bytes(b"old image")
+        result = image.parent / "UVW2.out"
+        result.write_bytes(b"result")
+
+        download_observation(OBS_ID, self.directory, fetcher=self.fetcher)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(image.read_bytes(), b"old image")
+
+        download_observation(
+            OBS_ID, self.directory, fetcher=self.fetcher, overwrite=True
+        )
+        self.assertEqual(self.calls, [OBS_ID])
+        with gzip.open(image, "rb") as f:
+            self.assertEqual(f.read(), b"new image")
+        self.assertFalse(uncompressed_image.exists())
+        self.assertEqual(result.read_bytes(), b"result")
+        self.assertEqual(self.get_tmp_dirs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Module for testing the fast parse engine against the astropy engine
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+
+from benchmarks.synthetic import SWIFT_MET_START, get_obs_id
+from uvotredux.uvot.parse import combine_uvot_results
+
+N_ROWS = 3
+
+
+def make_output_table(met: float, scaled: bool = False) -> fits.BinTableHDU:
+    """
+    Make a uvotsource-like output table, with string, logical, integer
+    and multi-dimensional columns
+
+    :param met: Mission elapsed time of the first row
+    :param scaled: Whether to write the integer column with TZERO, and the
+        multi-dimensional column with TDIM, so the fast engine uses astropy
+    :return: Binary table HDU
+    """
+    rng = np.random.default_rng(int(met))
+    counts = rng.integers(0, 1000, N_ROWS)
+    cols = [
+        fits.Column(name="MET", format="D", array=met + 10.0 * np.arange(N_ROWS)),
+        fits.Column(name="FILTER", format="8A", array=["UVW2", "U", "WHITE"]),
+        fits.Column(name="SATURATED", format="L", array=[True, False, True]),
+        fits.Column(
+            name="COUNTS",
+            format="J",
+            array=counts.astype(np.uint32) if scaled else counts,
+        ),
+        fits.Column(name="AB_MAG", format="E", array=rng.uniform(17, 21, N_ROWS)),
+        fits.Column(
+            name="PROFILE",
+            format="4E",
+            dim="(4)" if scaled else None,
+            array=rng.normal(size=(N_ROWS, 4)),
+        ),
+    ]
+    return fits.BinTableHDU.from_columns(cols)
+
+
+class TestFastParse(unittest.TestCase):
+    """
+    Class for testing the fast parse engine
+    """
+
+    def test_engines_match(self):
+        """
+        Test that the fast engine gives the same results as the astropy engine,
+        including for a file which the fast engine reads with astropy
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_files = []
+            for i, scaled in enumerate([False, False, True]):
+                output_path = Path(tmp_dir) / get_obs_id(i) / "uvot/image" / "UW2.out"
+                output_path.parent.mkdir(parents=True)
+                make_output_table(SWIFT_MET_START + i * 86400.0, scaled=scaled).writeto(
+                    output_path
+                )
+                output_files.append(output_path)
+
+            with self.assertLogs("uvotredux.uvot.fastparse", "DEBUG") as logs:
+                fast = combine_uvot_results(output_files, engine="fast")
+            self.assertIn(f"Reading {output_files[2]} with astropy", logs.output[-1])
+            reference = combine_uvot_results(output_files, engine="astropy")
+
+        self.assertEqual(len(fast), 3 * N_ROWS)
+        pd.testing.assert_frame_equal(fast, reference)
+        self.assertEqual(list(fast["FILTER"][:N_ROWS]), ["UVW2", "U", "WHITE"])
+        for row, reference_row in zip(fast["PROFILE"], reference["PROFILE"]):
+            np.testing.assert_array_equal(row, reference_row)
+
+
+if __name__ == "__main__":
+    unittest.main()
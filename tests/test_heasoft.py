@@ -0,0 +1,47 @@
+"""
+Module for testing the HEASoft executor, with stub tools
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import SWIFT_MET_START, make_uvotsource_output
+from uvotredux.utils.heasoft import get_heasoft_executor
+from uvotredux.uvot.reduce import extract_uvot_source
+
+
+class TestHeasoft(unittest.TestCase):
+    """
+    Class for testing the HEASoft executor
+    """
+
+    def test_paths_with_spaces(self):
+        """
+        Test that tools run on paths with spaces, with their output
+        captured in the log file and each call recorded
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            uvot_dir = Path(tmp_dir) / "my data"
+            uvot_dir.mkdir()
+            image = uvot_dir / "UW2.fits"
+            image.touch()
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            executor = get_heasoft_executor()
+            calls = executor.stats["uvotsource"]["calls"]
+
+            with stub_tools(Path(tmp_dir) / "bin", template_output):
+                extract_uvot_source(
+                    image,
+                    src_region_path=uvot_dir / "src.reg",
+                    bkg_region_path=uvot_dir / "bkg.reg",
+                )
+
+            self.assertTrue((uvot_dir / "UW2.out").is_file())
+            self.assertIn(str(uvot_dir / "UW2.out"), (uvot_dir / "UW2.log").read_text())
+            self.assertEqual(executor.stats["uvotsource"]["calls"], calls + 1)
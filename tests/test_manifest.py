@@ -0,0 +1,71 @@
+"""
+Module for testing the reduction manifest
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from uvotredux.uvot.manifest import ReductionManifest, get_manifest_path
+
+
+class TestReductionManifest(unittest.TestCase):
+    """
+    Class for testing the reduction manifest
+    """
+
+    def test_digest_tracks_inputs(self):
+        """
+        Test that a product is only current while its inputs are unchanged
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = Path(tmp_dir)
+            region = directory / "bkg.reg"
+            region.write_text('fk5;circle(16:40:21.00,+26:56:08.00,10")\n')
+            product = directory / "UW2.out"
+
+            manifest = ReductionManifest(get_manifest_path(directory))
+            digest = manifest.get_digest([region], tool="uvotsource")
+            self.assertFalse(manifest.is_current(product, digest))
+
+            manifest.record(product, digest)
+            self.assertTrue(manifest.is_current(product, digest))
+
+            new_params = manifest.get_digest([region], tool="uvotsource", sigma=5.0)
+            self.assertFalse(manifest.is_current(product, new_params))
+
+            region.write_text('fk5;circle(16:40:22.00,+26:56:08.00,10")\n')
+            new_digest = manifest.get_digest([region], tool="uvotsource")
+            self.assertNotEqual(digest, new_digest)
+            self.assertFalse(manifest.is_current(product, new_digest))
+
+    def test_adopt_existing_products(self):
+        """
+        Test that products which predate the manifest are adopted,
+        while later products without a record are not
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = Path(tmp_dir)
+            region = directory / "src.reg"
+            region.write_text('fk5;circle(16:40:18.42,+26:56:08.45,3")\n')
+            old_product = directory / "UW2.out"
+            old_product.write_text("old")
+            os.utime(old_product, (time.time() - 60.0, time.time() - 60.0))
+
+            manifest = ReductionManifest(get_manifest_path(directory))
+            digest = manifest.get_digest([region], tool="uvotsource")
+
+            self.assertTrue(manifest.adopt(old_product, digest))
+            self.assertTrue(manifest.is_current(old_product, digest))
+            self.assertFalse(manifest.adopt(old_product, "other"))
+
+            new_product = directory / "UM2.out"
+            new_product.write_text("partial")
+            self.assertFalse(manifest.adopt(new_product, digest))
+            self.assertFalse(manifest.is_current(new_product, digest))
@@ -0,0 +1,40 @@
+"""
+Module for testing the UVOT pipeline offline, with synthetic observations
+and stub HEASoft tools
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.bench_pipeline import run_benchmark
+from uvotredux.uvot.output import get_results_path
+
+
+class TestOffline(unittest.TestCase):
+    """
+    Class for testing the UVOT pipeline offline
+    """
+
+    def test_pipeline_stages(self):
+        """
+        Test that every benchmarked stage runs on a small synthetic target
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = run_benchmark(Path(tmp_dir), n_obs=2, trace_memory=False)
+
+            self.assertEqual(
+                [x["stage"] for x in results],
+                [
+                    "unpack_uvot_images",
+                    "unpack_single_uvot_obs",
+                    "combine_uvot_results",
+                    "write_csv",
+                ],
+            )
+            df = pd.read_csv(get_results_path(Path(tmp_dir)))
+            self.assertEqual(len(df), 6)
@@ -0,0 +1,67 @@
+"""
+Module for testing the output formats of the UVOT results
+"""
+
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from uvotredux.uvot.output import (
+    get_results_path,
+    load_uvot_results,
+    write_uvot_results,
+)
+
+test_df = pd.DataFrame(
+    {
+        "MJD": [60800.1, 60801.2],
+        "FILTER": ["UVW2    ", "U       "],
+        "AB_MAG": [18.5, 19.25],
+        "PARENT_DIR": ["00019808001", "00019808002"],
+    }
+)
+
+
+class TestOutput(unittest.TestCase):
+    """
+    Class for testing the output formats of the UVOT results
+    """
+
+    def check_round_trip(self, output_format: str):
+        """
+        Check that results written in a format load back with the typed schema
+
+        :param output_format: Output format
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = get_results_path(Path(tmp_dir), output_format=output_format)
+            write_uvot_results(test_df, path, output_format)
+
+            df = load_uvot_results(Path(tmp_dir))
+
+        self.assertEqual(list(df["FILTER"]), ["UVW2", "U"])
+        self.assertIsInstance(df["FILTER"].dtype, pd.CategoricalDtype)
+        self.assertEqual(df["AB_MAG"].dtype, "float32")
+        self.assertEqual(df["MJD"].dtype, "float64")
+        self.assertEqual(list(df["PARENT_DIR"]), list(test_df["PARENT_DIR"]))
+
+    def test_csv(self):
+        """
+        Test csv results
+
+        :return: None
+        """
+        self.check_round_trip("csv")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow missing")
+    def test_parquet(self):
+        """
+        Test parquet results
+
+        :return: None
+        """
+        self.check_round_trip("parquet")
@@ -0,0 +1,63 @@
+"""
+Module for testing the reduction on a pool of worker processes,
+with synthetic observations and stub tools
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.uvot.output import load_uvot_results
+
+
+class TestParallel(unittest.TestCase):
+    """
+    Class for testing the parallel reduction
+    """
+
+    def test_workers_match_serial(self):
+        """
+        Test that a reduction with two worker processes gives the same
+        results and products as a serial one
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            results, products = {}, {}
+            for workers in [1, 2]:
+                output_dir = Path(tmp_dir) / f"workers_{workers}"
+                make_observation_tree(output_dir, n_obs=3, filter_codes=("w2", "m2"))
+
+                with (
+                    stub_tools(Path(tmp_dir) / "bin", template_output),
+                    contextlib.redirect_stdout(io.StringIO()),
+                ):
+                    iterate_uvot_reduction(output_dir, workers=workers)
+
+                results[workers] = load_uvot_results(output_dir)
+                products[workers] = sorted(
+                    str(x.relative_to(output_dir))
+                    for x in output_dir.glob("*/uvot/image/*")
+                )
+
+            self.assertEqual(len(results[1]), 6)
+            pd.testing.assert_frame_equal(results[2], results[1])
+            self.assertEqual(products[2], products[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Module for testing per-extension (snapshot) photometry, with synthetic
+observations and stub tools
+"""
+
+import contextlib
+import gzip
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    SWIFT_MET_START,
+    get_obs_id,
+    make_observation_tree,
+    make_sky_image,
+    make_uvotsource_output,
+)
+from uvotredux.download.regions import create_regions
+from uvotredux.pipeline import run_pipeline, show_plan
+from uvotredux.utils.heasoft import get_heasoft_executor
+from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.uvot.output import load_uvot_results
+
+
+class TestPerExtension(unittest.TestCase):
+    """
+    Class for testing per-extension photometry
+    """
+
+    def test_snapshots_not_summed(self):
+        """
+        Test that each extension is measured with uvotsource, without uvotimsum,
+        and that the snapshots have their own rows in the results
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            make_observation_tree(output_dir, n_obs=1)
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            stats = get_heasoft_executor().stats
+            n_imsum = stats["uvotimsum"]["calls"]
+            n_source = stats["uvotsource"]["calls"]
+
+            with (
+                stub_tools(Path(tmp_dir) / "bin", template_output),
+                contextlib.redirect_stdout(io.StringIO()),
+            ):
+                iterate_uvot_reduction(output_dir, per_extension=True)
+                iterate_uvot_reduction(output_dir, per_extension=True)
+
+            # 3 filters with 2 extensions each, reduced once
+            self.assertEqual(stats["uvotimsum"]["calls"], n_imsum)
+            self.assertEqual(stats["uvotsource"]["calls"], n_source + 6)
+
+            image_dir = output_dir / get_obs_id(0) / "uvot/image"
+            self.assertTrue((image_dir / "UW2.1.out").is_file())
+            self.assertFalse((image_dir / "UW2.fits").exists())
+
+            df = load_uvot_results(output_dir, summary=True)
+            self.assertEqual(len(df), 6)
+            self.assertEqual(df["EXTENSION"].value_counts().to_dict(), {1: 3, 2: 3})
+
+    def test_quicklook_snapshots(self):
+        """
+        Test that quick-look snapshots are measured on a pool of workers,
+        each with the time and exposure of its own extension
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir)
+            create_regions(ra=SOURCE_RA, dec=SOURCE_DEC, base_dir=output_dir)
+            image_dir = output_dir / get_obs_id(0) / "uvot/image"
+            image_dir.mkdir(parents=True)
+            (image_dir / f"sw{get_obs_id(0)}uw2_sk.img.gz").write_bytes(
+                make_sky_image("UVW2", n_extensions=3, source_rate=2.0)
+            )
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                iterate_uvot_reduction(
+                    output_dir, workers=2, photometry="quicklook", per_extension=True
+                )
+
+            df = load_uvot_results(output_dir)
+            self.assertEqual(list(df["EXTENSION"]), [1, 2, 3])
+            self.assertEqual(list(df["EXPOSURE"]), [500.0] * 3)
+            self.assertTrue(df["MET"].is_monotonic_increasing)
+            self.assertEqual(df["MET"].nunique(), 3)
+
+    def test_pipelined_snapshots(self):
+        """
+        Test that the pipelined run skips unreadable images, and that
+        the plan checks the output of each extension
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            make_observation_tree(output_dir, n_obs=1, filter_codes=("w2",))
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+            image_dir = output_dir / get_obs_id(0) / "uvot/image"
+            bad_image = image_dir / f"sw{get_obs_id(0)}uuu_sk.img.gz"
+            with gzip.open(bad_image, "wb") as f:
+                f.write(b"not a FITS file")
+
+            def plan() -> str:
+                with contextlib.redirect_stdout(io.StringIO()) as out:
+                    show_plan(
+                        SOURCE_RA,
+                        SOURCE_DEC,
+                        output_dir,
+                        download=False,
+                        per_extension=True,
+                    )
+                return out.getvalue()
+
+            self.assertIn("4 tasks, 4 to run", plan())
+
+            with (
+                stub_tools(Path(tmp_dir) / "bin", template_output),
+                contextlib.redirect_stdout(io.StringIO()),
+            ):
+                run_pipeline(
+                    SOURCE_RA,
+                    SOURCE_DEC,
+                    output_dir,
+                    download=False,
+                    per_extension=True,
+                )
+
+            self.assertEqual(len(load_uvot_results(output_dir, summary=True)), 2)
+            self.assertIn("4 tasks, 2 to run", plan())
+
+            bad_image.unlink()
+            bad_image.with_suffix("").unlink()
+            self.assertIn("3 tasks, 0 to run", plan())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Module for testing the pipelined task graph, offline with a local archive
+and stub tools
+"""
+
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.download.query import OBS_QUERY_CACHE_NAME
+from uvotredux.pipeline import run_pipeline, show_plan
+from uvotredux.uvot.output import load_uvot_results
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    Class for testing the pipelined task graph
+    """
+
+    def test_pipeline(self):
+        """
+        Test that a pipelined run downloads and reduces every observation,
+        and that the plan then shows every task as done
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_dir = Path(tmp_dir) / "archive"
+            obs_ids = [x.name for x in make_observation_tree(archive_dir, n_obs=2)]
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            output_dir = Path(tmp_dir) / "target"
+            output_dir.mkdir()
+            with open(output_dir / OBS_QUERY_CACHE_NAME, "w", encoding="utf8") as f:
+                json.dump(
+                    {
+                        "ra": SOURCE_RA,
+                        "dec": SOURCE_DEC,
+                        "queried_at": time.time(),
+                        "observations": [{"obs_id": x, "begin": None} for x in obs_ids],
+                    },
+                    f,
+                )
+
+            def fetcher(obs_id: str, download_dir: Path):
+                shutil.copytree(archive_dir / obs_id, download_dir / obs_id)
+
+            with stub_tools(Path(tmp_dir) / "bin", template_output):
+                with contextlib.redirect_stdout(io.StringIO()) as plan:
+                    show_plan(SOURCE_RA, SOURCE_DEC, output_dir)
+                self.assertIn("8 tasks, 7 to run", plan.getvalue())
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    run_pipeline(
+                        SOURCE_RA,
+                        SOURCE_DEC,
+                        output_dir,
+                        workers=2,
+                        download_workers=2,
+                        fetcher=fetcher,
+                    )
+
+                with contextlib.redirect_stdout(io.StringIO()) as plan:
+                    show_plan(SOURCE_RA, SOURCE_DEC, output_dir)
+
+            self.assertEqual(len(load_uvot_results(output_dir, summary=True)), 6)
+            self.assertIn("12 tasks, 0 to run", plan.getvalue())
@@ -0,0 +1,55 @@
+"""
+Module for testing the profiling of pipeline runs
+"""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.run import main
+from uvotredux.utils.profiling import PROFILE_REPORT_NAME
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Class for testing the profiling of pipeline runs
+    """
+
+    def test_profile_report(self):
+        """
+        Test that a profiled offline run reports every stage, observation
+        and command, and that cached commands are reported on a rerun
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            obs_dirs = make_observation_tree(output_dir, n_obs=2)
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            with stub_tools(Path(tmp_dir) / "bin", template_output):
+                main(0.0, 0.0, output_dir, download=False, profile=True)
+                with open(output_dir / PROFILE_REPORT_NAME, encoding="utf8") as f:
+                    report = json.load(f)
+
+                for stage in ["run", "reduction", "reduce_obs", "command", "parse"]:
+                    self.assertIn(stage, report["stages"])
+                self.assertEqual(
+                    sorted(report["observations"]), sorted(x.name for x in obs_dirs)
+                )
+                self.assertEqual(report["stages"]["command"]["cache"], {"miss": 12})
+
+                main(0.0, 0.0, output_dir, download=False, profile=True)
+                with open(output_dir / PROFILE_REPORT_NAME, encoding="utf8") as f:
+                    report = json.load(f)
+
+            self.assertEqual(report["stages"]["command"]["cache"], {"skip": 12})
+            self.assertTrue(all(x["obs_id"] for x in report["commands"]))
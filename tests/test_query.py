@@ -0,0 +1,129 @@
+"""
+Module for testing the cache of Swift archive queries, with a stubbed archive
+"""
+
+import json
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from uvotredux.download.query import OBS_QUERY_CACHE_NAME, query_observations
+
+RA, DEC = 250.0767, 26.9259
+
+
+def make_record(obs_id: str, begin: str) -> dict:
+    """
+    Make an observation record, as returned by the archive query
+
+    :param obs_id: Observation ID
+    :param begin: Start time of the snapshot, in ISO format
+    :return: Observation record
+    """
+    return {
+        "obs_id": obs_id,
+        "begin": begin,
+        "end": None,
+        "exposure": 1000.0,
+        "uvot_mode": "0x30ed",
+    }
+
+
+FIRST = make_record("00019808001", "2025-05-26T07:39:51")
+SECOND = make_record("00019808002", "2025-05-28T02:10:00")
+
+
+class TestQuery(unittest.TestCase):
+    """
+    Class for testing the cache of Swift archive queries
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.directory = Path(self.tmp_dir.name)
+        self.cache_path = self.directory / OBS_QUERY_CACHE_NAME
+
+        patcher = mock.patch("uvotredux.download.query.query_swift_archive")
+        self.archive = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def query(self, ttl: float) -> list[dict]:
+        """
+        Query the stubbed archive through the cache
+
+        :param ttl: Time in seconds for which the cache is used without refresh
+        :return: List of observation records
+        """
+        return query_observations(RA, DEC, directory=self.directory, ttl=ttl)
+
+    def test_ttl_and_refresh(self):
+        """
+        Test that the cache is used within its TTL, and that once it expires only
+        observations since the latest cached one are queried and merged
+
+        :return: None
+        """
+        self.archive.return_value = [FIRST]
+        self.assertEqual(self.query(ttl=3600.0), [FIRST])
+        self.archive.assert_called_once_with(ra=RA, dec=DEC)
+
+        self.archive.return_value = [SECOND]
+        self.assertEqual(self.query(ttl=3600.0), [FIRST])
+        self.assertEqual(self.archive.call_count, 1)
+
+        # The latest snapshot may be returned again by the refresh
+        self.archive.return_value = [FIRST, SECOND]
+        self.assertEqual(self.query(ttl=0.0), [FIRST, SECOND])
+        self.assertEqual(
+            self.archive.call_args.kwargs["begin"],
+            datetime.fromisoformat(FIRST["begin"]),
+        )
+
+        with open(self.cache_path, "r", encoding="utf8") as f:
+            cache = json.load(f)
+        self.assertEqual(cache["observations"], [FIRST, SECOND])
+        self.assertLessEqual(cache["queried_at"], time.time())
+
+        # A failed refresh falls back to the expired cache
+        self.archive.side_effect = RuntimeError("Swift archive query failed")
+        self.assertEqual(self.query(ttl=0.0), [FIRST, SECOND])
+
+    def test_invalid_cache(self):
+        """
+        Test that a corrupt cache, or one for another position, is replaced
+
+        :return: None
+        """
+        self.archive.return_value = [FIRST]
+
+        for contents in ['{"ra": 250.0', "[]", json.dumps({"ra": RA, "dec": DEC})]:
+            self.cache_path.write_text(contents, encoding="utf8")
+            self.assertEqual(self.query(ttl=3600.0), [FIRST])
+            self.assertIsNone(self.archive.call_args.kwargs.get("begin"))
+
+        self.cache_path.write_text(
+            json.dumps(
+                {
+                    "ra": RA + 1.0,
+                    "dec": DEC,
+                    "queried_at": time.time(),
+                    "observations": [SECOND],
+                }
+            ),
+            encoding="utf8",
+        )
+        self.assertEqual(self.query(ttl=3600.0), [FIRST])
+        self.assertEqual(self.archive.call_count, 4)
+
+        with open(self.cache_path, "r", encoding="utf8") as f:
+            self.assertEqual(json.load(f)["ra"], RA)
+
+
+if __name__ == "__main__":
+    unittest.main()
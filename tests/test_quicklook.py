@@ -0,0 +1,57 @@
+"""
+Module for testing the quick-look photometry engine, on synthetic images
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    get_obs_id,
+    make_sky_image,
+)
+from uvotredux.download.regions import create_regions
+from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.uvot.output import load_uvot_results
+from uvotredux.uvot.quicklook import AB_ZERO_POINTS, QUICKLOOK_TOLERANCE_MAG
+
+
+class TestQuicklook(unittest.TestCase):
+    """
+    Class for testing the quick-look photometry engine
+    """
+
+    def test_injected_source(self):
+        """
+        Test that the magnitude of an injected source is recovered,
+        without HEASoft
+
+        :return: None
+        """
+        rate = 2.0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir)
+            create_regions(ra=SOURCE_RA, dec=SOURCE_DEC, base_dir=output_dir)
+            image_dir = output_dir / get_obs_id(0) / "uvot/image"
+            image_dir.mkdir(parents=True)
+            (image_dir / f"sw{get_obs_id(0)}uw2_sk.img.gz").write_bytes(
+                make_sky_image("UVW2", source_rate=rate)
+            )
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                iterate_uvot_reduction(output_dir, photometry="quicklook")
+
+            self.assertFalse((image_dir / "UW2.fits").exists())
+            df = load_uvot_results(output_dir, summary=True)
+            self.assertEqual(len(df), 1)
+            self.assertLess(
+                abs(df["AB_MAG"][0] - (AB_ZERO_POINTS["UW2"] - 2.5 * np.log10(rate))),
+                QUICKLOOK_TOLERANCE_MAG,
+            )
+            self.assertGreater(df["AB_MAG_LIM"][0], df["AB_MAG"][0])
@@ -0,0 +1,153 @@
+"""
+Module for testing the disk quota manager, with synthetic observations
+and stub tools
+"""
+
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SWIFT_MET_START,
+    get_obs_id,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.download.data import download_observation, is_evicted
+from uvotredux.paths import get_cache_index_path
+from uvotredux.quota import CacheIndex, enforce_quota, get_disk_usage, in_use
+from uvotredux.utils.size import parse_size
+from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.workqueue import WorkQueue
+
+
+class TestQuota(unittest.TestCase):
+    """
+    Class for testing the disk quota manager
+    """
+
+    def setUp(self):
+        """
+        Reduce an observation of two targets, of which "old" was used first
+
+        :return: None
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.base_dir = Path(self.tmp_dir.name) / "data"
+        self.archive_dir = Path(self.tmp_dir.name) / "archive"
+        make_observation_tree(self.archive_dir, n_obs=1)
+
+        template_output = Path(self.tmp_dir.name) / "template.out"
+        make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+        self.obs_dirs = {}
+        for name in ["old", "new"]:
+            make_observation_tree(self.base_dir / name, n_obs=1)
+            with (
+                stub_tools(Path(self.tmp_dir.name) / "bin", template_output),
+                contextlib.redirect_stdout(io.StringIO()),
+                in_use(self.base_dir / name),
+            ):
+                iterate_uvot_reduction(self.base_dir / name)
+            self.obs_dirs[name] = self.base_dir / name / get_obs_id(0)
+
+        index = CacheIndex(get_cache_index_path(self.base_dir))
+        index.record_use([self.obs_dirs["old"]])
+        index.record_use([self.obs_dirs["new"]])
+
+    def tearDown(self):
+        """
+        Remove the data directory
+
+        :return: None
+        """
+        self.tmp_dir.cleanup()
+
+    def test_parse_size(self):
+        """
+        Test parsing quotas
+
+        :return: None
+        """
+        self.assertEqual(parse_size("2k"), 2048)
+        self.assertEqual(parse_size("1.5GB"), int(1.5 * 1024**3))
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+
+    def test_cheapest_and_oldest_first(self):
+        """
+        Test that the uncompressed images of the least recently used target
+        are evicted first
+
+        :return: None
+        """
+        usage = get_disk_usage(self.base_dir)
+        evicted = enforce_quota(self.base_dir, usage - 1)
+
+        self.assertEqual(len(evicted), 1)
+        self.assertEqual(evicted[0]["tier"], "uncompressed")
+        self.assertEqual(evicted[0]["obs_dir"], self.obs_dirs["old"])
+        self.assertLess(get_disk_usage(self.base_dir), usage)
+
+        old_images = self.obs_dirs["old"] / "uvot/image"
+        self.assertEqual(list(old_images.glob("*_sk.img")), [])
+        self.assertEqual(len(list(old_images.glob("*_sk.img.gz"))), 3)
+        self.assertTrue((old_images / "UW2.fits").is_file())
+        new_images = self.obs_dirs["new"] / "uvot/image"
+        self.assertEqual(len(list(new_images.glob("*_sk.img"))), 3)
+
+    def test_in_use_and_results_kept(self):
+        """
+        Test that targets in use are never evicted, that the results of evicted
+        observations are kept, and that evicted observations are downloaded again
+
+        :return: None
+        """
+        with in_use(self.base_dir / "new"):
+            enforce_quota(self.base_dir, 0)
+
+        old_obs, new_obs = self.obs_dirs["old"], self.obs_dirs["new"]
+        self.assertTrue(is_evicted(old_obs))
+        self.assertEqual(list(old_obs.rglob("*.gz")), [])
+        self.assertEqual(len(list(old_obs.rglob("*.out"))), 3)
+        self.assertFalse(is_evicted(new_obs))
+        self.assertEqual(len(list(new_obs.rglob("*_sk.img"))), 3)
+
+        def fetcher(obs_id: str, download_dir: Path):
+            shutil.copytree(self.archive_dir / obs_id, download_dir / obs_id)
+
+        download_observation(get_obs_id(0), self.base_dir / "old", fetcher=fetcher)
+        self.assertFalse(is_evicted(old_obs))
+        self.assertEqual(len(list(old_obs.rglob("*_sk.img.gz"))), 3)
+        self.assertEqual(len(list(old_obs.rglob("*.out"))), 3)
+
+    def test_queued_elsewhere(self):
+        """
+        Test that targets queued in a work queue outside the data directory
+        are never evicted, whether the queue is given or recorded in the index
+
+        :return: None
+        """
+        queue_path = Path(self.tmp_dir.name) / "queues" / "queue.sqlite"
+        queue_path.parent.mkdir()
+        WorkQueue(queue_path).enqueue_target(self.base_dir / "old")
+        old_images = self.obs_dirs["old"] / "uvot/image"
+
+        usage = get_disk_usage(self.base_dir)
+        evicted = enforce_quota(self.base_dir, usage - 1, queue_path=queue_path)
+        self.assertEqual(evicted[0]["obs_dir"], self.obs_dirs["new"])
+        self.assertEqual(len(list(old_images.glob("*_sk.img"))), 3)
+
+        CacheIndex(get_cache_index_path(self.base_dir)).record_queue(queue_path)
+        enforce_quota(self.base_dir, 0)
+        self.assertFalse(is_evicted(self.obs_dirs["old"]))
+        self.assertTrue(is_evicted(self.obs_dirs["new"]))
+        self.assertEqual(len(list(old_images.glob("*_sk.img"))), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
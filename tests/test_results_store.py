@@ -0,0 +1,105 @@
+"""
+Module for testing the results store
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from uvotredux.uvot.results_store import ResultsStore, get_results_store_path
+
+
+class TestResultsStore(unittest.TestCase):
+    """
+    Class for testing the results store
+    """
+
+    def test_only_changed_files_parsed(self):
+        """
+        Test that only new or changed files are parsed, and deleted files dropped
+
+        :return: None
+        """
+        parsed = []
+
+        def reader(files: list[Path]) -> list[dict[str, np.ndarray]]:
+            parsed.extend(files)
+            return [{"MET": np.array([float(x.read_text())])} for x in files]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = Path(tmp_dir)
+            files = [directory / f"{i}.out" for i in range(3)]
+            for i, path in enumerate(files):
+                path.write_text(str(i))
+
+            store = ResultsStore(get_results_store_path(directory))
+            res = store.update(files, reader=reader)
+            self.assertEqual([x["MET"][0] for x in res], [0.0, 1.0, 2.0])
+            self.assertEqual(len(parsed), 3)
+
+            parsed.clear()
+            files[1].write_text("10")
+            files[2].unlink()
+            res = store.update(files[:2], reader=reader)
+            self.assertEqual([x["MET"][0] for x in res], [0.0, 10.0])
+            self.assertEqual(parsed, [files[1]])
+
+            parsed.clear()
+            store.update(files[:2], reader=reader, config={"columns": ["MET"]})
+            self.assertEqual(len(parsed), 2)
+
+    def test_column_types(self):
+        """
+        Test that string, bool and multi-dimensional columns are stored and
+        loaded unchanged, and that columns which need pickles are not stored
+
+        :return: None
+        """
+        rows = np.empty(2, dtype=object)
+        rows[:] = [np.arange(3, dtype=">f4"), np.arange(3, 6, dtype=">f4")]
+        columns = {
+            "FILTER": np.array(["UVW2", "V"], dtype=object),
+            "NAME": np.array(["a", "bc"]),
+            "RAW": np.array([b"T", b"F"]),
+            "FLAG": np.array([True, False]),
+            "MET": np.array([1.5, 2.5]),
+            "COUNTS": rows,
+        }
+        parsed = []
+
+        def reader(files: list[Path]) -> list[dict[str, np.ndarray]]:
+            parsed.extend(files)
+            return [dict(columns) for _ in files]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = Path(tmp_dir)
+            path = directory / "UW2.out"
+            path.write_text("0")
+
+            store = ResultsStore(get_results_store_path(directory))
+            store.update([path], reader=reader)
+            (res,) = store.update([path], reader=reader)
+            self.assertEqual(len(parsed), 1)
+
+            self.assertEqual(list(res), list(columns))
+            for name, col in columns.items():
+                self.assertEqual(res[name].dtype.kind, col.dtype.kind, name)
+                self.assertEqual(res[name].shape, col.shape, name)
+            self.assertEqual(list(res["FILTER"]), ["UVW2", "V"])
+            self.assertIsInstance(res["FILTER"][0], str)
+            self.assertEqual(list(res["NAME"]), ["a", "bc"])
+            self.assertEqual(list(res["RAW"]), [b"T", b"F"])
+            self.assertEqual(list(res["FLAG"]), [True, False])
+            np.testing.assert_array_equal(res["MET"], columns["MET"])
+            for loaded, row in zip(res["COUNTS"], rows):
+                np.testing.assert_array_equal(loaded, row)
+
+            columns["MIXED"] = np.array([1, "a"], dtype=object)
+            path.write_text("1")
+            parsed.clear()
+            store.update([path], reader=reader)
+            (res,) = store.update([path], reader=reader)
+            self.assertEqual(len(parsed), 2)
+            self.assertEqual(list(res["MIXED"]), [1, "a"])
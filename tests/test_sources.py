@@ -0,0 +1,74 @@
+"""
+Module for testing multi-source photometry, with synthetic observations
+and stub tools
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.download.regions import PRIMARY_SOURCE_NAME, create_source_region
+from uvotredux.utils.heasoft import get_heasoft_executor
+from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.uvot.output import load_uvot_results
+
+
+class TestSources(unittest.TestCase):
+    """
+    Class for testing multi-source photometry
+    """
+
+    def test_sources_share_summed_image(self):
+        """
+        Test that each image is summed once, and that every source is
+        measured on it with its own rows in the results
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            make_observation_tree(output_dir, n_obs=1)
+            create_source_region("host", SOURCE_RA + 0.001, SOURCE_DEC, output_dir)
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+
+            stats = get_heasoft_executor().stats
+            n_imsum = stats["uvotimsum"]["calls"]
+            n_source = stats["uvotsource"]["calls"]
+
+            with (
+                stub_tools(Path(tmp_dir) / "bin", template_output),
+                contextlib.redirect_stdout(io.StringIO()),
+            ):
+                iterate_uvot_reduction(output_dir)
+
+            self.assertEqual(stats["uvotimsum"]["calls"], n_imsum + 3)
+            self.assertEqual(stats["uvotsource"]["calls"], n_source + 6)
+
+            df = load_uvot_results(output_dir, summary=True)
+            self.assertEqual(len(df), 6)
+            self.assertEqual(
+                df["SOURCE"].value_counts().to_dict(),
+                {PRIMARY_SOURCE_NAME: 3, "host": 3},
+            )
+
+    def test_invalid_source_name(self):
+        """
+        Test that source names which cannot be used in file names are rejected
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ["../host", "my host", PRIMARY_SOURCE_NAME]:
+                with self.assertRaises(ValueError):
+                    create_source_region(name, SOURCE_RA, SOURCE_DEC, Path(tmp_dir))
@@ -0,0 +1,157 @@
+"""
+Module for testing the shared store of raw observations, with a local fetcher
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from uvotredux.download.data import (
+    TMP_DOWNLOAD_MIN_AGE,
+    TMP_DOWNLOAD_PREFIX,
+    download_single_observation,
+    remove_incomplete_downloads,
+)
+from uvotredux.download.store import get_stored_path, link_observation
+
+OBS_ID = "00019808001"
+
+RAW_FILES = [
+    "uvot/image/sw00019808001uw2_sk.img.gz",
+    "uvot/hk/sw00019808001uac.hk.gz",
+    "auxil/sw00019808001sat.fits.gz",
+]
+
+
+class TestStore(unittest.TestCase):
+    """
+    Class for testing the shared store
+    """
+
+    def setUp(self):
+        """
+        Make a local archive with a single observation
+
+        :return: None
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.base_dir = Path(self.tmp_dir.name)
+        self.archive_dir = self.base_dir / "archive"
+        self.store_dir = self.base_dir / "store"
+        self.store_dir.mkdir()
+
+        for name in RAW_FILES:
+            path = self.archive_dir / OBS_ID / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(name.encode())
+
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def fetcher(self, obs_id: str, download_dir: Path):
+        """
+        Copy an observation from the local archive, recording each call
+
+        :param obs_id: Observation ID
+        :param download_dir: Directory to copy the observation to
+        :return: None
+        """
+        self.calls.append(obs_id)
+        shutil.copytree(self.archive_dir / obs_id, download_dir / obs_id)
+
+    def make_target(self, name: str) -> Path:
+        """
+        Make a target directory
+
+        :param name: Name of the target
+        :return: Target directory
+        """
+        directory = self.base_dir / name
+        directory.mkdir()
+        return directory
+
+    def test_shared_download(self):
+        """
+        Test that an observation is downloaded once into the store,
+        and linked into each target directory
+
+        :return: None
+        """
+        targets = [self.make_target(x) for x in ["target_a", "target_b"]]
+        for directory in targets:
+            download_single_observation(
+                OBS_ID, directory, fetcher=self.fetcher, store_dir=self.store_dir
+            )
+
+        self.assertEqual(self.calls, [OBS_ID])
+        for name in RAW_FILES:
+            stored = self.store_dir / OBS_ID / name
+            self.assertTrue(stored.is_file() and not stored.is_symlink())
+            for directory in targets:
+                path = directory / OBS_ID / name
+                self.assertTrue(path.is_symlink())
+                self.assertEqual(get_stored_path(path), stored.resolve())
+                self.assertEqual(path.read_bytes(), name.encode())
+
+    def test_relink(self):
+        """
+        Test relinking a target directory, which keeps its own products,
+        links new files and drops links to files that left the store
+
+        :return: None
+        """
+        directory = self.make_target("target")
+        download_single_observation(
+            OBS_ID, directory, fetcher=self.fetcher, store_dir=self.store_dir
+        )
+        target_obs_dir = directory / OBS_ID
+        product = target_obs_dir / "uvot/image/UVW2.out"
+        product.write_bytes(b"result")
+
+        store_obs_dir = self.store_dir / OBS_ID
+        (store_obs_dir / RAW_FILES[1]).unlink()
+        new_file = store_obs_dir / "uvot/image/sw00019808001uw2_sk.img"
+        new_file.write_bytes(b"uncompressed")
+
+        link_observation(store_obs_dir, target_obs_dir)
+
+        self.assertFalse((target_obs_dir / RAW_FILES[1]).is_symlink())
+        self.assertTrue((target_obs_dir / RAW_FILES[0]).is_symlink())
+        linked = target_obs_dir / new_file.relative_to(store_obs_dir)
+        self.assertEqual(linked.read_bytes(), b"uncompressed")
+        self.assertFalse(product.is_symlink())
+        self.assertEqual(product.read_bytes(), b"result")
+
+    def test_remove_incomplete_downloads(self):
+        """
+        Test that incomplete downloads of a target and in the store are only
+        removed once they are TMP_DOWNLOAD_MIN_AGE old, so that those of
+        concurrent downloads are kept
+
+        :return: None
+        """
+        directory = self.make_target("target")
+        recent_tmp_dirs, old_tmp_dirs = [], []
+        for parent in [directory, self.store_dir]:
+            recent_tmp_dirs.append(parent / f"{TMP_DOWNLOAD_PREFIX}{OBS_ID}_a")
+            old_tmp_dirs.append(parent / f"{TMP_DOWNLOAD_PREFIX}{OBS_ID}_b")
+
+        old_time = time.time() - TMP_DOWNLOAD_MIN_AGE - 60.0
+        for tmp_dir in recent_tmp_dirs + old_tmp_dirs:
+            tmp_dir.mkdir()
+        for tmp_dir in old_tmp_dirs:
+            os.utime(tmp_dir, (old_time, old_time))
+
+        remove_incomplete_downloads(directory, store_dir=self.store_dir)
+
+        self.assertTrue(all(x.exists() for x in recent_tmp_dirs))
+        self.assertFalse(any(x.exists() for x in old_tmp_dirs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+"""
+Module for testing time conversions
+"""
+
+import unittest
+
+import numpy as np
+
+from uvotredux.utils.time import convert_met_to_utc
+
+
+class TestTime(unittest.TestCase):
+    """
+    Class for testing time conversions
+    """
+
+    def test_vectorized_met(self):
+        """
+        Test that converting an array of MET values matches scalar conversion
+
+        :return: None
+        """
+        mets = np.array([0.0, 5.0e8, 7.5e8 + 0.5])
+
+        times = convert_met_to_utc(mets)
+
+        self.assertEqual(times.shape, mets.shape)
+        for met, time in zip(mets, times):
+            scalar = convert_met_to_utc(float(met))
+            self.assertAlmostEqual(time.mjd, scalar.mjd, places=9)
+            self.assertEqual(time.isot, scalar.isot)
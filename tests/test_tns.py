@@ -0,0 +1,124 @@
+"""
+Module for testing TNS name resolution, against a local stand-in for TNS
+"""
+
+import tempfile
+import threading
+import time
+import unittest
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from uvotredux.utils.tns import TNSClient, get_retry_delay
+
+TNS_CSV_HEADER = '"ID","Name","RA","DEC","Disc. Internal Name"\n'
+
+TNS_ROW = '"1","AT 2020mni","16:40:18.420","+26:56:08.45","ZTF20abkavqj"'
+
+# Rows found by each query parameter and (stripped) name
+TNS_ROWS = {("name", "2020mni"): TNS_ROW, ("internal_name", "20abkavqj"): TNS_ROW}
+
+
+class TNSHandler(BaseHTTPRequestHandler):
+    """
+    Handler mimicking the TNS search, which asks for a retry on the first request
+    """
+
+    requests_seen = []
+    retry_after = "0"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Answer a TNS search
+
+        :return: None
+        """
+        query = parse_qs(urlparse(self.path).query)
+        self.requests_seen.append(query)
+
+        if len(self.requests_seen) == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", self.retry_after)
+            self.end_headers()
+            return
+
+        key = "internal_name" if "internal_name" in query else "name"
+        row = TNS_ROWS.get((key, query[key][0]))
+        body = TNS_CSV_HEADER + (row + "\n" if row is not None else "")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestTNS(unittest.TestCase):
+    """
+    Class for testing TNS name resolution
+    """
+
+    def setUp(self):
+        TNSHandler.requests_seen = []
+        TNSHandler.retry_after = "0"
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), TNSHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/search?"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resolve_cached(self):
+        """
+        Test that names are resolved after a rate limit, and that found and
+        missing names are then served from the shared cache
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "tns_cache.sqlite"
+
+            with TNSClient(cache_path, base_url=self.base_url, backoff=0.0) as client:
+                res = client.resolve("AT2020mni")
+                self.assertAlmostEqual(res["ra"], 250.07675)
+                self.assertAlmostEqual(res["dec"], 26.935681, places=6)
+                self.assertEqual(len(TNSHandler.requests_seen), 2)
+
+                # Survey names are queried by internal name first
+                found = client.resolve_many(["ZTF20abkavqj", "AT2099zzz"], workers=2)
+                self.assertEqual(list(found), ["ZTF20abkavqj"])
+                self.assertEqual(len(TNSHandler.requests_seen), 5)
+
+            with TNSClient(cache_path, base_url=self.base_url) as client:
+                self.assertEqual(client.resolve("at2020mni")["Name"], "AT 2020mni")
+                with self.assertRaises(ValueError):
+                    client.resolve("AT2099zzz")
+
+            self.assertEqual(len(TNSHandler.requests_seen), 5)
+
+    def test_retry_after(self):
+        """
+        Test that Retry-After headers are read in seconds or as HTTP dates,
+        falling back to the backoff otherwise
+
+        :return: None
+        """
+        self.assertEqual(get_retry_delay("2", default=5.0), 2.0)
+        self.assertEqual(get_retry_delay(None, default=5.0), 5.0)
+        self.assertEqual(get_retry_delay("later", default=5.0), 5.0)
+        self.assertEqual(get_retry_delay(formatdate(0.0, usegmt=True), 5.0), 0.0)
+        delay = get_retry_delay(formatdate(time.time() + 60.0, usegmt=True), 5.0)
+        self.assertTrue(50.0 < delay <= 60.0)
+
+        TNSHandler.retry_after = formatdate(time.time() - 60.0, usegmt=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "tns_cache.sqlite"
+            with TNSClient(cache_path, base_url=self.base_url, backoff=0.0) as client:
+                self.assertEqual(client.resolve("AT2020mni")["Name"], "AT 2020mni")
+        self.assertEqual(len(TNSHandler.requests_seen), 2)
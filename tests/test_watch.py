@@ -0,0 +1,132 @@
+"""
+Module for testing watch mode, offline with a local archive and stub tools
+"""
+
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from click.testing import CliRunner
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SOURCE_DEC,
+    SOURCE_RA,
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.cli import cli
+from uvotredux.download.query import OBS_QUERY_CACHE_NAME
+from uvotredux.uvot.output import load_uvot_results
+from uvotredux.watch import watch_targets
+
+
+class TestWatch(unittest.TestCase):
+    """
+    Class for testing watch mode
+    """
+
+    def test_watch_new_observations(self):
+        """
+        Test that only new observations are reduced and appended to the
+        results, with the hook called once per new measurement
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_dir = Path(tmp_dir) / "archive"
+            obs_ids = [x.name for x in make_observation_tree(archive_dir, n_obs=2)]
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+            output_dir = Path(tmp_dir) / "target"
+            output_dir.mkdir()
+
+            def fetcher(obs_id: str, download_dir: Path):
+                shutil.copytree(archive_dir / obs_id, download_dir / obs_id)
+
+            measurements = []
+
+            def hook(name: str, measurement: dict):
+                measurements.append((name, measurement["PARENT_DIR"]))
+
+            def watch(visible_obs_ids: list[str]):
+                # The cached query stands in for the archive
+                with open(output_dir / OBS_QUERY_CACHE_NAME, "w", encoding="utf8") as f:
+                    json.dump(
+                        {
+                            "ra": SOURCE_RA,
+                            "dec": SOURCE_DEC,
+                            "queried_at": time.time(),
+                            "observations": [
+                                {"obs_id": x, "begin": None} for x in visible_obs_ids
+                            ],
+                        },
+                        f,
+                    )
+                target = {
+                    "name": "target",
+                    "ra": SOURCE_RA,
+                    "dec": SOURCE_DEC,
+                    "output_dir": output_dir,
+                }
+                watch_targets(
+                    [target],
+                    hook=hook,
+                    max_polls=1,
+                    query_ttl=3600.0,
+                    fetcher=fetcher,
+                )
+                return target
+
+            with stub_tools(Path(tmp_dir) / "bin", template_output):
+                watch(obs_ids[:1])
+                self.assertEqual(measurements, [("target", obs_ids[0])] * 3)
+
+                target = watch(obs_ids)
+                self.assertEqual(target["known"], set(obs_ids))
+                self.assertEqual(measurements[3:], [("target", obs_ids[1])] * 3)
+
+                target = watch(obs_ids)
+                self.assertEqual(len(measurements), 6)
+                self.assertEqual(target["interval"], 1200.0)
+
+            self.assertEqual(len(load_uvot_results(output_dir, summary=True)), 6)
+
+    def test_watch_cli(self):
+        """
+        Test that the watch command passes its options on to watch_targets
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            targets_csv = Path(tmp_dir) / "targets.csv"
+            targets_csv.write_text(f"ra,dec\n{SOURCE_RA},{SOURCE_DEC}\n")
+
+            with mock.patch("uvotredux.watch.watch_targets") as watch:
+                result = CliRunner().invoke(
+                    cli,
+                    [
+                        "watch",
+                        str(targets_csv),
+                        "-d",
+                        tmp_dir,
+                        "--max-polls",
+                        "1",
+                        "--per-extension",
+                        "--quota",
+                        "1K",
+                    ],
+                )
+
+            self.assertEqual(result.exit_code, 0, result.output)
+            targets = watch.call_args.args[0]
+            self.assertEqual(len(targets), 1)
+            self.assertEqual(Path(targets[0]["output_dir"]).parent, Path(tmp_dir))
+            self.assertEqual(watch.call_args.kwargs["max_polls"], 1)
+            self.assertTrue(watch.call_args.kwargs["per_extension"])
+            self.assertEqual(watch.call_args.kwargs["quota"], 1024)
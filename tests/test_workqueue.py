@@ -0,0 +1,56 @@
+"""
+Module for testing the work queue, with synthetic observations and stub tools
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+)
+from uvotredux.uvot.output import load_uvot_results
+from uvotredux.workqueue import WorkQueue, run_worker
+
+
+class TestWorkQueue(unittest.TestCase):
+    """
+    Class for testing the work queue
+    """
+
+    def test_workers_finish_target(self):
+        """
+        Test that an expired lease is claimed by another worker, and that
+        workers reduce every image and then parse the target
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            make_observation_tree(output_dir, n_obs=2)
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+            queue_path = Path(tmp_dir) / "queue.sqlite"
+
+            self.assertEqual(WorkQueue(queue_path).enqueue_target(output_dir), 2)
+
+            # A worker which dies holding a task loses it once its lease expires
+            dead_queue = WorkQueue(queue_path, lease=0.0)
+            task = dead_queue.claim("dead")
+            self.assertEqual(task["kind"], "unpack")
+            self.assertEqual(WorkQueue(queue_path).claim("other")["id"], task["id"])
+            self.assertFalse(dead_queue.complete(task["id"], "dead"))
+            WorkQueue(queue_path).fail(task["id"], "other", "interrupted")
+
+            with stub_tools(Path(tmp_dir) / "bin", template_output):
+                n_tasks = run_worker(queue_path, heartbeat=0.1, poll_interval=0.1)
+
+            # 2 unpack, 3 images per observation, and the parse
+            self.assertEqual(n_tasks, 9)
+            self.assertEqual(len(load_uvot_results(output_dir, summary=True)), 6)
+            self.assertEqual(
+                WorkQueue(queue_path).get_status(), [(str(output_dir), "done", 9)]
+            )
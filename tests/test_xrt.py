@@ -0,0 +1,67 @@
+"""
+Module for testing the XRT reduction, with synthetic event files and stub tools
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.stubs import stub_tools
+from benchmarks.synthetic import (
+    SWIFT_MET_START,
+    make_observation_tree,
+    make_uvotsource_output,
+    make_xrt_event_file,
+)
+from uvotredux.utils.heasoft import get_heasoft_executor
+from uvotredux.xrt.iterate import iterate_xrt_reduction
+from uvotredux.xrt.parse import get_xrt_results_path
+
+
+class TestXRT(unittest.TestCase):
+    """
+    Class for testing the XRT reduction
+    """
+
+    def test_xrt_reduction(self):
+        """
+        Test that observations are reduced in parallel and measured,
+        and that only observations with changed inputs are reduced again
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = Path(tmp_dir) / "target"
+            event_paths = []
+            for obs_dir in make_observation_tree(output_dir, n_obs=2):
+                event_path = obs_dir / f"xrt/event/sw{obs_dir.name}xpcw3po_uf.evt.gz"
+                event_path.parent.mkdir(parents=True)
+                event_path.write_bytes(b"events")
+                event_paths.append(event_path)
+
+            template_output = Path(tmp_dir) / "template.out"
+            make_uvotsource_output(template_output, met=SWIFT_MET_START)
+            xrt_template = Path(tmp_dir) / "template.evt"
+            make_xrt_event_file(xrt_template, n_src=100, exposure=1000.0)
+
+            stats = get_heasoft_executor().stats
+
+            with stub_tools(
+                Path(tmp_dir) / "bin", template_output, xrt_template=xrt_template
+            ):
+                iterate_xrt_reduction(output_dir, workers=2)
+
+                df = pd.read_csv(get_xrt_results_path(output_dir))
+                self.assertEqual(len(df), 2)
+                for _, row in df.iterrows():
+                    self.assertLess(abs(row["RATE"] - 0.1), 5.0 * row["RATE_ERR"])
+
+                n_calls = stats["xrtpipeline"]["calls"]
+                iterate_xrt_reduction(output_dir)
+                self.assertEqual(stats["xrtpipeline"]["calls"], n_calls)
+
+                event_paths[0].write_bytes(b"new events")
+                iterate_xrt_reduction(output_dir)
+                self.assertEqual(stats["xrtpipeline"]["calls"], n_calls + 1)
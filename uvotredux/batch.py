@@ -0,0 +1,246 @@
+"""
+Module to run the uvotredux pipeline for many targets through a shared worker pool
+"""
+
+import logging
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from uvotredux.paths import default_base_dir, get_output_dir, get_tns_cache_path
+from uvotredux.run import main
+from uvotredux.utils.name import assign_source_name
+from uvotredux.utils.parallel import get_executor
+from uvotredux.utils.tns import (
+    DEFAULT_TNS_WORKERS,
+    TNS_CACHE_NAME,
+    TNSClient,
+    get_tns_by_name,
+)
+from uvotredux.uvot.output import load_uvot_results
+
+logger = logging.getLogger(__name__)
+
+BATCH_STATUS_NAME = "batch_status.csv"
+
+TARGET_COLUMNS = ["name", "ra", "dec"]
+
+BATCH_STATUS_COLUMNS = TARGET_COLUMNS + [
+    "output_dir",
+    "status",
+    "n_results",
+    "resolve_time",
+    "run_time",
+]
+
+
+def load_targets(targets_path: Path | str) -> pd.DataFrame:
+    """
+    Load a target list from a csv file.
+
+    The file must have a "name" column, and/or "ra" and "dec" columns in degrees.
+    Rows with coordinates are used as is, while rows with only a name are
+    resolved with TNS.
+
+    :param targets_path: Path to the csv file
+    :return: DataFrame of targets
+    """
+    try:
+        targets = pd.read_csv(targets_path)
+    except pd.errors.EmptyDataError:
+        logger.warning(f"No targets found in {targets_path}")
+        return pd.DataFrame(columns=TARGET_COLUMNS)
+
+    for col in TARGET_COLUMNS:
+        if col not in targets.columns:
+            targets[col] = None
+
+    missing = targets["name"].isna() & (targets["ra"].isna() | targets["dec"].isna())
+    if missing.any():
+        raise ValueError(
+            f"Targets in rows {list(targets.index[missing])} have neither "
+            f"a name nor ra/dec coordinates"
+        )
+
+    return targets
+
+
+def resolve_targets(
+    targets: pd.DataFrame,
+    base_data_dir: Path | str | None = None,
+    tns_workers: int = DEFAULT_TNS_WORKERS,
+) -> list[dict]:
+    """
+    Resolve the name, coordinates and output directory of each target.
+
+    Names without coordinates are first resolved concurrently with TNS,
+    unless they are already cached.
+
+    :param targets: DataFrame of targets (see load_targets)
+    :param base_data_dir: Base directory for data
+    :param tns_workers: Maximum number of concurrent TNS requests
+    :return: List of target records
+    """
+    to_query = [
+        row["name"]
+        for _, row in targets.iterrows()
+        if (pd.isna(row["ra"]) or pd.isna(row["dec"]))
+        and not (
+            get_output_dir(row["name"], base_data_dir=base_data_dir) / TNS_CACHE_NAME
+        ).exists()
+    ]
+
+    with TNSClient(
+        cache_path=get_tns_cache_path(base_data_dir), pool_size=tns_workers
+    ) as client:
+        if len(to_query) > 0:
+            logger.info(f"Resolving {len(to_query)} names with TNS")
+            client.resolve_many(to_query, workers=tns_workers)
+
+        resolved = []
+        for _, row in targets.iterrows():
+            start = time.perf_counter()
+            record = {"name": row["name"], "ra": row["ra"], "dec": row["dec"]}
+
+            try:
+                if pd.isna(row["ra"]) or pd.isna(row["dec"]):
+                    output_dir = get_output_dir(
+                        row["name"], base_data_dir=base_data_dir
+                    )
+                    tns_data = get_tns_by_name(
+                        row["name"], output_dir=output_dir, client=client
+                    )
+                    record["ra"], record["dec"] = tns_data["ra"], tns_data["dec"]
+                else:
+                    if pd.isna(row["name"]):
+                        record["name"] = assign_source_name(row["ra"], row["dec"])
+                    output_dir = get_output_dir(
+                        record["name"], base_data_dir=base_data_dir
+                    )
+                record["output_dir"] = output_dir
+                record["status"] = "resolved"
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error(f"Could not resolve target {row['name']}: {e}")
+                record["status"] = f"unresolved: {e}"
+
+            record["resolve_time"] = time.perf_counter() - start
+            resolved.append(record)
+
+    return resolved
+
+
+def run_target(target: dict, **kwargs) -> dict:
+    """
+    Run the pipeline for a single resolved target, recording status and timing
+
+    :param target: Target record (see resolve_targets)
+    :param kwargs: Additional arguments for uvotredux.run.main
+    :return: Updated target record
+    """
+    target = target.copy()
+    start = time.perf_counter()
+
+    try:
+        main(
+            ra_deg=float(target["ra"]),
+            dec_deg=float(target["dec"]),
+            output_dir=target["output_dir"],
+            **kwargs,
+        )
+        if kwargs.get("plan"):
+            target["status"] = "planned"
+        elif kwargs.get("queue_path") is not None:
+            target["status"] = "queued"
+        else:
+            summary = load_uvot_results(target["output_dir"], summary=True)
+            target["n_results"] = len(summary)
+            target["status"] = "ok"
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error(f"Pipeline failed for target {target['name']}: {e}")
+        target["status"] = f"failed: {e}"
+
+    target["run_time"] = time.perf_counter() - start
+    return target
+
+
+def run_resolved_targets(
+    targets: list[dict],
+    workers: int = 1,
+    **kwargs,
+) -> list[dict]:
+    """
+    Run the pipeline for resolved targets on a shared pool of worker processes
+
+    :param targets: List of target records (see resolve_targets)
+    :param workers: Number of worker processes shared by all targets
+    :param kwargs: Additional arguments for uvotredux.run.main
+    :return: List of updated target records
+    """
+    logger.info(f"Running pipeline for {len(targets)} targets with {workers} workers")
+
+    results = []
+    with get_executor(workers) as executor:
+        futures = [executor.submit(run_target, target, **kwargs) for target in targets]
+        for future in as_completed(futures):
+            res = future.result()
+            logger.info(f"Finished target {res['name']}: {res['status']}")
+            results.append(res)
+    return results
+
+
+def save_batch_status(
+    status: pd.DataFrame,
+    base_data_dir: Path | str | None = None,
+):
+    """
+    Save the status table of a batch run to the base data directory
+
+    :param status: DataFrame with the status of each target
+    :param base_data_dir: Base directory for data
+    :return: None
+    """
+    if base_data_dir is None:
+        base_data_dir = default_base_dir
+    status_path = Path(base_data_dir) / BATCH_STATUS_NAME
+    status.to_csv(status_path, index=False)
+    logger.info(f"Saved batch status to {status_path}")
+
+
+def run_batch(
+    targets: pd.DataFrame,
+    base_data_dir: Path | str | None = None,
+    workers: int = 1,
+    tns_workers: int = DEFAULT_TNS_WORKERS,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Run the pipeline for many targets.
+
+    All targets are resolved up front, and then download, reduction and parsing
+    for each target run as tasks on one shared pool of worker processes.
+
+    :param targets: DataFrame of targets (see load_targets)
+    :param base_data_dir: Base directory for data
+    :param workers: Number of worker processes shared by all targets
+    :param tns_workers: Maximum number of concurrent TNS requests
+    :param kwargs: Additional arguments for uvotredux.run.main,
+        e.g. overwrite, download or download_workers
+    :return: DataFrame with the status and timings of each target,
+        with the columns of BATCH_STATUS_COLUMNS
+    """
+    logger.info(f"Resolving {len(targets)} targets")
+    resolved = resolve_targets(
+        targets, base_data_dir=base_data_dir, tns_workers=tns_workers
+    )
+
+    results = [x for x in resolved if x["status"] != "resolved"]
+    to_run = [x for x in resolved if x["status"] == "resolved"]
+
+    results += run_resolved_targets(to_run, workers=workers, **kwargs)
+
+    status = pd.DataFrame(results).reindex(columns=BATCH_STATUS_COLUMNS)
+    status.sort_values(by="name", inplace=True, ignore_index=True)
+    save_batch_status(status, base_data_dir=base_data_dir)
+    return status
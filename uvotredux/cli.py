@@ -3,18 +3,93 @@ CLI tools for uvotredux
 """
 
 import logging
+from pathlib import Path
 
 import click
 
-from uvotredux.paths import get_output_dir
-from uvotredux.run import main
-from uvotredux.utils.name import assign_source_name
-from uvotredux.utils.tns import get_tns_by_name
+from uvotredux.options import (
+    DEFAULT_HEARTBEAT,
+    DEFAULT_LEASE,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_QUERY_TTL,
+    DEFAULT_TNS_WORKERS,
+    OUTPUT_FORMATS,
+    PARSE_ENGINES,
+    PHOTOMETRY_ENGINES,
+)
+from uvotredux.paths import (
+    default_base_dir,
+    get_output_dir,
+    get_queue_path,
+    get_store_dir,
+    get_tns_cache_path,
+)
+from uvotredux.utils.size import parse_size
 
 logger = logging.getLogger(__name__)
 
 logging.basicConfig(level=logging.INFO)
 
+# Modules with heavy dependencies (astropy, pandas, swifttools) are imported
+# inside each command, so that the CLI starts quickly.
+# pylint: disable=import-outside-toplevel
+
+DISK_QUOTA_ENV = "UVOTREDUX_DISK_QUOTA"
+
+
+def parse_quota(
+    _ctx: click.Context, _param: click.Parameter, value: str | None
+) -> int | None:
+    """
+    Parse a disk quota option, e.g. "500G"
+
+    :param _ctx: Click context
+    :param _param: Click parameter
+    :param value: Value of the option
+    :return: Quota in bytes, or None
+    """
+    if value is None:
+        return None
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+def quota_option(func):
+    """
+    Decorator to add the disk quota option to CLI commands
+
+    :param func: Function to decorate
+    :return: Decorated function
+    """
+    return click.option(
+        "--quota",
+        default=None,
+        envvar=DISK_QUOTA_ENV,
+        callback=parse_quota,
+        help="Disk quota of the data directory, e.g. 500G. Raw and intermediate "
+        "data of the least recently used targets are evicted to stay within it "
+        f"(or set {DISK_QUOTA_ENV})",
+    )(func)
+
+
+def per_extension_option(func):
+    """
+    Decorator to add the per-extension option to CLI commands
+
+    :param func: Function to decorate
+    :return: Decorated function
+    """
+    return click.option(
+        "--per-extension",
+        is_flag=True,
+        default=False,
+        help="Measure each snapshot (image extension) separately, "
+        "instead of summing them, for one measurement per snapshot",
+    )(func)
+
 
 def shared_options(func):
     """
@@ -39,6 +114,111 @@ def shared_options(func):
         help="Overwrite existing files",
         default=False,
     )(func)
+    func = click.option(
+        "-w",
+        "--workers",
+        type=click.IntRange(min=1),
+        default=1,
+        help="Number of worker processes to use for the reduction",
+    )(func)
+    func = click.option(
+        "--download-workers",
+        type=click.IntRange(min=1),
+        default=1,
+        help="Number of observations to download concurrently",
+    )(func)
+    func = click.option(
+        "--decompress-workers",
+        type=click.IntRange(min=1),
+        default=1,
+        help="Number of threads to decompress the images of each observation",
+    )(func)
+    func = click.option(
+        "--decompressor",
+        default=None,
+        help="External gzip decompressor to use, e.g. pigz, or 'auto' for the "
+        "first available fast one (or set UVOTREDUX_GUNZIP)",
+    )(func)
+    func = click.option(
+        "--query-ttl",
+        type=click.FloatRange(min=0.0),
+        default=DEFAULT_QUERY_TTL,
+        help="Seconds for which a cached Swift archive query is reused",
+    )(func)
+    func = click.option(
+        "--shared-store",
+        is_flag=True,
+        default=False,
+        help="Keep raw observations in a store shared between targets",
+    )(func)
+    func = click.option(
+        "--parse-engine",
+        type=click.Choice(PARSE_ENGINES),
+        default="astropy",
+        help="Engine used to parse the uvotsource output files",
+    )(func)
+    func = click.option(
+        "--output-format",
+        type=click.Choice(list(OUTPUT_FORMATS)),
+        default="csv",
+        help="Format of the results files",
+    )(func)
+    func = click.option(
+        "--profile",
+        is_flag=True,
+        default=False,
+        help="Save a JSON report of the time and resources used by each stage",
+    )(func)
+    func = click.option(
+        "--cprofile",
+        is_flag=True,
+        default=False,
+        help="Also save cProfile statistics of the main process",
+    )(func)
+    func = click.option(
+        "--queue",
+        is_flag=True,
+        default=False,
+        help="Add the reduction to the work queue in the data directory, "
+        "for 'uvotredux worker' processes, instead of running it here",
+    )(func)
+    func = click.option(
+        "--pipelined",
+        is_flag=True,
+        default=False,
+        help="Reduce each observation as soon as it is downloaded, with "
+        "--download-workers downloads and --workers reductions running at once",
+    )(func)
+    func = click.option(
+        "--plan",
+        is_flag=True,
+        default=False,
+        help="Only print the task graph of each target, "
+        "and which tasks are already done",
+    )(func)
+    func = click.option(
+        "--photometry",
+        type=click.Choice(PHOTOMETRY_ENGINES),
+        default="uvotsource",
+        help="Photometry engine: HEASoft uvotimsum and uvotsource, or a fast "
+        "approximate quick-look engine which does not need HEASoft",
+    )(func)
+    func = per_extension_option(func)
+    func = click.option(
+        "--xrt",
+        is_flag=True,
+        default=False,
+        help="Also reduce the XRT data with xrtpipeline, and measure "
+        "the XRT count rates",
+    )(func)
+    func = click.option(
+        "--cutouts",
+        is_flag=True,
+        default=False,
+        help="Also save small cutouts of the summed images around the target, "
+        "and a stacked cube per filter",
+    )(func)
+    func = quota_option(func)
     return func
 
 
@@ -52,15 +232,42 @@ def cli():
 @cli.command("by-name")
 @click.argument("name", type=str)
 @shared_options
-def run_by_name(name: str, download: bool, swift_obs_dir: str | None, overwrite: bool):
+def run_by_name(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    name: str,
+    download: bool,
+    swift_obs_dir: str | None,
+    overwrite: bool,
+    workers: int,
+    download_workers: int,
+    decompress_workers: int,
+    decompressor: str | None,
+    query_ttl: float,
+    shared_store: bool,
+    parse_engine: str,
+    output_format: str,
+    profile: bool,
+    cprofile: bool,
+    queue: bool,
+    pipelined: bool,
+    plan: bool,
+    photometry: str,
+    per_extension: bool,
+    xrt: bool,
+    cutouts: bool,
+    quota: int | None,
+):
     """
     Run uvotredux by name.
     """
+    from uvotredux.run import main
+    from uvotredux.utils.tns import TNSClient, get_tns_by_name
+
     logger.info(f"Running pipeline for source name {name}")
 
     output_dir = get_output_dir(name, base_data_dir=swift_obs_dir)
 
-    tns_data = get_tns_by_name(name, output_dir=output_dir)
+    with TNSClient(cache_path=get_tns_cache_path(swift_obs_dir)) as client:
+        tns_data = get_tns_by_name(name, output_dir=output_dir, client=client)
     if tns_data is None:
         logger.error(
             f"Could not find TNS data for {name}. "
@@ -73,6 +280,24 @@ def run_by_name(name: str, download: bool, swift_obs_dir: str | None, overwrite:
         output_dir=output_dir,
         overwrite=overwrite,
         download=download,
+        workers=workers,
+        download_workers=download_workers,
+        decompress_workers=decompress_workers,
+        decompressor=decompressor,
+        query_ttl=query_ttl,
+        store_dir=get_store_dir(swift_obs_dir) if shared_store else None,
+        parse_engine=parse_engine,
+        output_format=output_format,
+        profile=profile,
+        cprofile=cprofile,
+        queue_path=get_queue_path(swift_obs_dir) if queue else None,
+        pipelined=pipelined,
+        plan=plan,
+        photometry=photometry,
+        per_extension=per_extension,
+        xrt=xrt,
+        cutouts=cutouts,
+        quota=quota,
     )
 
 
@@ -80,12 +305,30 @@ def run_by_name(name: str, download: bool, swift_obs_dir: str | None, overwrite:
 @click.argument("ra_deg", type=str)
 @click.argument("dec_deg", type=str)
 @shared_options
-def run_by_ra_dec(
+def run_by_ra_dec(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
     ra_deg: float | str,
     dec_deg: float | str,
     download: bool,
     swift_obs_dir: str | None,
     overwrite: bool,
+    workers: int,
+    download_workers: int,
+    decompress_workers: int,
+    decompressor: str | None,
+    query_ttl: float,
+    shared_store: bool,
+    parse_engine: str,
+    output_format: str,
+    profile: bool,
+    cprofile: bool,
+    queue: bool,
+    pipelined: bool,
+    plan: bool,
+    photometry: str,
+    per_extension: bool,
+    xrt: bool,
+    cutouts: bool,
+    quota: int | None,
 ):
     """
     Run uvotredux by RA and Dec.
@@ -95,9 +338,30 @@ def run_by_ra_dec(
     :param download: Whether to download the data or not
     :param swift_obs_dir: Base directory for Swift observations
     :param overwrite: Overwrite existing files
+    :param workers: Number of worker processes to use for the reduction
+    :param download_workers: Number of observations to download concurrently
+    :param decompress_workers: Number of threads to decompress each observation
+    :param decompressor: External gzip decompressor to use, if any
+    :param query_ttl: Seconds for which a cached Swift archive query is reused
+    :param shared_store: Keep raw observations in a store shared between targets
+    :param parse_engine: Engine used to parse the uvotsource output files
+    :param output_format: Format of the results files
+    :param profile: Save a JSON report of the time and resources used by each stage
+    :param cprofile: Also save cProfile statistics of the main process
+    :param queue: Add the reduction to the work queue instead of running it
+    :param pipelined: Reduce each observation as soon as it is downloaded
+    :param plan: Only print the task graph and which tasks are already done
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param per_extension: Measure each snapshot separately
+    :param xrt: Also reduce the XRT data
+    :param cutouts: Also save cutouts and cubes of the summed images
+    :param quota: Disk quota of the data directory in bytes, if any
 
     :return: None
     """
+    from uvotredux.run import main
+    from uvotredux.utils.name import assign_source_name
+
     logger.info(f"Running pipeline for position {ra_deg} {dec_deg}")
 
     name = assign_source_name(ra_deg, dec_deg)
@@ -110,4 +374,353 @@ def run_by_ra_dec(
         output_dir=output_dir,
         overwrite=overwrite,
         download=download,
+        workers=workers,
+        download_workers=download_workers,
+        decompress_workers=decompress_workers,
+        decompressor=decompressor,
+        query_ttl=query_ttl,
+        store_dir=get_store_dir(swift_obs_dir) if shared_store else None,
+        parse_engine=parse_engine,
+        output_format=output_format,
+        profile=profile,
+        cprofile=cprofile,
+        queue_path=get_queue_path(swift_obs_dir) if queue else None,
+        pipelined=pipelined,
+        plan=plan,
+        photometry=photometry,
+        per_extension=per_extension,
+        xrt=xrt,
+        cutouts=cutouts,
+        quota=quota,
+    )
+
+
+@cli.command("batch")
+@click.argument("targets_csv", type=click.Path(exists=True, dir_okay=False))
+@shared_options
+@click.option(
+    "--tns-workers",
+    type=click.IntRange(min=1),
+    default=DEFAULT_TNS_WORKERS,
+    help="Maximum number of concurrent TNS requests when resolving names",
+)
+def run_batch_cli(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    targets_csv: str,
+    tns_workers: int,
+    download: bool,
+    swift_obs_dir: str | None,
+    overwrite: bool,
+    workers: int,
+    download_workers: int,
+    decompress_workers: int,
+    decompressor: str | None,
+    query_ttl: float,
+    shared_store: bool,
+    parse_engine: str,
+    output_format: str,
+    profile: bool,
+    cprofile: bool,
+    queue: bool,
+    pipelined: bool,
+    plan: bool,
+    photometry: str,
+    per_extension: bool,
+    xrt: bool,
+    cutouts: bool,
+    quota: int | None,
+):
+    """
+    Run uvotredux for every target in a csv file,
+    with a "name" column and/or "ra" and "dec" columns in degrees.
+    """
+    from uvotredux.batch import load_targets, run_batch
+
+    targets = load_targets(Path(targets_csv))
+
+    logger.info(f"Running pipeline for {len(targets)} targets in {targets_csv}")
+
+    status = run_batch(
+        targets,
+        base_data_dir=swift_obs_dir,
+        workers=workers,
+        tns_workers=tns_workers,
+        overwrite=overwrite,
+        download=download,
+        download_workers=download_workers,
+        decompress_workers=decompress_workers,
+        decompressor=decompressor,
+        query_ttl=query_ttl,
+        store_dir=get_store_dir(swift_obs_dir) if shared_store else None,
+        parse_engine=parse_engine,
+        output_format=output_format,
+        profile=profile,
+        cprofile=cprofile,
+        queue_path=get_queue_path(swift_obs_dir) if queue else None,
+        pipelined=pipelined,
+        plan=plan,
+        photometry=photometry,
+        per_extension=per_extension,
+        xrt=xrt,
+        cutouts=cutouts,
+        quota=quota,
+    )
+    print(
+        status[["name", "ra", "dec", "status", "resolve_time", "run_time"]].to_string()
+    )
+
+
+@cli.command("worker")
+@click.option(
+    "-d",
+    "--swift_obs_dir",
+    default=None,
+    help="Path to the base Swift observation directory, containing the work queue",
+)
+@click.option(
+    "--lease",
+    type=click.FloatRange(min=1.0),
+    default=DEFAULT_LEASE,
+    help="Seconds for which a claimed task is leased, before other workers "
+    "may claim it again",
+)
+@click.option(
+    "--heartbeat",
+    type=click.FloatRange(min=0.1),
+    default=DEFAULT_HEARTBEAT,
+    help="Seconds between renewals of the lease of a running task",
+)
+@click.option(
+    "--wait",
+    is_flag=True,
+    default=False,
+    help="Keep waiting for new tasks when the queue is empty",
+)
+@click.option(
+    "--max-tasks",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Stop after running this many tasks",
+)
+@click.option(
+    "--status",
+    is_flag=True,
+    default=False,
+    help="Print the number of tasks of each target by status, and exit",
+)
+def run_worker_cli(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    swift_obs_dir: str | None,
+    lease: float,
+    heartbeat: float,
+    wait: bool,
+    max_tasks: int | None,
+    status: bool,
+):
+    """
+    Run a worker, which reduces tasks from the work queue in the data directory.
+    Any number of workers can run on any nodes which share the data directory.
+    """
+    from uvotredux.workqueue import WorkQueue, run_worker
+
+    queue_path = get_queue_path(swift_obs_dir)
+
+    if status:
+        for target, task_status, count in WorkQueue(queue_path).get_status():
+            print(f"{target}\t{task_status}\t{count}")
+        return
+
+    run_worker(
+        queue_path,
+        lease=lease,
+        heartbeat=heartbeat,
+        wait=wait,
+        max_tasks=max_tasks,
+    )
+
+
+@cli.command("watch")
+@click.argument("targets_csv", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-d",
+    "--swift_obs_dir",
+    default=None,
+    help="Path to the base Swift observation directory",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=1.0),
+    default=DEFAULT_POLL_INTERVAL,
+    help="Seconds between polls of a target, doubled after each poll "
+    "without new observations",
+)
+@click.option(
+    "--max-interval",
+    type=click.FloatRange(min=1.0),
+    default=DEFAULT_MAX_POLL_INTERVAL,
+    help="Maximum seconds between polls of a target",
+)
+@click.option(
+    "--hook",
+    default=None,
+    help="Command to run for each new measurement, with the measurement "
+    "as JSON on its standard input and the target name in UVOTREDUX_TARGET",
+)
+@click.option(
+    "--max-polls",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Stop after polling each target this many times",
+)
+@click.option(
+    "--shared-store",
+    is_flag=True,
+    default=False,
+    help="Keep raw observations in a store shared between targets",
+)
+@click.option(
+    "--parse-engine",
+    type=click.Choice(PARSE_ENGINES),
+    default="astropy",
+    help="Engine used to parse the uvotsource output files",
+)
+@click.option(
+    "--output-format",
+    type=click.Choice(list(OUTPUT_FORMATS)),
+    default="csv",
+    help="Format of the results files",
+)
+@click.option(
+    "--photometry",
+    type=click.Choice(PHOTOMETRY_ENGINES),
+    default="uvotsource",
+    help="Photometry engine: HEASoft uvotimsum and uvotsource, or a fast "
+    "approximate quick-look engine which does not need HEASoft",
+)
+@per_extension_option
+@quota_option
+def run_watch_cli(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    targets_csv: str,
+    swift_obs_dir: str | None,
+    interval: float,
+    max_interval: float,
+    hook: str | None,
+    max_polls: int | None,
+    shared_store: bool,
+    parse_engine: str,
+    output_format: str,
+    photometry: str,
+    per_extension: bool,
+    quota: int | None,
+):
+    """
+    Watch the targets in a csv file for new Swift observations,
+    and reduce each new observation as soon as it appears.
+    """
+    from uvotredux.batch import load_targets, resolve_targets
+    from uvotredux.watch import make_command_hook, watch_targets
+
+    targets = resolve_targets(load_targets(Path(targets_csv)), swift_obs_dir)
+    targets = [x for x in targets if x["status"] == "resolved"]
+
+    logger.info(f"Watching {len(targets)} targets from {targets_csv}")
+
+    watch_targets(
+        targets,
+        interval=interval,
+        max_interval=max_interval,
+        hook=make_command_hook(hook) if hook is not None else None,
+        max_polls=max_polls,
+        store_dir=get_store_dir(swift_obs_dir) if shared_store else None,
+        parse_engine=parse_engine,
+        output_format=output_format,
+        photometry=photometry,
+        per_extension=per_extension,
+        quota=quota,
+    )
+
+
+@cli.command("add-source", context_settings={"ignore_unknown_options": True})
+@click.argument("target", type=str)
+@click.argument("source_name", type=str)
+@click.argument("ra_deg", type=float)
+@click.argument("dec_deg", type=float)
+@click.option(
+    "-d",
+    "--swift_obs_dir",
+    default=None,
+    help="Path to the base Swift observation directory",
+)
+@click.option(
+    "--radius",
+    type=click.FloatRange(min=0.0, min_open=True),
+    default=3.0,
+    help="Radius of the source region in arcseconds",
+)
+@click.option(
+    "-o",
+    "--overwrite",
+    is_flag=True,
+    help="Overwrite an existing region for this source",
+    default=False,
+)
+def run_add_source_cli(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    target: str,
+    source_name: str,
+    ra_deg: float,
+    dec_deg: float,
+    swift_obs_dir: str | None,
+    radius: float,
+    overwrite: bool,
+):
+    """
+    Add a named source (e.g. a host galaxy or comparison star) to a target.
+    It is measured on the same summed images as the target, the next time
+    the target is reduced.
+    """
+    from uvotredux.download.regions import create_source_region
+
+    output_dir = get_output_dir(target, base_data_dir=swift_obs_dir)
+    create_source_region(
+        source_name,
+        ra=ra_deg,
+        dec=dec_deg,
+        base_dir=output_dir,
+        radius_arcsec=radius,
+        overwrite=overwrite,
     )
+
+
+@cli.command("cache")
+@click.option(
+    "-d",
+    "--swift_obs_dir",
+    default=None,
+    help="Path to the base Swift observation directory",
+)
+@quota_option
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Only print the data which would be evicted to stay within the quota",
+)
+def run_cache_cli(swift_obs_dir: str | None, quota: int | None, dry_run: bool):
+    """
+    Print the raw and intermediate data of each target in the data directory,
+    and with --quota, evict the least recently used data to stay within it.
+    """
+    from uvotredux.quota import enforce_quota, get_disk_usage, get_usage_table
+    from uvotredux.utils.size import format_size
+
+    base_data_dir = Path(swift_obs_dir) if swift_obs_dir else default_base_dir
+
+    print(get_usage_table(base_data_dir).map(format_size).to_string())
+    print(f"Total disk usage: {format_size(get_disk_usage(base_data_dir))}")
+
+    if quota is None:
+        return
+
+    for artifact in enforce_quota(base_data_dir, quota, dry_run=dry_run):
+        print(
+            f"{'Would evict' if dry_run else 'Evicted'} {artifact['tier']} data "
+            f"of {artifact['obs_dir']} ({format_size(artifact['size'])})"
+        )
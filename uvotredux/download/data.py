@@ -3,50 +3,280 @@ Module to download data from the HEASARC archive.
 """
 
 import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from swifttools.swift_too import Data, ObsQuery
+from uvotredux.download.fetch import Fetcher, fetch_swift_archive
+from uvotredux.download.query import query_observations
+from uvotredux.download.store import link_observation
+from uvotredux.options import DEFAULT_QUERY_TTL
+from uvotredux.utils.profiling import annotate, span
 
 logger = logging.getLogger(__name__)
 
+TMP_DOWNLOAD_PREFIX = ".download_"
 
-def download_data(
+# Incomplete downloads may belong to another running process, downloading to
+# the same target directory or shared store, so are only removed once this old
+TMP_DOWNLOAD_MIN_AGE = 24.0 * 3600.0
+
+# Marker left in an observation directory once its raw data has been evicted
+# to keep within a disk quota (see uvotredux.quota)
+EVICTED_MARKER = ".evicted"
+
+
+def is_evicted(swift_obs_dir: Path) -> bool:
+    """
+    Check whether the raw data of an observation was evicted,
+    keeping only its results
+
+    :param swift_obs_dir: Single swift observation directory
+    :return: Boolean
+    """
+    return (swift_obs_dir / EVICTED_MARKER).is_file()
+
+
+def restore_observation(downloaded_dir: Path, out_dir: Path):
+    """
+    Function to move the files of a new download into an existing observation
+    directory, e.g. one whose raw data was evicted or is being overwritten.
+
+    Each downloaded file replaces its old copy, and stale uncompressed copies
+    of replaced images are removed, while the reduction products of the
+    observation are kept.
+
+    :param downloaded_dir: Directory of the new download
+    :param out_dir: Existing observation directory
+    :return: None
+    """
+    for root, _, files in os.walk(downloaded_dir):
+        rel_dir = Path(root).relative_to(downloaded_dir)
+        (out_dir / rel_dir).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            path = out_dir / rel_dir / name
+            if path.suffix == ".gz":
+                path.with_suffix("").unlink(missing_ok=True)
+            os.replace(Path(root) / name, path)
+    (out_dir / EVICTED_MARKER).unlink(missing_ok=True)
+
+
+def remove_incomplete_downloads(
+    directory: Path,
+    min_age: float = TMP_DOWNLOAD_MIN_AGE,
+    store_dir: Path | None = None,
+):
+    """
+    Function to remove incomplete downloads left behind by interrupted runs.
+    Recent ones are kept, as they may belong to a concurrent download.
+
+    :param directory: Directory the data was downloaded to
+    :param min_age: Only remove downloads older than this many seconds
+    :param store_dir: Shared observation store directory, if used
+    :return: None
+    """
+    for tmp_dir in directory.glob(f"{TMP_DOWNLOAD_PREFIX}*"):
+        if time.time() - tmp_dir.stat().st_mtime > min_age:
+            logger.info(f"Removing incomplete download: {tmp_dir}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if store_dir is not None:
+        remove_incomplete_downloads(store_dir, min_age=min_age)
+
+
+def download_observation(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    obs_id: str,
+    directory: Path,
+    overwrite: bool = False,
+    fetcher: Fetcher = fetch_swift_archive,
+    retries: int = 3,
+    backoff: float = 5.0,
+):
+    """
+    Function to download a single Swift observation, retrying on failure.
+
+    The observation is downloaded to a temporary directory, which is only
+    renamed to <directory>/<obs_id> once the download is complete.
+    Observations whose raw data was evicted are downloaded again.
+    Existing observations are only downloaded again with overwrite, and then
+    only their raw files are replaced, keeping the reduction products.
+
+    :param obs_id: Observation ID
+    :param directory: Directory to download the data to
+    :param overwrite: Download existing observations again
+    :param fetcher: Function to fetch the observation
+    :param retries: Number of retries after a failed download
+    :param backoff: Delay before the first retry, doubled after each failure
+    :return: None
+    """
+    out_dir = directory / f"{obs_id}"
+
+    if out_dir.is_dir() and not overwrite and not is_evicted(out_dir):
+        logger.info(f"Skipping existing directory: {out_dir}")
+        annotate(cache="skip")
+        return
+
+    for attempt in range(retries + 1):
+        logger.info(f"Downloading Swift data for observation: {obs_id}")
+        tmp_dir = Path(
+            tempfile.mkdtemp(dir=directory, prefix=f"{TMP_DOWNLOAD_PREFIX}{obs_id}_")
+        )
+        try:
+            fetcher(obs_id, tmp_dir)
+
+            downloaded_dir = tmp_dir / f"{obs_id}"
+            if not downloaded_dir.is_dir():
+                raise RuntimeError(f"No data downloaded for observation {obs_id}")
+
+            if not out_dir.is_dir():
+                os.replace(downloaded_dir, out_dir)
+            elif overwrite or is_evicted(out_dir):
+                logger.info(f"Replacing the raw data of observation {obs_id}")
+                restore_observation(downloaded_dir, out_dir)
+            else:
+                logger.info(f"Observation {obs_id} was downloaded by another process")
+                annotate(cache="skip")
+                return
+            annotate(cache="miss", attempts=attempt + 1)
+            return
+
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt
+            logger.warning(
+                f"Download of observation {obs_id} failed ({e}), "
+                f"retrying in {delay:.0f}s"
+            )
+            time.sleep(delay)
+
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def find_observations(
+    ra: float,
+    dec: float,
+    directory: Path,
+    query_ttl: float = DEFAULT_QUERY_TTL,
+) -> list[str]:
+    """
+    Function to find the IDs of the Swift observations at a position
+
+    :param ra: Right Ascension in degrees
+    :param dec: Declination in degrees
+    :param directory: Target directory, in which the query is cached
+    :param query_ttl: Time in seconds for which a cached archive query is reused
+    :return: Sorted list of observation IDs
+    """
+    logger.info(f"Searching Swift data for {ra}, {dec}")
+
+    try:
+        with span("query"):
+            observations = query_observations(
+                ra=ra, dec=dec, directory=directory, ttl=query_ttl
+            )
+    except RuntimeError as e:
+        logger.error(e)
+        return []
+
+    if len(observations) == 0:
+        logger.error("No Swift observations found")
+        return []
+
+    obs_ids = sorted(set(x["obs_id"] for x in observations))
+
+    logger.info(f"Found {len(obs_ids)} Swift observations")
+
+    return obs_ids
+
+
+def download_single_observation(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    obs_id: str,
+    directory: Path,
+    overwrite: bool = False,
+    fetcher: Fetcher = fetch_swift_archive,
+    retries: int = 3,
+    store_dir: Path | None = None,
+):
+    """
+    Function to download a single Swift observation to the target directory,
+    or to the shared store and link it into the target directory
+
+    :param obs_id: Observation ID
+    :param directory: Target directory
+    :param overwrite: Overwrite existing files
+    :param fetcher: Function to fetch the observation
+    :param retries: Number of retries after a failed download
+    :param store_dir: Shared observation store directory, if used
+    :return: None
+    """
+    with span("download_observation", obs_id=obs_id):
+        download_observation(
+            obs_id,
+            directory=directory if store_dir is None else store_dir,
+            overwrite=overwrite,
+            fetcher=fetcher,
+            retries=retries,
+        )
+        if store_dir is not None:
+            link_observation(store_dir / obs_id, directory / obs_id)
+
+
+def download_data(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     ra: float,
     dec: float,
     overwrite: bool = False,
     directory: Path | None = None,
+    workers: int = 1,
+    retries: int = 3,
+    fetcher: Fetcher = fetch_swift_archive,
+    query_ttl: float = DEFAULT_QUERY_TTL,
+    store_dir: Path | None = None,
 ):
     """
-    Function to download the Swift data from the HEASARC archive
+    Function to download the Swift data from the HEASARC archive.
+
+    If a store directory is given, observations are downloaded to the shared
+    store and linked into the target directory.
 
     :param ra: Right Ascension in degrees
     :param dec: Declination in degrees
     :param overwrite: Overwrite existing files
     :param directory: Directory to download the data to
+    :param workers: Number of observations to download concurrently
+    :param retries: Number of retries for each observation
+    :param fetcher: Function to fetch a single observation
+    :param query_ttl: Time in seconds for which a cached archive query is reused
+    :param store_dir: Shared observation store directory, if used
     :return: None
     """
 
     if directory is None:
         directory = Path.cwd()
 
-    logger.info(f"Searching Swift data for {ra}, {dec}")
+    obs_ids = find_observations(ra, dec, directory=directory, query_ttl=query_ttl)
 
-    oq = ObsQuery(ra=ra, dec=dec)
-
-    if len(oq) == 0:
-        logger.error("No Swift observations found")
+    if len(obs_ids) == 0:
         return
 
-    obs_ids = set(x.obsnum for x in oq)
+    remove_incomplete_downloads(directory, store_dir=store_dir)
 
-    logger.info(f"Found {len(obs_ids)} Swift observations")
-
-    for obs_id in sorted(obs_ids):
-        out_dir = directory / f"{obs_id}"
+    def download(obs_id: str):
+        try:
+            download_single_observation(
+                obs_id,
+                directory=directory,
+                overwrite=overwrite,
+                fetcher=fetcher,
+                retries=retries,
+                store_dir=store_dir,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f"Failed to download observation {obs_id}: {e}")
 
-        if out_dir.is_dir() and not overwrite:
-            logger.info(f"Skipping existing directory: {out_dir}")
-            continue
-
-        logger.info(f"Downloading Swift data for observation: {obs_id}")
-        Data(obsid=obs_id, uvot=True, xrt=True, outdir=out_dir.parent, clobber=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(download, obs_ids))
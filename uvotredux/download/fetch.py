@@ -0,0 +1,56 @@
+"""
+Module with fetchers to retrieve a single Swift observation.
+
+A fetcher is any callable taking an observation ID and a directory, which
+downloads the observation to <directory>/<obs_id>.
+"""
+
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Callable
+
+from swifttools.swift_too import Data
+
+logger = logging.getLogger(__name__)
+
+Fetcher = Callable[[str, Path], None]
+
+
+def fetch_swift_archive(obs_id: str, directory: Path):
+    """
+    Function to download a Swift observation from the HEASARC archive
+
+    :param obs_id: Observation ID
+    :param directory: Directory to download the observation to
+    :return: None
+    """
+    data = Data(obsid=obs_id, uvot=True, xrt=True, outdir=directory, clobber=True)
+    status = data.status
+    # pylint: disable=no-member
+    if status.status == "Rejected":
+        raise RuntimeError(
+            f"Error downloading Swift observation {obs_id}: {status.errors}"
+        )
+
+
+def fetch_local_archive(
+    obs_id: str,
+    directory: Path,
+    archive_dir: Path,
+    latency: float = 0.0,
+):
+    """
+    Function to copy a Swift observation from a local stand-in archive,
+    e.g. for benchmarking. Use with functools.partial to set the archive.
+
+    :param obs_id: Observation ID
+    :param directory: Directory to copy the observation to
+    :param archive_dir: Local archive directory containing <obs_id> directories
+    :param latency: Simulated network latency in seconds
+    :return: None
+    """
+    if latency > 0.0:
+        time.sleep(latency)
+    shutil.copytree(Path(archive_dir) / obs_id, directory / obs_id)
@@ -0,0 +1,166 @@
+"""
+Module to query the Swift archive for observations, with a local cache
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from swifttools.swift_too import ObsQuery
+
+from uvotredux.options import DEFAULT_QUERY_TTL
+from uvotredux.utils.profiling import annotate
+
+logger = logging.getLogger(__name__)
+
+OBS_QUERY_CACHE_NAME = "obs_query.json"
+
+QUERY_CACHE_KEYS = {"ra", "dec", "queried_at", "observations"}
+
+
+def query_swift_archive(
+    ra: float,
+    dec: float,
+    begin: datetime | None = None,
+) -> list[dict]:
+    """
+    Function to query the Swift archive for observations at a position
+
+    :param ra: Right Ascension in degrees
+    :param dec: Declination in degrees
+    :param begin: Only return observations starting at or after this time
+    :return: List of observation records, one per snapshot
+    """
+    kwargs = {"ra": ra, "dec": dec}
+    if begin is not None:
+        kwargs["begin"] = begin
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        kwargs["end"] = now + timedelta(days=1)
+
+    oq = ObsQuery(**kwargs)
+
+    status = oq.status
+    # pylint: disable=no-member
+    if status.status == "Rejected":
+        raise RuntimeError(f"Swift archive query failed: {status.errors}")
+
+    records = []
+    for x in oq:
+        exposure = x.exposure
+        records.append(
+            {
+                "obs_id": str(x.obsnum),
+                "begin": x.begin.isoformat() if x.begin is not None else None,
+                "end": x.end.isoformat() if x.end is not None else None,
+                "exposure": (
+                    exposure.total_seconds() if exposure is not None else None
+                ),
+                "uvot_mode": x.uvot_mode,
+            }
+        )
+    return records
+
+
+def load_query_cache(cache_path: Path, ra: float, dec: float) -> dict | None:
+    """
+    Function to load a cached Swift archive query for a position
+
+    :param cache_path: Path to the cache file
+    :param ra: Right Ascension in degrees
+    :param dec: Declination in degrees
+    :return: Cached query, or None if there is no valid cache for the position
+    """
+    if not cache_path.is_file():
+        return None
+
+    try:
+        with open(cache_path, "r", encoding="utf8") as f:
+            cache = json.load(f)
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable Swift query cache {cache_path}: {e}")
+        return None
+
+    if not isinstance(cache, dict) or not QUERY_CACHE_KEYS <= cache.keys():
+        logger.warning(f"Ignoring incomplete Swift query cache {cache_path}")
+        return None
+
+    if (cache["ra"], cache["dec"]) != (ra, dec):
+        logger.info("Cached Swift query is for a different position, ignoring")
+        return None
+
+    return cache
+
+
+def query_observations(
+    ra: float,
+    dec: float,
+    directory: Path,
+    ttl: float = DEFAULT_QUERY_TTL,
+) -> list[dict]:
+    """
+    Function to get the Swift observations at a position, using a cache.
+
+    Results are cached in the target directory. If the cache is younger than
+    the TTL it is used as is. Otherwise, the archive is only queried for
+    observations starting after the latest cached one, and these are
+    added to the cache. An unreadable cache is ignored, and replaced.
+
+    :param ra: Right Ascension in degrees
+    :param dec: Declination in degrees
+    :param directory: Target directory in which to cache the results
+    :param ttl: Time in seconds for which cached results are used without refresh
+    :return: List of observation records, one per snapshot
+    """
+    cache_path = directory / OBS_QUERY_CACHE_NAME
+
+    cache = load_query_cache(cache_path, ra, dec)
+
+    if cache is not None and time.time() - cache["queried_at"] < ttl:
+        logger.info(f"Using cached Swift query from {cache_path}")
+        annotate(cache="hit")
+        return cache["observations"]
+
+    queried_at = time.time()
+
+    if cache is None:
+        annotate(cache="miss")
+        observations = query_swift_archive(ra=ra, dec=dec)
+    else:
+        annotate(cache="refresh")
+        observations = cache["observations"]
+        begins = [x["begin"] for x in observations if x["begin"] is not None]
+        latest = max(begins) if len(begins) > 0 else None
+        logger.info(f"Querying Swift archive for observations since {latest}")
+        try:
+            new = query_swift_archive(
+                ra=ra,
+                dec=dec,
+                begin=datetime.fromisoformat(latest) if latest is not None else None,
+            )
+        except RuntimeError as e:
+            logger.warning(f"{e}. Using expired cached query instead.")
+            annotate(cache="expired")
+            return observations
+        known = {(x["obs_id"], x["begin"]) for x in observations}
+        new = [x for x in new if (x["obs_id"], x["begin"]) not in known]
+        logger.info(f"Found {len(new)} new Swift snapshots")
+        observations = observations + new
+
+    tmp_path = cache_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf8") as f:
+        json.dump(
+            {
+                "ra": ra,
+                "dec": dec,
+                "queried_at": queried_at,
+                "observations": observations,
+            },
+            f,
+            indent=2,
+        )
+    os.replace(tmp_path, cache_path)
+
+    return observations
@@ -3,13 +3,22 @@ Module to create region files for the Swift UVOT observations
 """
 
 import logging
+import re
 from pathlib import Path
 
-from astropy import units as u
-from astropy.coordinates import SkyCoord
+from uvotredux.utils.coords import format_sexagesimal, offset_by, parse_sexagesimal
 
 logger = logging.getLogger(__name__)
 
+# Name of the source in src.reg, in the SOURCE column of the results
+PRIMARY_SOURCE_NAME = "target"
+
+# Additional named sources (e.g. a host galaxy or comparison stars) have
+# region files named src_<name>.reg, and share the background region
+SOURCE_REGION_PREFIX = "src_"
+
+SOURCE_NAME_REGEX = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+
 
 def src_path(base_dir: Path) -> Path:
     """
@@ -33,6 +42,86 @@ def bkg_path(base_dir: Path) -> Path:
     return base_dir / "bkg.reg"
 
 
+def source_path(base_dir: Path, name: str) -> Path:
+    """
+    Function to get the path to the region file of an additional named source
+
+    :param base_dir: Base directory to create the region files
+    :param name: Name of the source
+
+    :return: Path to the source region file
+    """
+    return base_dir / f"{SOURCE_REGION_PREFIX}{name}.reg"
+
+
+def get_source_regions(base_dir: Path) -> dict[str, Path]:
+    """
+    Function to get the region files of the additional named sources of a target
+
+    :param base_dir: Base directory containing region files
+
+    :return: Dictionary of region paths by source name
+    """
+    return {
+        x.stem[len(SOURCE_REGION_PREFIX) :]: x
+        for x in sorted(Path(base_dir).glob(f"{SOURCE_REGION_PREFIX}*.reg"))
+    }
+
+
+def write_circle_region(path: Path, ra: float, dec: float, radius_arcsec: float):
+    """
+    Function to write a circular fk5 region file
+
+    :param path: Path of the region file
+    :param ra: Right Ascension in degrees
+    :param dec: Declination in degrees
+    :param radius_arcsec: Radius of the region in arcseconds
+
+    :return: None
+    """
+    ra_str = format_sexagesimal((ra % 360.0) / 15.0, sep=":", precision=2)
+    dec_str = format_sexagesimal(dec, sep=":", precision=2)
+    with open(path, "w", encoding="utf8") as f:
+        f.write(f'fk5;circle({ra_str},{dec_str},{radius_arcsec:g}")\n')
+
+
+def create_source_region(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    name: str,
+    ra: float,
+    dec: float,
+    base_dir: Path,
+    radius_arcsec: float = 3.0,
+    overwrite: bool = False,
+) -> Path:
+    """
+    Function to create the region file of an additional named source, which is
+    measured on the same summed images as the target
+
+    :param name: Name of the source, e.g. "host"
+    :param ra: Right Ascension in degrees
+    :param dec: Declination in degrees
+    :param base_dir: Base directory to create the region files
+    :param radius_arcsec: Radius of the source region in arcseconds
+    :param overwrite: Overwrite an existing region file
+
+    :return: Path to the source region file
+    """
+    if not SOURCE_NAME_REGEX.fullmatch(name) or name == PRIMARY_SOURCE_NAME:
+        raise ValueError(
+            f"Invalid source name '{name}'. Names may only contain letters, "
+            f"digits, '_' and '-', and '{PRIMARY_SOURCE_NAME}' is reserved."
+        )
+
+    region_path = source_path(base_dir, name)
+    if region_path.is_file() and not overwrite:
+        raise FileExistsError(f"Source region file already exists: {region_path}")
+
+    logger.info(f"Creating source region file: {region_path}")
+    Path(base_dir).mkdir(parents=True, exist_ok=True)
+    write_circle_region(region_path, ra, dec, radius_arcsec)
+    return region_path
+
+
 def create_regions(
     ra: float,
     dec: float,
@@ -60,36 +149,51 @@ def create_regions(
         logger.info(f"Skipping, source region file already exists: {src_region}")
     else:
         logger.info(f"Creating source region file: {src_region}")
-
-        c = SkyCoord(ra=ra, dec=dec, unit="deg")
-        ra_str = c.ra.to_string(unit="hour", sep=":", precision=2)
-        dec_str = c.dec.to_string(unit="deg", sep=":", precision=2)
-        with open(src_region, "w", encoding="utf8") as f:
-            f.write(f'fk5;circle({ra_str},{dec_str},3")\n')
+        write_circle_region(src_region, ra, dec, 3.0)
 
     if bkg_region.is_file() and not overwrite:
         logger.info(f"Skipping, background region file already exists: {bkg_region}")
     else:
         logger.info(f"Creating background region file: {bkg_region}")
 
-        c = SkyCoord(ra=ra, dec=dec, unit="deg")
-
-        separation = 50 * u.arcsec  # pylint: disable=no-member
-        position_angle = 45 * u.deg  # pylint: disable=no-member
+        separation_arcsec = 50.0
+        position_angle_deg = 45.0
 
-        c2 = c.directional_offset_by(position_angle, separation)
-
-        ra_str = c2.ra.to_string(unit="hour", sep=":", precision=2)
-        dec_str = c2.dec.to_string(unit="deg", sep=":", precision=2)
+        bkg_ra, bkg_dec = offset_by(
+            ra % 360.0, dec, position_angle_deg, separation_arcsec / 3600.0
+        )
 
         logger.warning(
             f"Creating a background region with a radius of 10 arcseconds "
-            f"and offset of {separation}, centered at {c2.ra:.5f}/{c2.dec:.5f}. "
+            f"and offset of {separation_arcsec} arcsec, "
+            f"centered at {bkg_ra:.5f} deg/{bkg_dec:.5f} deg. "
             f"Check your images to ensure this region only contains background."
         )
 
-        with open(bkg_region, "w", encoding="utf8") as f:
-            f.write(f'fk5;circle({ra_str},{dec_str},10")\n')
+        write_circle_region(bkg_region, bkg_ra, bkg_dec, 10.0)
+
+
+def load_circle_region(region_path: Path) -> tuple[float, float, float]:
+    """
+    Load a circular fk5 region file, as written by create_regions
+
+    :param region_path: Path to the region file
+    :return: Right Ascension and Declination in degrees, and radius in arcseconds
+    """
+    with open(region_path, "r", encoding="utf8") as f:
+        line = f.readlines()[0]
+
+    vals = line.split("(")[1].split(")")[0].split(",")
+    ra, dec = (parse_sexagesimal(vals[0]) * 15.0) % 360.0, parse_sexagesimal(vals[1])
+
+    radius = vals[2].strip()
+    if radius.endswith('"'):
+        radius_arcsec = float(radius[:-1])
+    elif radius.endswith("'"):
+        radius_arcsec = float(radius[:-1]) * 60.0
+    else:
+        radius_arcsec = float(radius) * 3600.0
+    return ra, dec, radius_arcsec
 
 
 def load_region(
@@ -105,14 +209,5 @@ def load_region(
     if base_dir is None:
         base_dir = Path.cwd()
 
-    src_region = src_path(base_dir)
-    with open(src_region, "r", encoding="utf8") as f:
-        line = f.readlines()[0]
-
-    vals = line.split("(")[1].split(",")
-    c = SkyCoord(
-        ra=vals[0],
-        dec=vals[1],
-        unit=(u.hourangle, u.deg),  # pylint: disable=no-member
-    )
-    return c.ra.degree, c.dec.degree
+    ra, dec, _ = load_circle_region(src_path(base_dir))
+    return ra, dec
@@ -7,15 +7,19 @@ from pathlib import Path
 
 from uvotredux.download.data import download_data
 from uvotredux.download.regions import create_regions
+from uvotredux.options import DEFAULT_QUERY_TTL
 
 logger = logging.getLogger(__name__)
 
 
-def run_download(
+def run_download(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     ra_deg: float,
     dec_deg: float,
     output_dir: Path,
     overwrite: bool = False,
+    workers: int = 1,
+    query_ttl: float = DEFAULT_QUERY_TTL,
+    store_dir: Path | None = None,
 ):
     """
     Function to download Swift data and create region files.
@@ -24,6 +28,9 @@ def run_download(
     :param dec_deg: Declination in degrees
     :param output_dir: Directory to save the data
     :param overwrite: Overwrite existing files
+    :param workers: Number of observations to download concurrently
+    :param query_ttl: Time in seconds for which a cached archive query is reused
+    :param store_dir: Shared observation store directory, if used
     :return: None
     """
 
@@ -31,4 +38,12 @@ def run_download(
     create_regions(ra=ra_deg, dec=dec_deg, base_dir=output_dir, overwrite=overwrite)
 
     # Download the data
-    download_data(ra=ra_deg, dec=dec_deg, overwrite=overwrite, directory=output_dir)
+    download_data(
+        ra=ra_deg,
+        dec=dec_deg,
+        overwrite=overwrite,
+        directory=output_dir,
+        workers=workers,
+        query_ttl=query_ttl,
+        store_dir=store_dir,
+    )
@@ -0,0 +1,59 @@
+"""
+Module for the shared store of raw Swift observations.
+
+Raw observations are downloaded once into the store, keyed by observation ID.
+Each target directory then contains a tree of symlinks into the store instead of
+a copy, while target-specific reduction products remain regular files.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def link_observation(store_obs_dir: Path, target_obs_dir: Path):
+    """
+    Function to link an observation from the store into a target directory.
+
+    The directory tree is recreated in the target directory, with a symlink
+    for each file in the store. Dangling links to files that are no longer in
+    the store are removed, while regular files are left untouched.
+
+    :param store_obs_dir: Observation directory in the store
+    :param target_obs_dir: Observation directory of the target
+    :return: None
+    """
+    store_obs_dir = store_obs_dir.absolute()
+
+    n_linked = 0
+    for root, _, files in os.walk(store_obs_dir):
+        rel_dir = Path(root).relative_to(store_obs_dir)
+        (target_obs_dir / rel_dir).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            link = target_obs_dir / rel_dir / name
+            if not link.exists() and not link.is_symlink():
+                link.symlink_to(Path(root) / name)
+                n_linked += 1
+
+    for root, _, files in os.walk(target_obs_dir):
+        for name in files:
+            path = Path(root) / name
+            if path.is_symlink() and not path.exists():
+                path.unlink()
+
+    logger.debug(f"Linked {n_linked} files from {store_obs_dir} to {target_obs_dir}")
+
+
+def get_stored_path(path: Path) -> Path:
+    """
+    Get the location of a file in the store, if it is linked from the store.
+    Files that are not linked are returned unchanged.
+
+    :param path: Path to a file in a target directory
+    :return: Path to the file in the store
+    """
+    if path.is_symlink():
+        return path.resolve()
+    return path
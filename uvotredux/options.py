@@ -0,0 +1,36 @@
+"""
+Module with the choices and defaults of the pipeline options.
+
+These have no heavy dependencies, so that the CLI can be built (and e.g.
+print its help) without importing astropy, pandas or swifttools.
+"""
+
+# Time in seconds for which a cached Swift archive query is reused
+DEFAULT_QUERY_TTL = 3600.0
+
+# Maximum number of concurrent TNS requests when resolving many names
+DEFAULT_TNS_WORKERS = 4
+
+# Time in seconds for which a work queue task is leased to a worker, and the
+# interval at which workers renew the lease while the task runs
+DEFAULT_LEASE = 600.0
+DEFAULT_HEARTBEAT = 60.0
+
+# Time in seconds between polls of a watched target, and the maximum it
+# backs off to while no new observations appear
+DEFAULT_POLL_INTERVAL = 600.0
+DEFAULT_MAX_POLL_INTERVAL = 6 * 3600.0
+
+PARSE_ENGINES = ["astropy", "fast"]
+
+# Photometry engines: HEASoft uvotimsum and uvotsource, or the numpy
+# quick-look engine, which needs no HEASoft (see uvotredux.uvot.quicklook)
+PHOTOMETRY_ENGINES = ["uvotsource", "quicklook"]
+
+# Output formats of the UVOT results, and their file extensions
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "hdf5": ".h5",
+}
@@ -7,6 +7,16 @@ from pathlib import Path
 
 default_base_dir = Path(os.getenv("UVOTREDUX_DATA_DIR", Path.home() / "uvotredux_data"))
 
+STORE_DIR_ENV = "UVOTREDUX_STORE_DIR"
+STORE_DIR_NAME = ".obs_store"
+
+WORK_QUEUE_NAME = ".work_queue.sqlite"
+
+CACHE_INDEX_NAME = ".cache_index.sqlite"
+
+TNS_CACHE_ENV = "UVOTREDUX_TNS_CACHE"
+TNS_SHARED_CACHE_NAME = ".tns_cache.sqlite"
+
 
 def get_output_dir(name: str, base_data_dir: Path | str | None = None) -> Path:
     """
@@ -21,3 +31,72 @@ def get_output_dir(name: str, base_data_dir: Path | str | None = None) -> Path:
     output_dir = Path(base_data_dir) / name
     output_dir.mkdir(parents=True, exist_ok=True)
     return output_dir
+
+
+def get_store_dir(base_data_dir: Path | str | None = None) -> Path:
+    """
+    Get the directory of the shared observation store.
+
+    This is UVOTREDUX_STORE_DIR if set, and otherwise a hidden
+    directory inside the base data directory.
+
+    :param base_data_dir: Base directory for data, defaults to default_base_dir
+    :return: Path to the store directory
+    """
+    store_dir = os.getenv(STORE_DIR_ENV)
+    if store_dir is None:
+        if base_data_dir is None:
+            base_data_dir = default_base_dir
+        store_dir = Path(base_data_dir) / STORE_DIR_NAME
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    return store_dir
+
+
+def get_tns_cache_path(base_data_dir: Path | str | None = None) -> Path:
+    """
+    Get the path of the TNS cache shared between targets.
+
+    This is UVOTREDUX_TNS_CACHE if set, and otherwise a hidden
+    file inside the base data directory.
+
+    :param base_data_dir: Base directory for data, defaults to default_base_dir
+    :return: Path to the TNS cache
+    """
+    cache_path = os.getenv(TNS_CACHE_ENV)
+    if cache_path is None:
+        if base_data_dir is None:
+            base_data_dir = default_base_dir
+        cache_path = Path(base_data_dir) / TNS_SHARED_CACHE_NAME
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    return cache_path
+
+
+def get_queue_path(base_data_dir: Path | str | None = None) -> Path:
+    """
+    Get the path of the work queue in the data directory.
+
+    :param base_data_dir: Base directory for data, defaults to default_base_dir
+    :return: Path to the work queue
+    """
+    if base_data_dir is None:
+        base_data_dir = default_base_dir
+    base_data_dir = Path(base_data_dir)
+    base_data_dir.mkdir(parents=True, exist_ok=True)
+    return base_data_dir / WORK_QUEUE_NAME
+
+
+def get_cache_index_path(base_data_dir: Path | str | None = None) -> Path:
+    """
+    Get the path of the index of data use in the data directory,
+    used to keep the data directory within a disk quota.
+
+    :param base_data_dir: Base directory for data, defaults to default_base_dir
+    :return: Path to the cache index
+    """
+    if base_data_dir is None:
+        base_data_dir = default_base_dir
+    base_data_dir = Path(base_data_dir)
+    base_data_dir.mkdir(parents=True, exist_ok=True)
+    return base_data_dir / CACHE_INDEX_NAME
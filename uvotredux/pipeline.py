@@ -0,0 +1,398 @@
+"""
+Module to run the pipeline for a target as a task graph:
+
+    query -> download obs -> decompress obs -> uvotimsum/uvotsource image -> parse
+
+Each observation is decompressed and reduced as soon as it has been downloaded,
+rather than after all downloads have finished. Network tasks (downloads) and
+CPU tasks (decompression and the HEASoft tools) run on separate pools, with
+separate concurrency limits, so that downloads and reduction overlap.
+"""
+
+import logging
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+
+from uvotredux.download.data import (
+    download_single_observation,
+    find_observations,
+    remove_incomplete_downloads,
+)
+from uvotredux.download.fetch import Fetcher, fetch_swift_archive
+from uvotredux.download.query import OBS_QUERY_CACHE_NAME
+from uvotredux.download.regions import (
+    bkg_path,
+    create_regions,
+    get_source_regions,
+    src_path,
+)
+from uvotredux.options import DEFAULT_QUERY_TTL
+from uvotredux.utils.parallel import get_executor
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.uvot.filters import filter_dict
+from uvotredux.uvot.manifest import get_manifest_path
+from uvotredux.uvot.output import get_results_path
+from uvotredux.uvot.parse import parse_uvot_results
+from uvotredux.uvot.reduce import (
+    get_image_extensions,
+    get_reduction_extensions,
+    get_source_output_path,
+    reduce_single_uvot_image,
+    unpack_uvot_images,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_filter_extensions(images: list[Path]) -> list[int] | None:
+    """
+    Get the exposed extensions of the sky images of a filter, reading the
+    compressed images if they were not yet decompressed
+
+    :param images: Sky images of the filter
+    :return: Sorted list of extension indices, or None if an image
+        could not be read
+    """
+    extensions = set()
+    for image in images:
+        try:
+            extensions.update(get_image_extensions(image))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the extensions of {image}: {e}")
+            return None
+    return sorted(extensions)
+
+
+def get_image_outputs(
+    uvot_dir: Path, sources: list[str] | None = None, per_extension: bool = False
+) -> dict[str, list[Path]]:
+    """
+    Get the uvotsource output paths of each filter with a sky image in a
+    UVOT directory, whether or not the image is still compressed
+
+    :param uvot_dir: UVOT image directory of an observation
+    :param sources: Names of additional sources measured on each image
+    :param per_extension: Whether each extension of the images is measured
+        separately, with one output per extension
+    :return: Dictionary of output paths (one per source and extension) by filter
+    """
+    images = {x.with_suffix(""): x for x in uvot_dir.glob("*_sk.img.gz")}
+    images.update({x: x for x in uvot_dir.glob("*_sk.img")})
+    filter_images = {}
+    for image in images.values():
+        filter_images.setdefault(filter_dict[image.name[14:16]], []).append(image)
+
+    outputs = {}
+    for uvot_filter in sorted(filter_images):
+        extensions = [None]
+        if per_extension:
+            extensions = get_filter_extensions(filter_images[uvot_filter])
+        if extensions is None:
+            # Unknown extensions, which are never satisfied
+            outputs[uvot_filter] = [uvot_dir / f"{uvot_filter}.*.out"]
+            continue
+        outputs[uvot_filter] = [
+            get_source_output_path(uvot_dir, uvot_filter, source, extension)
+            for source in [None] + list(sources or [])
+            for extension in extensions
+        ]
+    return outputs
+
+
+def plan_pipeline(
+    directory: Path,
+    obs_ids: list[str],
+    download: bool = True,
+    query_satisfied: bool = False,
+    per_extension: bool = False,
+) -> list[dict]:
+    """
+    Build the task graph of a target, and check which tasks are already satisfied
+
+    Images are only known once an observation has been downloaded, so the
+    reduction of observations which are not yet downloaded is a single task.
+
+    :param directory: Target directory
+    :param obs_ids: Observation IDs
+    :param download: Whether the observations are downloaded
+    :param query_satisfied: Whether the archive query was already cached
+    :param per_extension: Whether each extension of the images is measured
+        separately
+    :return: List of tasks, with their name, dependencies and whether satisfied
+    """
+    tasks = []
+    if download:
+        tasks.append({"name": "query", "deps": [], "satisfied": query_satisfied})
+
+    sources = list(get_source_regions(directory))
+    outputs = []
+    for obs_id in obs_ids:
+        uvot_dir = directory / obs_id / "uvot/image"
+        deps = []
+        if download:
+            tasks.append(
+                {
+                    "name": f"download {obs_id}",
+                    "deps": ["query"],
+                    "satisfied": (directory / obs_id).is_dir(),
+                }
+            )
+            deps = [f"download {obs_id}"]
+
+        tasks.append(
+            {
+                "name": f"decompress {obs_id}",
+                "deps": deps,
+                "satisfied": (directory / obs_id).is_dir()
+                and all(
+                    x.with_suffix("").is_file() for x in uvot_dir.glob("*_sk.img.gz")
+                ),
+            }
+        )
+
+        image_outputs = get_image_outputs(
+            uvot_dir, sources=sources, per_extension=per_extension
+        )
+        if not (directory / obs_id).is_dir():
+            image_outputs = {"*": [uvot_dir / "*.out"]}
+        for uvot_filter, output_paths in image_outputs.items():
+            tasks.append(
+                {
+                    "name": f"uvotimsum/uvotsource {obs_id} {uvot_filter}",
+                    "deps": [f"decompress {obs_id}"],
+                    "satisfied": all(x.is_file() for x in output_paths),
+                }
+            )
+            outputs += output_paths
+
+    results_path = get_results_path(directory)
+    tasks.append(
+        {
+            "name": "parse",
+            "deps": [
+                x["name"] for x in tasks if x["name"].startswith("uvotimsum/uvotsource")
+            ],
+            "satisfied": results_path.is_file()
+            and all(
+                x.is_file() and x.stat().st_mtime <= results_path.stat().st_mtime
+                for x in outputs
+            ),
+        }
+    )
+    return tasks
+
+
+def print_plan(tasks: list[dict]):
+    """
+    Print the task graph, indenting each task below the task it depends on
+
+    :param tasks: List of tasks (see plan_pipeline)
+    :return: None
+    """
+    depths = {}
+    for task in tasks:
+        # The parse task, which depends on all others, is shown last unindented
+        if len(task["deps"]) == 0 or task["name"] == "parse":
+            depths[task["name"]] = 0
+        else:
+            depths[task["name"]] = 1 + depths[task["deps"][0]]
+        status = "done" if task["satisfied"] else "todo"
+        print(f"[{status}] {'  ' * depths[task['name']]}{task['name']}")
+
+    n_todo = sum(not x["satisfied"] for x in tasks)
+    print(f"{len(tasks)} tasks, {n_todo} to run")
+
+
+def show_plan(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    ra_deg: float,
+    dec_deg: float,
+    output_dir: Path,
+    download: bool = True,
+    query_ttl: float = DEFAULT_QUERY_TTL,
+    per_extension: bool = False,
+):
+    """
+    Print the task graph of a target, and which tasks are already satisfied.
+    The archive is queried (or the cached query used) to find the observations,
+    but nothing is downloaded or reduced.
+
+    :param ra_deg: Right Ascension in degrees
+    :param dec_deg: Declination in degrees
+    :param output_dir: Directory to save the data
+    :param download: Whether to download the data or not
+    :param query_ttl: Time in seconds for which a cached archive query is reused
+    :param per_extension: Whether each extension of the images is measured
+        separately
+    :return: None
+    """
+    output_dir = Path(output_dir)
+    if download:
+        query_satisfied = (output_dir / OBS_QUERY_CACHE_NAME).is_file()
+        obs_ids = find_observations(
+            ra_deg, dec_deg, directory=output_dir, query_ttl=query_ttl
+        )
+    else:
+        query_satisfied = True
+        obs_ids = sorted(x.name for x in get_observation_dirs(output_dir))
+
+    print_plan(
+        plan_pipeline(
+            output_dir,
+            obs_ids,
+            download=download,
+            query_satisfied=query_satisfied,
+            per_extension=per_extension,
+        )
+    )
+
+
+def run_pipeline(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    ra_deg: float,
+    dec_deg: float,
+    output_dir: Path,
+    overwrite: bool = False,
+    download: bool = True,
+    workers: int = 1,
+    download_workers: int = 1,
+    query_ttl: float = DEFAULT_QUERY_TTL,
+    store_dir: Path | None = None,
+    parse_engine: str = "astropy",
+    output_format: str = "csv",
+    photometry: str = "uvotsource",
+    per_extension: bool = False,
+    decompress_workers: int = 1,
+    decompressor: str | None = None,
+    fetcher: Fetcher = fetch_swift_archive,
+):
+    """
+    Function to run the pipeline for a target as a task graph,
+    reducing each observation as soon as it has been downloaded
+
+    :param ra_deg: Right Ascension in degrees
+    :param dec_deg: Declination in degrees
+    :param output_dir: Directory to save the data
+    :param overwrite: Overwrite existing files
+    :param download: Whether to download the data or not
+    :param workers: Number of worker processes for the CPU tasks
+    :param download_workers: Number of observations to download concurrently
+    :param query_ttl: Time in seconds for which a cached archive query is reused
+    :param store_dir: Shared observation store directory, if used
+    :param parse_engine: Engine used to parse the results ("astropy" or "fast")
+    :param output_format: Format of the results files (see OUTPUT_FORMATS)
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param per_extension: Measure each extension of the images separately,
+        as one task per extension
+    :param decompress_workers: Number of threads to decompress the images
+        of each observation
+    :param decompressor: External decompressor, e.g. "pigz" or "auto",
+        defaulting to the UVOTREDUX_GUNZIP environment variable
+    :param fetcher: Function to fetch a single observation
+    :return: None
+    """
+    output_dir = Path(output_dir)
+
+    if download:
+        create_regions(ra=ra_deg, dec=dec_deg, base_dir=output_dir, overwrite=overwrite)
+        obs_ids = find_observations(
+            ra_deg, dec_deg, directory=output_dir, query_ttl=query_ttl
+        )
+        remove_incomplete_downloads(output_dir, store_dir=store_dir)
+    else:
+        obs_ids = sorted(x.name for x in get_observation_dirs(output_dir))
+
+    reduce_kwargs = {
+        "src_region_path": src_path(output_dir),
+        "bkg_region_path": bkg_path(output_dir),
+        "overwrite": overwrite,
+        "manifest_path": get_manifest_path(output_dir),
+        "source_regions": get_source_regions(output_dir),
+        "photometry": photometry,
+    }
+    unpack_kwargs = {"workers": decompress_workers, "decompressor": decompressor}
+
+    logger.info(
+        f"Running pipeline for {len(obs_ids)} observations with "
+        f"{download_workers} network and {workers} CPU workers"
+    )
+
+    with (
+        ThreadPoolExecutor(max_workers=download_workers) as network,
+        get_executor(workers) as cpu,
+    ):
+        running: dict[Future, tuple[str, str]] = {}
+
+        def submit(pool: Executor, stage: str, key: str, func, *args, **kwargs):
+            running[pool.submit(func, *args, **kwargs)] = (stage, key)
+
+        def submit_reduction(image: Path):
+            try:
+                extensions = get_reduction_extensions(image, per_extension)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error(f"Pipeline task reduce {image.name} failed: {e}")
+                return
+            for extension in extensions:
+                submit(
+                    cpu,
+                    "reduce",
+                    image.name,
+                    reduce_single_uvot_image,
+                    image,
+                    extension=extension,
+                    **reduce_kwargs,
+                )
+
+        for obs_id in obs_ids:
+            if download:
+                submit(
+                    network,
+                    "download",
+                    obs_id,
+                    download_single_observation,
+                    obs_id,
+                    directory=output_dir,
+                    overwrite=overwrite,
+                    fetcher=fetcher,
+                    store_dir=store_dir,
+                )
+            else:
+                submit(
+                    cpu,
+                    "decompress",
+                    obs_id,
+                    unpack_uvot_images,
+                    output_dir / obs_id / "uvot/image",
+                    **unpack_kwargs,
+                )
+
+        while len(running) > 0:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key = running.pop(future)
+                try:
+                    res = future.result()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    logger.error(f"Pipeline task {stage} {key} failed: {e}")
+                    continue
+
+                if stage == "download":
+                    submit(
+                        cpu,
+                        "decompress",
+                        key,
+                        unpack_uvot_images,
+                        output_dir / key / "uvot/image",
+                        **unpack_kwargs,
+                    )
+                elif stage == "decompress":
+                    for image in res:
+                        submit_reduction(image)
+
+    parse_uvot_results(
+        output_dir, engine=parse_engine, workers=workers, output_format=output_format
+    )
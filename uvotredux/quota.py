@@ -0,0 +1,536 @@
+"""
+Module to keep the data directory within a disk quota, by evicting the raw
+and intermediate products of the least recently used observations.
+
+Products are evicted in order of how cheap they are to make again
+(see EVICTION_TIERS): uncompressed images, then summed images, then XRT
+pipeline products, and only then the raw downloads. Within a tier, the
+observations used least recently are evicted first. The results (uvotsource
+outputs, logs, cutouts and results tables) are never evicted, so an evicted
+observation keeps its rows in the results, and is downloaded again if it
+needs to be reduced again.
+
+The last use of each observation, the targets in use by running reductions,
+and the work queues which targets were added to, are recorded in an SQLite
+index in the data directory. Targets which are in use, or have active tasks
+in any of these work queues, are never evicted.
+"""
+
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from uvotredux.download.data import EVICTED_MARKER, is_evicted
+from uvotredux.options import DEFAULT_HEARTBEAT, DEFAULT_LEASE
+from uvotredux.paths import STORE_DIR_NAME, WORK_QUEUE_NAME, get_cache_index_path
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.utils.size import format_size
+from uvotredux.uvot.cutout import CUTOUT_SUFFIX, get_summed_images
+from uvotredux.workqueue import ACTIVE_STATUSES, WorkQueue, keep_alive
+from uvotredux.xrt.reduce import get_xrt_output_dir
+
+logger = logging.getLogger(__name__)
+
+# Products in order of eviction, from the cheapest to make again
+EVICTION_TIERS = ["uncompressed", "summed", "xrt", "raw"]
+
+# Results of the reduction, which are never evicted
+RESULT_SUFFIXES = (".out", ".log")
+
+# Target name of the artifacts of the shared observation store
+STORE_TARGET = "(store)"
+
+
+def get_tree_size(path: Path) -> int:
+    """
+    Get the size of the files in a directory tree, not following symlinks
+
+    :param path: File or directory
+    :return: Size in bytes
+    """
+    if path.is_symlink() or not path.exists():
+        return 0
+    if path.is_file():
+        return path.stat().st_size
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = Path(root) / name
+            if not file_path.is_symlink():
+                size += file_path.lstat().st_size
+    return size
+
+
+def is_result(path: Path) -> bool:
+    """
+    Check whether a file is a result of the reduction, which is never evicted
+
+    :param path: Path to a file in an observation directory
+    :return: Boolean
+    """
+    return (
+        path.suffix in RESULT_SUFFIXES
+        or path.stem.endswith(CUTOUT_SUFFIX)
+        or path.name == EVICTED_MARKER
+    )
+
+
+class CacheIndex:
+    """
+    Record of the last use of each observation, of the targets in use by
+    running reductions, and of the work queues used for targets, shared
+    between processes and nodes.
+
+    Targets are pinned with a lease, which running reductions renew with
+    heartbeats, so that pins of processes which died expire.
+    """
+
+    def __init__(self, path: Path, lease: float = DEFAULT_LEASE):
+        self.path = Path(path)
+        self.lease = lease
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection to the index, creating tables if needed
+
+        :return: SQLite connection
+        """
+        conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS uses (obs_dir TEXT PRIMARY KEY, last_used REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pins (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "target TEXT, host TEXT, pid INTEGER, until REAL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS queues (path TEXT PRIMARY KEY)")
+        return conn
+
+    def record_use(self, obs_dirs: list[Path]):
+        """
+        Record that observations were used now
+
+        :param obs_dirs: Observation directories
+        :return: None
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO uses (obs_dir, last_used) VALUES (?, ?)",
+                [(str(Path(x).absolute()), now) for x in obs_dirs],
+            )
+
+    def get_last_used(self) -> dict[str, float]:
+        """
+        Get the last use of each recorded observation
+
+        :return: Dictionary of times by observation directory
+        """
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT obs_dir, last_used FROM uses"))
+
+    def pin(self, directory: Path) -> int:
+        """
+        Pin a target as in use, until the lease expires
+
+        :param directory: Target directory
+        :return: Pin ID
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO pins (target, host, pid, until) VALUES (?, ?, ?, ?)",
+                (
+                    str(Path(directory).absolute()),
+                    socket.gethostname(),
+                    os.getpid(),
+                    time.time() + self.lease,
+                ),
+            )
+            return cursor.lastrowid
+
+    def renew(self, pin_id: int):
+        """
+        Renew the lease of a pin
+
+        :param pin_id: Pin ID
+        :return: None
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE pins SET until = ? WHERE id = ?",
+                (time.time() + self.lease, pin_id),
+            )
+
+    def unpin(self, pin_id: int):
+        """
+        Remove a pin, and any pins whose lease has expired
+
+        :param pin_id: Pin ID
+        :return: None
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM pins WHERE id = ? OR until < ?", (pin_id, time.time())
+            )
+
+    def get_pinned_targets(self) -> set[str]:
+        """
+        Get the targets which are in use
+
+        :return: Set of target directories
+        """
+        with closing(self._connect()) as conn:
+            return {
+                row[0]
+                for row in conn.execute(
+                    "SELECT DISTINCT target FROM pins WHERE until >= ?", (time.time(),)
+                )
+            }
+
+    def record_queue(self, queue_path: Path):
+        """
+        Record a work queue which targets of the data directory were added to
+
+        :param queue_path: Path to the work queue
+        :return: None
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO queues (path) VALUES (?)",
+                (str(Path(queue_path).absolute()),),
+            )
+
+    def get_queue_paths(self) -> list[Path]:
+        """
+        Get the recorded work queues
+
+        :return: List of work queue paths
+        """
+        with closing(self._connect()) as conn:
+            return [Path(row[0]) for row in conn.execute("SELECT path FROM queues")]
+
+
+@contextmanager
+def in_use(
+    directory: Path,
+    lease: float = DEFAULT_LEASE,
+    heartbeat: float = DEFAULT_HEARTBEAT,
+):
+    """
+    Context manager which pins a target as in use, so that none of its data is
+    evicted, and records the use of its observations. The index is kept in the
+    parent directory of the target, i.e. the data directory.
+
+    :param directory: Target directory
+    :param lease: Seconds for which the pin lasts without a heartbeat
+    :param heartbeat: Seconds between renewals of the pin
+    :return: None
+    """
+    directory = Path(directory)
+    index = CacheIndex(get_cache_index_path(directory.parent), lease=lease)
+    pin_id = index.pin(directory)
+
+    def renew() -> bool:
+        index.renew(pin_id)
+        return True
+
+    try:
+        with keep_alive(renew, heartbeat):
+            yield
+    finally:
+        index.record_use(get_observation_dirs(directory))
+        index.unpin(pin_id)
+
+
+def get_queued_targets(base_data_dir: Path, queue_path: Path | None = None) -> set[str]:
+    """
+    Get the targets with pending or running tasks in the work queue of the
+    data directory, in the work queues recorded in its index, or in queue_path
+
+    :param base_data_dir: Base data directory
+    :param queue_path: Path to another work queue, if used
+    :return: Set of target directories
+    """
+    queue_paths = {(Path(base_data_dir) / WORK_QUEUE_NAME).absolute()}
+    queue_paths.update(
+        CacheIndex(get_cache_index_path(base_data_dir)).get_queue_paths()
+    )
+    if queue_path is not None:
+        queue_paths.add(Path(queue_path).absolute())
+
+    return {
+        target
+        for path in queue_paths
+        if path.is_file()
+        for target, status, _ in WorkQueue(path).get_status()
+        if status in ACTIVE_STATUSES
+    }
+
+
+def get_uncompressed_images(image_dir: Path) -> list[Path]:
+    """
+    Get the uncompressed sky images which can be made again from the
+    compressed images next to them
+
+    :param image_dir: UVOT image directory
+    :return: List of uncompressed images
+    """
+    return [
+        x
+        for x in sorted(image_dir.glob("*_sk.img"))
+        if x.is_file() and not x.is_symlink() and x.with_name(f"{x.name}.gz").exists()
+    ]
+
+
+def find_observation_artifacts(swift_obs_dir: Path, target: str) -> list[dict]:
+    """
+    Find the evictable products of an observation
+
+    :param swift_obs_dir: Single swift observation directory
+    :param target: Name of the target, or STORE_TARGET for the store
+    :return: List of artifacts, with the target, observation directory,
+        tier, paths and size of each
+    """
+    uncompressed = get_uncompressed_images(swift_obs_dir / "uvot/image")
+    summed = get_summed_images(swift_obs_dir)
+
+    artifacts = [
+        {"tier": "uncompressed", "paths": uncompressed},
+        {"tier": "summed", "paths": summed},
+        {"tier": "xrt", "paths": [get_xrt_output_dir(swift_obs_dir)]},
+        {
+            "tier": "raw",
+            "paths": (
+                [swift_obs_dir]
+                if target == STORE_TARGET
+                else [
+                    x
+                    for x in swift_obs_dir.rglob("*")
+                    if x.is_file()
+                    and not x.is_symlink()
+                    and not is_result(x)
+                    and x not in uncompressed + summed
+                ]
+            ),
+        },
+    ]
+    for artifact in artifacts:
+        artifact["target"] = target
+        artifact["obs_dir"] = swift_obs_dir
+        artifact["size"] = sum(get_tree_size(x) for x in artifact["paths"])
+        if artifact["tier"] == "raw" and target == STORE_TARGET:
+            artifact["size"] -= sum(
+                x["size"] for x in artifacts if x["tier"] == "uncompressed"
+            )
+    return [x for x in artifacts if x["size"] > 0]
+
+
+def find_artifacts(base_data_dir: Path, store_dir: Path | None = None) -> list[dict]:
+    """
+    Find the evictable products of every observation in the data directory
+
+    :param base_data_dir: Base data directory
+    :param store_dir: Shared observation store directory, if used
+    :return: List of artifacts (see find_observation_artifacts)
+    """
+    artifacts = []
+    for target_dir in sorted(Path(base_data_dir).iterdir()):
+        if not target_dir.is_dir() or target_dir.name.startswith("."):
+            continue
+        for swift_obs in sorted(get_observation_dirs(target_dir)):
+            if not is_evicted(swift_obs):
+                artifacts += find_observation_artifacts(swift_obs, target_dir.name)
+
+    if store_dir is not None and Path(store_dir).is_dir():
+        for swift_obs in sorted(get_observation_dirs(Path(store_dir))):
+            artifacts += find_observation_artifacts(swift_obs, STORE_TARGET)
+
+    return artifacts
+
+
+def evict_artifact(artifact: dict) -> int:
+    """
+    Delete the files of an artifact. Once the raw data of an observation in a
+    target directory is evicted, only its results are kept, and it is marked
+    so that it is downloaded again if needed.
+
+    :param artifact: Artifact (see find_observation_artifacts)
+    :return: Bytes freed
+    """
+    freed = 0
+    for path in artifact["paths"]:
+        freed += get_tree_size(path)
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    if artifact["tier"] == "raw" and artifact["target"] != STORE_TARGET:
+        obs_dir = artifact["obs_dir"]
+        for path in sorted(obs_dir.rglob("*"), reverse=True):
+            if path.is_symlink() or (path.is_file() and not is_result(path)):
+                path.unlink()
+            elif path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+        (obs_dir / EVICTED_MARKER).touch()
+
+    logger.info(
+        f"Evicted {artifact['tier']} data of {artifact['obs_dir']} "
+        f"({format_size(freed)})"
+    )
+    return freed
+
+
+def get_quota_store_dir(
+    base_data_dir: Path, store_dir: Path | None = None
+) -> Path | None:
+    """
+    Get the store directory covered by the quota, which defaults to the store
+    inside the data directory, if there is one
+
+    :param base_data_dir: Base data directory
+    :param store_dir: Shared observation store directory, if used
+    :return: Store directory, or None
+    """
+    if store_dir is None and (Path(base_data_dir) / STORE_DIR_NAME).is_dir():
+        return Path(base_data_dir) / STORE_DIR_NAME
+    return store_dir
+
+
+def get_usage_table(base_data_dir: Path, store_dir: Path | None = None) -> pd.DataFrame:
+    """
+    Get the size of the evictable data of each target, by tier
+
+    :param base_data_dir: Base data directory
+    :param store_dir: Shared observation store directory, if used
+    :return: DataFrame of sizes in bytes, with a row per target
+        and a column per tier
+    """
+    store_dir = get_quota_store_dir(Path(base_data_dir), store_dir)
+    df = pd.DataFrame(
+        find_artifacts(base_data_dir, store_dir),
+        columns=["target", "obs_dir", "tier", "paths", "size"],
+    )
+    return (
+        df.pivot_table(index="target", columns="tier", values="size", aggfunc="sum")
+        .reindex(columns=EVICTION_TIERS)
+        .fillna(0)
+        .astype(int)
+    )
+
+
+def get_disk_usage(base_data_dir: Path, store_dir: Path | None = None) -> int:
+    """
+    Get the disk usage of the data directory, and of the store if it is elsewhere
+
+    :param base_data_dir: Base data directory
+    :param store_dir: Shared observation store directory, if used
+    :return: Size in bytes
+    """
+    base_data_dir = Path(base_data_dir).absolute()
+    usage = get_tree_size(base_data_dir)
+    if store_dir is not None and not Path(store_dir).absolute().is_relative_to(
+        base_data_dir
+    ):
+        usage += get_tree_size(Path(store_dir))
+    return usage
+
+
+def get_eviction_candidates(
+    base_data_dir: Path,
+    store_dir: Path | None = None,
+    queue_path: Path | None = None,
+) -> list[dict]:
+    """
+    Get the artifacts which may be evicted, in the order they are evicted:
+    by tier, and then from the least recently used. Artifacts of targets
+    which are in use are excluded, as are observations in the store which
+    are linked from them.
+
+    :param base_data_dir: Base data directory
+    :param store_dir: Shared observation store directory, if used
+    :param queue_path: Path to a work queue, if used (see get_queued_targets)
+    :return: List of artifacts (see find_observation_artifacts)
+    """
+    index = CacheIndex(get_cache_index_path(base_data_dir))
+    busy = index.get_pinned_targets() | get_queued_targets(base_data_dir, queue_path)
+    busy_obs = {x.name for target in busy for x in get_observation_dirs(Path(target))}
+
+    # Observations in the store were last used when any target last used them
+    last_used = {}
+    for obs_dir, used in index.get_last_used().items():
+        name = Path(obs_dir).name
+        last_used[obs_dir] = used
+        last_used[name] = max(used, last_used.get(name, 0.0))
+
+    def get_last_used(artifact: dict) -> float:
+        obs_dir = artifact["obs_dir"]
+        key = obs_dir.name if artifact["target"] == STORE_TARGET else str(obs_dir)
+        return last_used.get(key, obs_dir.stat().st_mtime)
+
+    candidates = [
+        x
+        for x in find_artifacts(base_data_dir, store_dir)
+        if not (
+            str(x["obs_dir"].parent.absolute()) in busy
+            or (x["target"] == STORE_TARGET and x["obs_dir"].name in busy_obs)
+        )
+    ]
+    return sorted(
+        candidates, key=lambda x: (EVICTION_TIERS.index(x["tier"]), get_last_used(x))
+    )
+
+
+def enforce_quota(
+    base_data_dir: Path,
+    quota: int,
+    store_dir: Path | None = None,
+    dry_run: bool = False,
+    queue_path: Path | None = None,
+) -> list[dict]:
+    """
+    Evict the raw and intermediate products of the least recently used
+    observations, cheapest to make again first, until the data directory is
+    within the quota. Targets in use are never evicted.
+
+    :param base_data_dir: Base data directory
+    :param quota: Quota in bytes
+    :param store_dir: Shared observation store directory, if used.
+        Defaults to the store inside the data directory, if there is one.
+    :param dry_run: Only return the artifacts which would be evicted
+    :param queue_path: Path to a work queue, if used (see get_queued_targets)
+    :return: List of evicted artifacts
+    """
+    base_data_dir = Path(base_data_dir)
+    store_dir = get_quota_store_dir(base_data_dir, store_dir)
+
+    usage = get_disk_usage(base_data_dir, store_dir)
+    if usage <= quota:
+        return []
+
+    logger.info(
+        f"Data directory uses {format_size(usage)}, "
+        f"over the quota of {format_size(quota)}"
+    )
+
+    evicted = []
+    for artifact in get_eviction_candidates(base_data_dir, store_dir, queue_path):
+        if usage <= quota:
+            break
+        usage -= artifact["size"] if dry_run else evict_artifact(artifact)
+        evicted.append(artifact)
+
+    if usage > quota:
+        logger.warning(
+            f"Data directory still uses {format_size(usage)} after eviction, "
+            f"over the quota of {format_size(quota)}. "
+            f"The rest is results, or data in use."
+        )
+    return evicted
@@ -6,17 +6,44 @@ import logging
 from pathlib import Path
 
 from uvotredux.download.run import run_download
+from uvotredux.options import DEFAULT_QUERY_TTL
+from uvotredux.paths import get_cache_index_path
+from uvotredux.pipeline import run_pipeline, show_plan
+from uvotredux.quota import CacheIndex, enforce_quota, in_use
+from uvotredux.utils.profiling import profile_run, span
+from uvotredux.uvot.cutout import make_target_cutouts
 from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.uvot.output import check_output_format
+from uvotredux.workqueue import WorkQueue
+from uvotredux.xrt.iterate import iterate_xrt_reduction
 
 logger = logging.getLogger(__name__)
 
 
-def main(
+def main(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
     ra_deg: float,
     dec_deg: float,
     output_dir: Path,
     overwrite: bool = False,
     download: bool = True,
+    workers: int = 1,
+    download_workers: int = 1,
+    query_ttl: float = DEFAULT_QUERY_TTL,
+    store_dir: Path | None = None,
+    parse_engine: str = "astropy",
+    output_format: str = "csv",
+    profile: bool = False,
+    cprofile: bool = False,
+    queue_path: Path | None = None,
+    pipelined: bool = False,
+    plan: bool = False,
+    photometry: str = "uvotsource",
+    per_extension: bool = False,
+    decompress_workers: int = 1,
+    decompressor: str | None = None,
+    xrt: bool = False,
+    cutouts: bool = False,
+    quota: int | None = None,
 ):
     """
     Function to run Swift UVOT reduction on a directory
@@ -26,19 +53,126 @@ def main(
     :param output_dir: Directory to save the data
     :param overwrite: Overwrite existing files
     :param download: Whether to download the data or not
+    :param workers: Number of worker processes to use for the reduction
+    :param download_workers: Number of observations to download concurrently
+    :param query_ttl: Time in seconds for which a cached archive query is reused
+    :param store_dir: Shared observation store directory, if used
+    :param parse_engine: Engine used to parse the results ("astropy" or "fast")
+    :param output_format: Format of the results files (see OUTPUT_FORMATS)
+    :param profile: Record the time and resources used by each stage,
+        and save a JSON report in the output directory
+    :param cprofile: Also profile the main process with cProfile
+    :param queue_path: Path to a work queue. If given, the reduction is added
+        to the queue for `uvotredux worker` processes, instead of run here.
+    :param pipelined: Reduce each observation as soon as it has been downloaded,
+        with download_workers network and workers CPU tasks running concurrently
+    :param plan: Only print the task graph, and which tasks are already satisfied
+    :param photometry: Photometry engine, "uvotsource" (HEASoft) or "quicklook"
+    :param per_extension: Measure each extension (snapshot) of the images
+        separately, instead of the summed images
+    :param decompress_workers: Number of threads to decompress the images
+        of each observation
+    :param decompressor: External decompressor, e.g. "pigz" or "auto",
+        defaulting to the UVOTREDUX_GUNZIP environment variable
+    :param xrt: Also reduce the XRT data with xrtpipeline, after the UVOT data
+    :param cutouts: Also make cutouts of the summed images around the target,
+        and a stacked cube per filter
+    :param quota: Disk quota of the data directory (the parent of output_dir)
+        in bytes. If given, the least recently used raw and intermediate data
+        of other targets is evicted before and after the run.
     :return: None
     """
-    if download:
-        run_download(
-            ra_deg=ra_deg,
-            dec_deg=dec_deg,
-            output_dir=output_dir,
-            overwrite=overwrite,
+    check_output_format(output_format)
+
+    if plan:
+        show_plan(
+            ra_deg,
+            dec_deg,
+            output_dir,
+            download=download,
+            query_ttl=query_ttl,
+            per_extension=per_extension,
         )
-    else:
-        logger.info("Skipping download, assuming data is already present.")
+        return
+
+    reduce_options = {
+        "overwrite": overwrite,
+        "parse_engine": parse_engine,
+        "output_format": output_format,
+        "photometry": photometry,
+        "per_extension": per_extension,
+        "decompress_workers": decompress_workers,
+        "decompressor": decompressor,
+    }
+
+    base_data_dir = Path(output_dir).parent
+
+    with (
+        profile_run(output_dir, enabled=profile, cprofile=cprofile),
+        in_use(output_dir),
+    ):
+        if quota is not None:
+            with span("quota"):
+                enforce_quota(
+                    base_data_dir, quota, store_dir=store_dir, queue_path=queue_path
+                )
+
+        if pipelined and queue_path is None:
+            with span("pipeline"):
+                run_pipeline(
+                    ra_deg=ra_deg,
+                    dec_deg=dec_deg,
+                    output_dir=output_dir,
+                    download=download,
+                    workers=workers,
+                    download_workers=download_workers,
+                    query_ttl=query_ttl,
+                    store_dir=store_dir,
+                    **reduce_options,
+                )
+        else:
+            if download:
+                with span("download"):
+                    run_download(
+                        ra_deg=ra_deg,
+                        dec_deg=dec_deg,
+                        output_dir=output_dir,
+                        overwrite=overwrite,
+                        workers=download_workers,
+                        query_ttl=query_ttl,
+                        store_dir=store_dir,
+                    )
+            else:
+                logger.info("Skipping download, assuming data is already present.")
+
+            if queue_path is not None:
+                CacheIndex(get_cache_index_path(base_data_dir)).record_queue(queue_path)
+                WorkQueue(queue_path).enqueue_target(output_dir, config=reduce_options)
+                if xrt:
+                    logger.warning(
+                        "XRT reduction is not queued, run it without --queue"
+                    )
+                if cutouts:
+                    logger.warning("Cutouts are not queued, run them without --queue")
+                return
+
+            with span("reduction"):
+                iterate_uvot_reduction(
+                    directory=output_dir, workers=workers, **reduce_options
+                )
+
+        if xrt:
+            with span("xrt"):
+                iterate_xrt_reduction(
+                    directory=output_dir,
+                    overwrite=overwrite,
+                    workers=workers,
+                    output_format=output_format,
+                )
+
+        if cutouts:
+            with span("cutouts"):
+                make_target_cutouts(output_dir, overwrite=overwrite, workers=workers)
 
-    iterate_uvot_reduction(
-        directory=output_dir,
-        overwrite=overwrite,
-    )
+    if quota is not None:
+        enforce_quota(base_data_dir, quota, store_dir=store_dir, queue_path=queue_path)
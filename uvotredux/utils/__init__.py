@@ -1,7 +1,28 @@
 """
 Utility functions for the UVOT data reduction pipeline.
+
+The functions are imported lazily, so that lightweight utilities
+(e.g. uvotredux.utils.name) can be used without importing astropy or pandas.
 """
 
-from uvotredux.utils.paths import get_observation_dirs
-from uvotredux.utils.skyportal import convert_to_skyportal
-from uvotredux.utils.time import convert_met_to_utc
+import importlib
+
+_LAZY_IMPORTS = {
+    "get_observation_dirs": "uvotredux.utils.paths",
+    "convert_to_skyportal": "uvotredux.utils.skyportal",
+    "convert_met_to_utc": "uvotredux.utils.time",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str):
+    """
+    Import utility functions on first access
+
+    :param name: Attribute name
+    :return: Attribute
+    """
+    if name in _LAZY_IMPORTS:
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
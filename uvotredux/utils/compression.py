@@ -0,0 +1,84 @@
+"""
+Utility functions for decompressing Swift data files
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+GZIP_CHUNK_SIZE = 1024 * 1024
+
+# Environment variable naming an external gzip decompressor, or "auto"
+GUNZIP_ENV = "UVOTREDUX_GUNZIP"
+FAST_DECOMPRESSORS = ["igzip", "pigz"]
+
+
+def get_external_decompressor(name: str | None = None) -> str | None:
+    """
+    Find an external decompressor executable, if one was requested.
+
+    :param name: Executable name, "auto" to pick the first available fast
+        decompressor, or None to use the UVOTREDUX_GUNZIP environment variable
+    :return: Path to the executable, or None to decompress in python
+    """
+    if name is None:
+        name = os.getenv(GUNZIP_ENV)
+
+    if name is None:
+        return None
+
+    candidates = FAST_DECOMPRESSORS if name == "auto" else [name]
+    for candidate in candidates:
+        executable = shutil.which(candidate)
+        if executable is not None:
+            return executable
+
+    logger.warning(f"No decompressor found for '{name}', falling back to python")
+    return None
+
+
+def decompress_gzip(
+    compressed_path: Path,
+    output_path: Path,
+    executable: str | None = None,
+):
+    """
+    Function to decompress a gzip file with bounded memory.
+
+    The data is streamed in chunks into a temporary file in the output directory,
+    which is only renamed to the output path once complete. An interrupted
+    decompression therefore never leaves a truncated output file behind.
+
+    :param compressed_path: Path to the gzip file
+    :param output_path: Path to the decompressed file
+    :param executable: External decompressor executable to use instead of python
+    :return: None
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=output_path.parent,
+        prefix=f".{output_path.name}.",
+        suffix=".tmp",
+        delete=False,
+    ) as f_out:
+        tmp_path = Path(f_out.name)
+        try:
+            if executable is not None:
+                subprocess.run(
+                    [executable, "-dc", str(compressed_path)], stdout=f_out, check=True
+                )
+            else:
+                with gzip.open(compressed_path, "rb") as f_in:
+                    shutil.copyfileobj(f_in, f_out, GZIP_CHUNK_SIZE)
+        except BaseException:
+            f_out.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    shutil.copymode(compressed_path, tmp_path)
+    os.replace(tmp_path, output_path)
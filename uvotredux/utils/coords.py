@@ -0,0 +1,89 @@
+"""
+Dependency-free coordinate formatting, matching the astropy Angle.to_string
+and SkyCoord.directional_offset_by results used for names and region files.
+
+Avoiding astropy here keeps name assignment and region creation cheap,
+e.g. for wrappers that start the CLI for many targets.
+"""
+
+import math
+
+
+def format_sexagesimal(
+    value: float,
+    sep: str = ":",
+    precision: int = 2,
+    alwayssign: bool = False,
+    pad: bool = False,
+) -> str:
+    """
+    Format a value in hours or degrees as a sexagesimal string
+
+    :param value: Value in hours or degrees
+    :param sep: Separator between the fields
+    :param precision: Number of decimal places of the seconds
+    :param alwayssign: Always include the sign, including "+" for positive values
+    :param pad: Pad the first field to two digits
+    :return: Sexagesimal string
+    """
+    sign = "-" if math.copysign(1.0, value) < 0 else ("+" if alwayssign else "")
+
+    # Split into fields, and carry rounded-up seconds, in the same way as astropy
+    minutes_frac, first = math.modf(abs(value))
+    seconds_frac, minutes = math.modf(minutes_frac * 60.0)
+    seconds = seconds_frac * 60.0
+    if seconds >= 60.0 - 10.0**-precision:
+        seconds = 0.0
+        minutes += 1.0
+    if minutes >= 60.0:
+        minutes = 0.0
+        first += 1.0
+
+    width = 3 + precision if precision > 0 else 2
+    first_str = f"{first:02.0f}" if pad else f"{first:.0f}"
+    return f"{sign}{first_str}{sep}{minutes:02.0f}{sep}{seconds:0{width}.{precision}f}"
+
+
+def parse_sexagesimal(text: str) -> float:
+    """
+    Parse a colon-separated sexagesimal string
+
+    :param text: String such as "16:40:18.42" or "-5:03:02.1"
+    :return: Value in the units of the first field
+    """
+    text = text.strip()
+    sign = -1.0 if text.startswith("-") else 1.0
+    fields = [abs(float(x)) for x in text.lstrip("+-").split(":")]
+    return sign * sum(x / 60.0**i for i, x in enumerate(fields))
+
+
+def offset_by(
+    ra_deg: float,
+    dec_deg: float,
+    position_angle_deg: float,
+    separation_deg: float,
+) -> tuple[float, float]:
+    """
+    Get the position offset from another by a position angle and separation,
+    as in SkyCoord.directional_offset_by
+
+    :param ra_deg: Right Ascension in degrees
+    :param dec_deg: Declination in degrees
+    :param position_angle_deg: Position angle (East of North) in degrees
+    :param separation_deg: Separation in degrees
+    :return: Right Ascension and Declination of the new position in degrees
+    """
+    lon, lat = math.radians(ra_deg), math.radians(dec_deg)
+    pa, sep = math.radians(position_angle_deg), math.radians(separation_deg)
+
+    # Spherical triangle with the North Pole, the start and the final position:
+    # the cosine rule gives the final co-latitude, and the sine and cosine rules
+    # together give the change in longitude.
+    cos_c, sin_c = math.sin(lat), math.cos(lat)
+    cos_b = cos_c * math.cos(sep) + sin_c * math.sin(sep) * math.cos(pa)
+    xsin_lon = math.sin(sep) * math.sin(pa) * sin_c
+    xcos_lon = math.cos(sep) - cos_b * cos_c
+
+    new_lon = lon + math.atan2(xsin_lon, xcos_lon)
+    new_lat = math.asin(cos_b)
+    return math.degrees(new_lon) % 360.0, math.degrees(new_lat)
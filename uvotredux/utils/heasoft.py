@@ -0,0 +1,188 @@
+"""
+Module to run HEASoft tools from long-lived, pre-initialised environments.
+
+Each process keeps one HeasoftExecutor, with its own PFILES directory in which
+the parameter files of the tools are copied once up front, so that parallel
+tool calls do not corrupt each other's parameter files. Tools are run directly
+from argument lists (no shell, so paths may contain spaces), and their output
+is captured in-process. The time spent in each tool is recorded, so that the
+overhead per call can be measured.
+"""
+
+import functools
+import logging
+import os
+import resource
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PFILES_ENV = "PFILES"
+
+# Tools whose parameter files are copied when an executor starts
+HEASOFT_TOOLS = ["uvotimsum", "uvotsource", "xrtpipeline"]
+
+# Run tools without prompting for parameters
+HEASOFT_ENV = {"HEADASNOQUERY": "1", "HEADASPROMPT": "/dev/null"}
+
+
+def get_system_pfiles() -> str | None:
+    """
+    Get the HEASoft system parameter file directory.
+
+    PFILES has the form "<user dirs>;<system dirs>", so the system part is taken
+    from the existing PFILES if present, and otherwise from $HEADAS/syspfiles.
+
+    :return: System parameter file directory, or None if it cannot be found
+    """
+    pfiles = os.getenv(PFILES_ENV)
+    if pfiles is not None and ";" in pfiles:
+        return pfiles.split(";")[-1]
+
+    headas = os.getenv("HEADAS")
+    if headas is not None:
+        return str(Path(headas) / "syspfiles")
+
+    return None
+
+
+class HeasoftExecutor:
+    """
+    Environment to run HEASoft tools repeatedly from one process.
+    """
+
+    def __init__(self, tools: list[str] | None = None):
+        """
+        :param tools: Tools whose parameter files are copied up front,
+            defaults to HEASOFT_TOOLS
+        """
+        self.pfiles_dir = Path(tempfile.mkdtemp(prefix="uvotredux_pfiles_"))
+        Finalize(
+            self,
+            shutil.rmtree,
+            args=(self.pfiles_dir,),
+            kwargs={"ignore_errors": True},
+            exitpriority=0,
+        )
+
+        sys_pfiles = get_system_pfiles()
+        self.pfiles = (
+            f"{self.pfiles_dir};{sys_pfiles}"
+            if sys_pfiles is not None
+            else str(self.pfiles_dir)
+        )
+
+        for tool in tools if tools is not None else HEASOFT_TOOLS:
+            par_file = Path(sys_pfiles) / f"{tool}.par" if sys_pfiles else None
+            if par_file is not None and par_file.is_file():
+                shutil.copy(par_file, self.pfiles_dir)
+
+        self.stats = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0})
+
+        logger.debug(f"Process {os.getpid()} using PFILES={self.pfiles}")
+
+    def run(
+        self, argv: list[str | Path], stdout_path: Path | None = None
+    ) -> subprocess.CompletedProcess:
+        """
+        Run a tool, and save its output
+
+        :param argv: Tool and its arguments
+        :param stdout_path: Path to save the standard output, if any
+        :return: Completed process
+        """
+        argv = [str(x) for x in argv]
+        tool = argv[0]
+
+        env = {**os.environ, **HEASOFT_ENV, PFILES_ENV: self.pfiles}
+        if shutil.which(tool, path=env.get("PATH")) is None:
+            raise subprocess.CalledProcessError(
+                127, argv, stderr=f"{tool}: command not found"
+            )
+
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        res = subprocess.run(
+            argv,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        wall = time.perf_counter() - start
+        end_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        stats = self.stats[tool]
+        stats["calls"] += 1
+        stats["wall"] += wall
+        stats["cpu"] += (end_usage.ru_utime + end_usage.ru_stime) - (
+            usage.ru_utime + usage.ru_stime
+        )
+
+        if stdout_path is not None:
+            Path(stdout_path).write_text(res.stdout, encoding="utf8")
+        if res.returncode != 0:
+            logger.error(f"{tool} failed with stderr: {res.stderr.strip()}")
+        elif res.stderr:
+            logger.debug(f"{tool} stderr: {res.stderr.strip()}")
+
+        res.check_returncode()
+        return res
+
+    def summarise(self) -> dict[str, dict[str, float]]:
+        """
+        Summarise the calls of each tool, with the mean wall time per call
+        and the part of it not spent on CPU in the tool (e.g. process startup
+        and waiting for I/O)
+
+        :return: Dictionary of call statistics by tool
+        """
+        return {
+            tool: {
+                **stats,
+                "mean_wall": stats["wall"] / stats["calls"],
+                "mean_overhead": (stats["wall"] - stats["cpu"]) / stats["calls"],
+            }
+            for tool, stats in self.stats.items()
+        }
+
+
+@functools.cache
+def start_heasoft_executor(pid: int) -> HeasoftExecutor:
+    """
+    Start the HEASoft executor of a process
+
+    :param pid: Process ID, so that forked worker processes start their own
+    :return: HEASoft executor
+    """
+    executor = HeasoftExecutor()
+    os.environ[PFILES_ENV] = executor.pfiles
+    logger.debug(f"Started HEASoft executor for process {pid}")
+    return executor
+
+
+def get_heasoft_executor() -> HeasoftExecutor:
+    """
+    Get the HEASoft executor of this process, starting it if needed
+
+    :return: HEASoft executor
+    """
+    return start_heasoft_executor(os.getpid())
+
+
+def format_command(argv: list[str | Path]) -> str:
+    """
+    Format a command for logging, quoting arguments where needed
+
+    :param argv: Tool and its arguments
+    :return: Command string
+    """
+    return shlex.join(str(x) for x in argv)
@@ -4,8 +4,7 @@ Utility functions for assigning source names based on RA and Dec.
 
 import logging
 
-from astropy import units as u
-from astropy.coordinates import SkyCoord
+from uvotredux.utils.coords import format_sexagesimal
 
 logger = logging.getLogger(__name__)
 
@@ -21,17 +20,11 @@ def assign_source_name(
     :param dec_deg: Declination in degrees
     :return: Name
     """
-
-    src_position = SkyCoord(ra_deg, dec_deg, unit="deg")
-    ra_str = src_position.ra.to_string(
-        unit=u.hour, sep="", precision=2, pad=True  # pylint: disable=no-member
+    ra_str = format_sexagesimal(
+        (float(ra_deg) % 360.0) / 15.0, sep="", precision=2, pad=True
     )
-    dec_str = src_position.dec.to_string(
-        unit=u.degree,  # pylint: disable=no-member
-        sep="",
-        precision=2,
-        alwayssign=True,
-        pad=True,
+    dec_str = format_sexagesimal(
+        float(dec_deg), sep="", precision=2, alwayssign=True, pad=True
     )
     j_name = f"J{ra_str}{dec_str}"
     logger.info(f"Source name not provided. Assigning J2000 name {j_name}")
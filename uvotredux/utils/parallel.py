@@ -0,0 +1,31 @@
+"""
+Utilities for running HEASoft tasks in parallel worker processes
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from uvotredux.utils.heasoft import get_heasoft_executor
+
+logger = logging.getLogger(__name__)
+
+
+def init_heasoft_worker():
+    """
+    Initialise a worker process with its own HEASoft executor and PFILES
+    directory, so that parallel tool calls do not corrupt each other's
+    parameter files. The directory is removed when the worker exits.
+
+    :return: None
+    """
+    get_heasoft_executor()
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Get a process pool in which each worker has an isolated HEASoft environment
+
+    :param workers: Number of worker processes
+    :return: Process pool executor
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_heasoft_worker)
@@ -0,0 +1,267 @@
+"""
+Module to profile pipeline runs.
+
+Stages of the pipeline are wrapped in spans, which record wall time, CPU time,
+the CPU time of child processes (e.g. HEASoft tools), bytes read and written,
+and attributes such as the observation ID or whether a cached result was used.
+
+Profiling is enabled by setting UVOTREDUX_PROFILE_PATH to a spans file, so that
+worker processes inherit it. Each span is appended to the file as a line of
+JSON, and the spans are summarised in a report at the end of the run.
+When profiling is disabled, spans only cost an environment lookup.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "UVOTREDUX_PROFILE_PATH"
+
+PROFILE_SPANS_NAME = "profile_spans.jsonl"
+PROFILE_REPORT_NAME = "profile_report.json"
+CPROFILE_NAME = "profile.prof"
+
+# Attributes inherited by nested spans
+INHERITED_ATTRIBUTES = ["target", "obs_id"]
+
+# Stack of the names and attributes of the open spans in the current thread
+_active_spans = contextvars.ContextVar("active_spans", default=())
+
+_write_lock = threading.Lock()
+
+
+def get_io_counters() -> tuple[int, int] | None:
+    """
+    Get the bytes read and written by this process so far (Linux only)
+
+    :return: Bytes read and written, or None if not available
+    """
+    try:
+        with open("/proc/self/io", "r", encoding="utf8") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def get_children_cpu() -> float:
+    """
+    Get the CPU time used by finished child processes so far
+
+    :return: CPU time in seconds
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def annotate(**attributes):
+    """
+    Add attributes to the innermost open span, e.g. cache="hit"
+
+    :param attributes: Attributes to add
+    :return: None
+    """
+    spans = _active_spans.get()
+    if len(spans) > 0:
+        spans[-1][1].update(attributes)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Context manager to record a stage of the pipeline, if profiling is enabled
+
+    :param name: Name of the stage
+    :param attributes: Attributes of the span, e.g. obs_id or command
+    :return: Dictionary of span attributes, which can be updated
+    """
+    spans_path = os.getenv(PROFILE_ENV)
+    if spans_path is None:
+        yield attributes
+        return
+
+    parents = _active_spans.get()
+    if len(parents) > 0:
+        for key in INHERITED_ATTRIBUTES:
+            if key in parents[-1][1] and key not in attributes:
+                attributes[key] = parents[-1][1][key]
+    token = _active_spans.set(parents + ((name, attributes),))
+
+    io_start = get_io_counters()
+    children_start = get_children_cpu()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    status = "ok"
+    start = time.time()
+    try:
+        yield attributes
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record = {
+            "name": name,
+            "parent": parents[-1][0] if len(parents) > 0 else None,
+            "pid": os.getpid(),
+            "start": start,
+            "wall": time.perf_counter() - wall_start,
+            "cpu": time.process_time() - cpu_start,
+            "children_cpu": get_children_cpu() - children_start,
+            "status": status,
+        }
+        io_end = get_io_counters()
+        if io_start is not None and io_end is not None:
+            record["read_bytes"] = io_end[0] - io_start[0]
+            record["write_bytes"] = io_end[1] - io_start[1]
+        _active_spans.reset(token)
+        record.update(attributes)
+        write_span(Path(spans_path), record)
+
+
+def write_span(spans_path: Path, record: dict):
+    """
+    Append a span record to the spans file.
+    Each record is written with a single append, so that records from
+    parallel processes are not interleaved.
+
+    :param spans_path: Path to the spans file
+    :param record: Span record
+    :return: None
+    """
+    line = (json.dumps(record, default=str) + "\n").encode()
+    with _write_lock:
+        fd = os.open(spans_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def summarise_spans(spans: list[dict]) -> dict:
+    """
+    Summarise a list of spans, by summing their timings and counting
+    their cache status
+
+    :param spans: List of span records
+    :return: Summary
+    """
+    summary = {"count": len(spans)}
+    for key in ["wall", "cpu", "children_cpu", "read_bytes", "write_bytes"]:
+        summary[key] = sum(x.get(key, 0) for x in spans)
+    cache = defaultdict(int)
+    for x in spans:
+        if "cache" in x:
+            cache[x["cache"]] += 1
+    if len(cache) > 0:
+        summary["cache"] = dict(cache)
+    return summary
+
+
+def make_profile_report(spans: list[dict], target: str | None = None) -> dict:
+    """
+    Make a profiling report, with totals per stage, per observation
+    and a list of all external commands
+
+    :param spans: List of span records
+    :param target: Name of the target
+    :return: Report
+    """
+    by_stage = defaultdict(list)
+    by_obs = defaultdict(lambda: defaultdict(list))
+    for x in spans:
+        by_stage[x["name"]].append(x)
+        if "obs_id" in x:
+            by_obs[x["obs_id"]][x["name"]].append(x)
+
+    return {
+        "target": target,
+        "n_spans": len(spans),
+        "stages": {k: summarise_spans(v) for k, v in by_stage.items()},
+        "observations": {
+            obs_id: {k: summarise_spans(v) for k, v in stages.items()}
+            for obs_id, stages in sorted(by_obs.items())
+        },
+        "commands": [
+            {
+                k: x.get(k)
+                for k in ["tool", "obs_id", "output", "cache", "wall", "children_cpu"]
+            }
+            for x in by_stage.get("command", [])
+        ],
+    }
+
+
+@contextlib.contextmanager
+def profile_run(output_dir: Path, enabled: bool = True, cprofile: bool = False):
+    """
+    Context manager to profile a pipeline run for a target.
+
+    Spans are recorded in the target directory, and summarised in a JSON report
+    when the run finishes. Optionally, the main process is also profiled with
+    cProfile, and the statistics are dumped for e.g. snakeviz or pstats.
+
+    :param output_dir: Target directory
+    :param enabled: Whether to record spans
+    :param cprofile: Whether to also run cProfile
+    :return: None
+    """
+    if not enabled and not cprofile:
+        yield
+        return
+
+    output_dir = Path(output_dir)
+    spans_path = output_dir / PROFILE_SPANS_NAME
+    previous = os.getenv(PROFILE_ENV)
+
+    if enabled:
+        spans_path.unlink(missing_ok=True)
+        os.environ[PROFILE_ENV] = str(spans_path)
+
+    profiler = cProfile.Profile() if cprofile else None
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        with span("run", target=output_dir.name):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(output_dir / CPROFILE_NAME)
+            logger.info(f"Saved cProfile statistics to {output_dir / CPROFILE_NAME}")
+
+        if enabled:
+            if previous is None:
+                del os.environ[PROFILE_ENV]
+            else:
+                os.environ[PROFILE_ENV] = previous
+            save_profile_report(spans_path, output_dir / PROFILE_REPORT_NAME)
+
+
+def save_profile_report(spans_path: Path, report_path: Path):
+    """
+    Summarise a spans file in a JSON report
+
+    :param spans_path: Path to the spans file
+    :param report_path: Path of the report
+    :return: None
+    """
+    spans = []
+    if spans_path.is_file():
+        with open(spans_path, "r", encoding="utf8") as f:
+            spans = [json.loads(line) for line in f if line.strip()]
+
+    report = make_profile_report(spans, target=report_path.parent.name)
+    with open(report_path, "w", encoding="utf8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved profiling report to {report_path}")
@@ -0,0 +1,34 @@
+"""
+Utility functions to parse and format sizes in bytes
+"""
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size such as "500M" or "1.5T" (in powers of 1024)
+
+    :param size: Size, as a number of bytes with an optional unit
+    :return: Size in bytes
+    """
+    value = size.strip().upper().removesuffix("B")
+    unit = value[-1] if value and value[-1] in SIZE_UNITS else ""
+    try:
+        return int(float(value[: len(value) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError as e:
+        raise ValueError(f"Invalid size '{size}', expected e.g. 500M or 1.5T") from e
+
+
+def format_size(size: float) -> str:
+    """
+    Format a size in bytes, e.g. as "1.5G"
+
+    :param size: Size in bytes
+    :return: Formatted size
+    """
+    for unit in ["", "K", "M", "G"]:
+        if abs(size) < 1024.0:
+            return f"{size:.1f}{unit}"
+        size /= 1024.0
+    return f"{size:.1f}T"
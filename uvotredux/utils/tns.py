@@ -1,15 +1,33 @@
 """
 Utilities for accessing the Transient Name Server (TNS) API.
+
+Names are resolved with a TNSClient, which reuses pooled connections, backs off
+when TNS limits the request rate, and keeps the results in an SQLite cache
+shared between targets. Names that are not found are also cached for a while,
+so that batch runs do not query them again on every run.
 """
 
+import json
 import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from io import StringIO
 from pathlib import Path
 
 import pandas as pd
 import requests
-from astropy import units as u
-from astropy.coordinates import SkyCoord
+from requests.adapters import HTTPAdapter
+
+from uvotredux.options import DEFAULT_TNS_WORKERS
+from uvotredux.paths import get_tns_cache_path
+from uvotredux.utils.coords import parse_sexagesimal
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +39,22 @@ TNS_HEADERS = {
 }
 BASE_TNS_URL = "https://www.wis-tns.org/search?"
 
+# Environment variable to use another TNS server, e.g. a local mirror
+TNS_URL_ENV = "UVOTREDUX_TNS_URL"
+
 TNS_CACHE_NAME = "tns_info.json"
 
+TNS_TIMEOUT = 10.0
+
+# Time in seconds for which a name that was not found is not queried again
+NEGATIVE_CACHE_TTL = 86400.0
+
+# Responses which are retried, after waiting
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Official TNS names, e.g. "AT2020mni", "SN 2023ixf" or "2020mni"
+TNS_NAME_REGEX = re.compile(r"^([A-Za-z]{1,4}\s*)?\d{4}[a-z]{1,4}$")
+
 
 def strip_tns_name(name: str) -> str:
     """
@@ -37,6 +69,80 @@ def strip_tns_name(name: str) -> str:
     return tns_root
 
 
+def is_tns_name(name: str) -> bool:
+    """
+    Check whether a name looks like an official TNS name,
+    rather than an internal survey name such as "ZTF20abkavqj"
+
+    :param name: Name of the transient
+    :return: Boolean
+    """
+    return TNS_NAME_REGEX.match(name.strip()) is not None
+
+
+def get_tns_query_url(
+    source_name: str, internal_name_bool: bool = False, base_url: str | None = None
+) -> str:
+    """
+    Get the TNS search URL for a name.
+
+    :param source_name: Name of the transient to search for.
+    :param internal_name_bool: Boolean to indicate
+                if the name is an internal survey name.
+    :param base_url: Base search URL, defaults to UVOTREDUX_TNS_URL or TNS itself
+    :return: Search URL
+    """
+    if base_url is None:
+        base_url = os.getenv(TNS_URL_ENV, BASE_TNS_URL)
+
+    query_arg = "internal_name=" if internal_name_bool else "name="
+
+    return (
+        f"{base_url}{query_arg}{strip_tns_name(source_name)}"
+        f"&include_frb=0&format=csv&page=0"
+    )
+
+
+def parse_tns_response(text: str) -> pd.DataFrame:
+    """
+    Parse the csv returned by a TNS search
+
+    :param text: Response text
+    :return: A pandas DataFrame containing the search results.
+    """
+    if text.strip() == "":
+        return pd.DataFrame()
+    return pd.read_csv(StringIO(text))
+
+
+def get_retry_delay(retry_after: str | None, default: float) -> float:
+    """
+    Get the delay before retrying a request, from a Retry-After header
+    given either in seconds or as an HTTP date
+
+    :param retry_after: Value of the Retry-After header, if any
+    :param default: Delay in seconds if the header is missing or invalid
+    :return: Delay in seconds
+    """
+    if retry_after is None:
+        return default
+
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_time = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        logger.warning(f"Could not parse Retry-After header '{retry_after}'")
+        return default
+
+    if retry_time.tzinfo is None:
+        retry_time = retry_time.replace(tzinfo=timezone.utc)
+    return max((retry_time - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
 def query_tns_by_name(
     source_name: str, internal_name_bool: bool = False
 ) -> pd.DataFrame:
@@ -48,50 +154,303 @@ def query_tns_by_name(
                 if the name is an internal survey name.
     :return: A pandas DataFrame containing the search results.
     """
+    search_url = get_tns_query_url(source_name, internal_name_bool)
+    response = requests.get(search_url, headers=TNS_HEADERS, timeout=TNS_TIMEOUT)
+    return parse_tns_response(response.text)
 
-    query_arg = "internal_name=" if internal_name_bool else "name="
 
-    search_url = (
-        f"{BASE_TNS_URL}{query_arg}{strip_tns_name(source_name)}"
-        f"&include_frb=0&format=csv&page=0"
-    )
-    response = requests.get(search_url, headers=TNS_HEADERS, timeout=10.0)
-    csv_data = StringIO(response.text)
-    return pd.read_csv(csv_data)
+def add_tns_coordinates(res: pd.Series) -> pd.Series:
+    """
+    Add the coordinates of a TNS result in degrees
 
+    :param res: TNS search result, with sexagesimal "RA" and "DEC"
+    :return: Result with "ra" and "dec" in degrees
+    """
+    res = res.copy()
+    res["ra"] = parse_sexagesimal(str(res["RA"])) * 15.0
+    res["dec"] = parse_sexagesimal(str(res["DEC"]))
+    return res
 
-def download_tns(source_name: str) -> pd.Series:
+
+class TNSCache:
     """
-    Download the TNS data for a given name.
+    SQLite cache of resolved TNS names, shared between targets and processes.
 
-    :param source_name: The name of the transient as listed in TNS.
-    :return: The first row of the TNS search results as a pandas Series.
+    Names that were not found are cached with the time of the query,
+    and are queried again once this is older than the negative TTL.
     """
-    # Query TNS by name e.g "AT2020mni"
-    df = query_tns_by_name(source_name)
 
-    # If no results found, try querying by internal name e.g "ZTF20abkavqj"
-    if len(df) == 0:
-        df = query_tns_by_name(source_name, internal_name_bool=True)
+    def __init__(self, path: Path, negative_ttl: float = NEGATIVE_CACHE_TTL):
+        self.path = Path(path)
+        self.negative_ttl = negative_ttl
 
-    # If still no results, raise an error
-    if len(df) == 0:
-        logger.error(f"No TNS data found for {source_name}.")
-        raise ValueError(f"No TNS data found for {source_name}.")
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection to the cache, creating tables if needed
 
-    res = df.iloc[0].copy()
+        :return: SQLite connection
+        """
+        conn = sqlite3.connect(self.path, timeout=60.0)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS names "
+            "(name TEXT PRIMARY KEY, found INTEGER, data TEXT, fetched REAL)"
+        )
+        return conn
 
-    # Add coordinates in degrees
-    c = SkyCoord(
-        res["RA"], res["DEC"], unit=(u.hourangle, u.deg)  # pylint: disable=no-member
-    )
-    res["ra"], res["dec"] = c.ra.deg, c.dec.deg
+    @staticmethod
+    def _key(name: str) -> str:
+        """
+        Get the cache key of a name
 
-    return res
+        :param name: Name of the transient
+        :return: Key
+        """
+        return name.strip().lower()
+
+    def get(self, name: str) -> tuple[bool, pd.Series | None] | None:
+        """
+        Get a cached TNS result
+
+        :param name: Name of the transient
+        :return: None if the name is not cached (or the negative result has
+            expired), otherwise whether it was found, and the result if so
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT found, data, fetched FROM names WHERE name = ?",
+                (self._key(name),),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        found, data, fetched = row
+        if not found:
+            if time.time() - fetched > self.negative_ttl:
+                return None
+            return False, None
+
+        return True, pd.Series(json.loads(data))
+
+    def put(self, name: str, res: pd.Series | None):
+        """
+        Cache a TNS result
+
+        :param name: Name of the transient
+        :param res: TNS result, or None if the name was not found
+        :return: None
+        """
+        data = None if res is None else res.to_json()
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)",
+                    (self._key(name), res is not None, data, time.time()),
+                )
+
+
+class TNSClient:
+    """
+    Client to resolve names with TNS.
+
+    Requests share a pool of connections, and retries wait for the time given
+    by TNS (Retry-After or the rate limit reset), or back off exponentially.
+    A rate limit seen by one thread pauses all threads of the client.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        cache_path: Path | None = None,
+        base_url: str | None = None,
+        pool_size: int = DEFAULT_TNS_WORKERS,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+    ):
+        """
+        :param cache_path: Path to the shared cache, or None to not cache results
+        :param base_url: Base search URL, defaults to UVOTREDUX_TNS_URL or TNS itself
+        :param pool_size: Number of connections kept open
+        :param max_retries: Number of retries of each request
+        :param backoff: Delay before the first retry, doubled after each failure
+        """
+        self.cache = TNSCache(cache_path) if cache_path is not None else None
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        self.session.headers.update(TNS_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.session.close()
+
+    def _pause(self, delay: float):
+        """
+        Pause all requests of the client for a time
+
+        :param delay: Time in seconds
+        :return: None
+        """
+        with self._lock:
+            self._retry_at = max(self._retry_at, time.monotonic() + delay)
+
+    def _wait(self):
+        """
+        Wait until requests are no longer paused
+
+        :return: None
+        """
+        with self._lock:
+            delay = self._retry_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _get(self, url: str) -> requests.Response:
+        """
+        Get a URL, retrying on connection errors, rate limits and server errors
+
+        :param url: URL
+        :return: Response
+        """
+        for attempt in range(self.max_retries + 1):
+            self._wait()
+            try:
+                response = self.session.get(url, timeout=TNS_TIMEOUT)
+            except requests.ConnectionError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                logger.warning(f"TNS connection failed ({e}), retrying in {delay}s")
+                self._pause(delay)
+                continue
+
+            if response.headers.get("x-rate-limit-remaining") == "0":
+                self._pause(float(response.headers.get("x-rate-limit-reset", 0.0)))
+
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+
+            if attempt == self.max_retries:
+                break
+
+            delay = get_retry_delay(
+                response.headers.get("Retry-After"), self.backoff * 2**attempt
+            )
+            logger.warning(
+                f"TNS returned status {response.status_code}, retrying in {delay}s"
+            )
+            self._pause(delay)
+
+        response.raise_for_status()
+        return response
+
+    def query(self, source_name: str, internal_name_bool: bool = False) -> pd.DataFrame:
+        """
+        Query TNS by name.
+
+        :param source_name: Name of the transient to search for.
+        :param internal_name_bool: Boolean to indicate
+                    if the name is an internal survey name.
+        :return: A pandas DataFrame containing the search results.
+        """
+        url = get_tns_query_url(source_name, internal_name_bool, self.base_url)
+        return parse_tns_response(self._get(url).text)
+
+    def download(self, source_name: str) -> pd.Series | None:
+        """
+        Download the TNS data for a name.
+
+        Official TNS names are queried by name first, and survey names by
+        internal name first, so that most names need a single request.
+
+        :param source_name: Name of the transient
+        :return: The first TNS search result, or None if not found
+        """
+        order = [False, True] if is_tns_name(source_name) else [True, False]
+        for internal_name_bool in order:
+            df = self.query(source_name, internal_name_bool=internal_name_bool)
+            if len(df) > 0:
+                return add_tns_coordinates(df.iloc[0])
+        return None
+
+    def resolve(self, source_name: str, refresh: bool = False) -> pd.Series:
+        """
+        Resolve a name with TNS, using the shared cache if possible
+
+        :param source_name: Name of the transient
+        :param refresh: Query TNS even if the name is cached
+        :return: The first TNS search result, with "ra" and "dec" in degrees
+        """
+        cached = None
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(source_name)
+
+        if cached is not None:
+            found, res = cached
+            logger.debug(f"Loaded cached TNS result for {source_name}")
+        else:
+            res = self.download(source_name)
+            found = res is not None
+            if self.cache is not None:
+                self.cache.put(source_name, res)
+
+        if not found:
+            logger.error(f"No TNS data found for {source_name}.")
+            raise ValueError(f"No TNS data found for {source_name}.")
+
+        return res
+
+    def resolve_many(
+        self, names: list[str], workers: int = DEFAULT_TNS_WORKERS
+    ) -> dict[str, pd.Series]:
+        """
+        Resolve many names concurrently.
+        Names which are not found or fail are logged and left out.
+
+        :param names: Names of the transients
+        :param workers: Maximum number of concurrent requests
+        :return: Dictionary of TNS results by name
+        """
+
+        def resolve(name: str) -> pd.Series | None:
+            try:
+                return self.resolve(name)
+            except (ValueError, requests.RequestException) as e:
+                logger.warning(f"Could not resolve {name} with TNS: {e}")
+                return None
+
+        names = list(dict.fromkeys(names))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(resolve, names))
+
+        return {x: res for x, res in zip(names, results) if res is not None}
+
+
+def download_tns(source_name: str) -> pd.Series:
+    """
+    Download the TNS data for a given name.
+
+    :param source_name: The name of the transient as listed in TNS.
+    :return: The first row of the TNS search results as a pandas Series.
+    """
+    with TNSClient() as client:
+        return client.resolve(source_name)
 
 
 def get_tns_by_name(
-    tns_name: str, output_dir: Path | None = None, use_cache: bool = True
+    tns_name: str,
+    output_dir: Path | None = None,
+    use_cache: bool = True,
+    client: TNSClient | None = None,
 ) -> pd.Series:
     """
     Get information about a transient from TNS.
@@ -99,6 +458,8 @@ def get_tns_by_name(
     :param tns_name: The name of the transient as listed in TNS.
     :param output_dir: Directory to save the TNS data cache.
     :param use_cache: If True, use cached TNS data if available.
+    :param client: TNS client, defaults to one using the shared cache
+        in the default data directory
     :return: A dictionary containing the TNS data for the transient.
     """
 
@@ -112,7 +473,11 @@ def get_tns_by_name(
         res = pd.read_json(tns_file, typ="series")
     else:
         logger.info(f"Downloading TNS data for {tns_name}")
-        res = download_tns(tns_name)
+        if client is None:
+            with TNSClient(cache_path=get_tns_cache_path()) as default_client:
+                res = default_client.resolve(tns_name, refresh=not use_cache)
+        else:
+            res = client.resolve(tns_name, refresh=not use_cache)
         logger.info(f"Saving TNS data to {tns_file}")
         res.to_json(tns_file)
 
@@ -3,7 +3,13 @@ Module for UVOT data reduction
 """
 
 from uvotredux.uvot.iterate import iterate_uvot_reduction
+from uvotredux.uvot.output import load_uvot_results
 from uvotredux.uvot.parse import parse_uvot_results
 from uvotredux.uvot.reduce import unpack_single_uvot_obs
 
-__all__ = ["iterate_uvot_reduction", "parse_uvot_results", "unpack_single_uvot_obs"]
+__all__ = [
+    "iterate_uvot_reduction",
+    "load_uvot_results",
+    "parse_uvot_results",
+    "unpack_single_uvot_obs",
+]
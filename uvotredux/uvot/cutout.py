@@ -0,0 +1,376 @@
+"""
+Module to make small cutouts of the summed UVOT images around the target,
+and to stack them into one cube per filter.
+
+Each cutout is a copy of the pixels around the source and background regions
+of a summed image, read from the memory mapped file, with the reference pixel
+shifted so that the WCS stays correct. The cutouts of a filter are then
+resampled (nearest-neighbour) onto a common north-up grid centred on the
+target, and stacked as a cube of count rates, with one plane per observation.
+The cubes are meant for visual QA; photometry should use the cutouts.
+"""
+
+import logging
+import warnings
+from concurrent.futures import as_completed
+from pathlib import Path
+
+import numpy as np
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
+from astropy.wcs import WCS, FITSFixedWarning
+from astropy.wcs.utils import proj_plane_pixel_scales
+
+from uvotredux.download.regions import (
+    bkg_path,
+    get_source_regions,
+    load_circle_region,
+    src_path,
+)
+from uvotredux.utils.parallel import get_executor
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.utils.profiling import span
+from uvotredux.uvot.filters import filter_dict
+from uvotredux.uvot.manifest import ReductionManifest, get_manifest_path
+from uvotredux.uvot.quicklook import is_exposed_image
+from uvotredux.uvot.reduce import remove_stale_output
+
+logger = logging.getLogger(__name__)
+
+CUTOUT_SUFFIX = "_cutout"
+CUBE_DIR_NAME = "cutouts"
+
+# Margin around the regions, in arcseconds
+CUTOUT_MARGIN_ARCSEC = 10.0
+
+
+def get_cutout_path(summed_image: Path) -> Path:
+    """
+    Get the path of the cutout of a summed UVOT image
+
+    :param summed_image: Path to the summed image, e.g. UW2.fits
+    :return: Path to the cutout, e.g. UW2_cutout.fits
+    """
+    return summed_image.with_name(f"{summed_image.stem}{CUTOUT_SUFFIX}.fits")
+
+
+def get_cube_path(directory: Path, uvot_filter: str) -> Path:
+    """
+    Get the path of the stacked cutout cube of a filter
+
+    :param directory: Target directory
+    :param uvot_filter: Filter name (see uvotredux.uvot.filters)
+    :return: Path to the cube
+    """
+    return Path(directory) / CUBE_DIR_NAME / f"{uvot_filter}_cube.fits"
+
+
+def get_summed_images(swift_obs_dir: Path) -> list[Path]:
+    """
+    Get the summed UVOT images of an observation
+
+    :param swift_obs_dir: Single swift observation directory
+    :return: Sorted list of summed images
+    """
+    uvot_dir = swift_obs_dir / "uvot/image"
+    return sorted(x for x in uvot_dir.glob("*.fits") if x.stem in filter_dict.values())
+
+
+def get_cutout_extent(directory: Path) -> tuple[float, float, float]:
+    """
+    Get the centre and half-width of the cutouts of a target, so that they
+    contain the source, background and any additional source regions
+
+    :param directory: Target directory, with the region files
+    :return: Right Ascension and Declination of the target in degrees,
+        and the half-width of the cutouts in arcseconds
+    """
+    ra, dec, radius = load_circle_region(src_path(directory))
+    centre = SkyCoord(ra, dec, unit="deg")
+
+    half_width = radius
+    for region_path in [bkg_path(directory)] + list(
+        get_source_regions(directory).values()
+    ):
+        if not region_path.is_file():
+            continue
+        region_ra, region_dec, region_radius = load_circle_region(region_path)
+        separation = centre.separation(SkyCoord(region_ra, region_dec, unit="deg"))
+        half_width = max(half_width, separation.arcsec + region_radius)
+
+    return ra, dec, half_width + CUTOUT_MARGIN_ARCSEC
+
+
+def make_cutout(  # pylint: disable=too-many-locals
+    image_path: Path, ra: float, dec: float, half_width_arcsec: float
+) -> fits.HDUList | None:
+    """
+    Make a cutout of the first exposed extension of a UVOT image,
+    reading only the pixels of the cutout from the memory mapped file
+
+    :param image_path: Path to the summed UVOT image
+    :param ra: Right Ascension of the centre in degrees
+    :param dec: Declination of the centre in degrees
+    :param half_width_arcsec: Half-width of the cutout in arcseconds
+    :return: Cutout, with the header of the image and a shifted reference
+        pixel, or None if the position is not on the image
+    """
+    with fits.open(image_path, memmap=True) as hdul, warnings.catch_warnings():
+        warnings.simplefilter("ignore", FITSFixedWarning)
+        hdu = next((x for x in hdul if is_exposed_image(x.header)), None)
+        if hdu is None:
+            logger.warning(f"No image extension with exposure in {image_path}")
+            return None
+
+        wcs = WCS(hdu.header, naxis=2)
+        scale = float(np.mean(proj_plane_pixel_scales(wcs))) * 3600.0
+        x, y = wcs.world_to_pixel_values(ra, dec)
+        half_pix = int(np.ceil(half_width_arcsec / scale))
+
+        ny, nx = hdu.shape
+        x_min = max(0, int(np.round(x)) - half_pix)
+        x_max = min(nx, int(np.round(x)) + half_pix + 1)
+        y_min = max(0, int(np.round(y)) - half_pix)
+        y_max = min(ny, int(np.round(y)) + half_pix + 1)
+        if x_min >= x_max or y_min >= y_max:
+            logger.warning(f"Position {ra}, {dec} is not on the image {image_path}")
+            return None
+
+        data = np.array(hdu.section[y_min:y_max, x_min:x_max])
+        header = hdu.header.copy()
+
+    # Keep the WCS (and any physical coordinates) of the full image
+    header["CRPIX1"] -= x_min
+    header["CRPIX2"] -= y_min
+    for key, offset in [("LTV1", x_min), ("LTV2", y_min)]:
+        if key in header:
+            header[key] -= offset
+    header["CUTX0"] = (x_min, "Zero-based x pixel of the cutout in the image")
+    header["CUTY0"] = (y_min, "Zero-based y pixel of the cutout in the image")
+
+    return fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(data, header=header)])
+
+
+def make_observation_cutouts(
+    swift_obs_dir: Path,
+    directory: Path,
+    overwrite: bool = False,
+    manifest_path: Path | None = None,
+) -> list[Path]:
+    """
+    Make the cutouts of the summed images of an observation.
+
+    If a manifest is provided, cutouts are only made again if the summed image
+    or the regions have changed.
+
+    :param swift_obs_dir: Single swift observation directory
+    :param directory: Target directory, with the region files
+    :param overwrite: Overwrite existing files
+    :param manifest_path: Path to the reduction manifest, if inputs are tracked
+    :return: List of cutouts
+    """
+    ra, dec, half_width = get_cutout_extent(directory)
+    manifest = ReductionManifest(manifest_path) if manifest_path else None
+
+    cutouts = []
+    for image in get_summed_images(swift_obs_dir):
+        output_path = get_cutout_path(image)
+
+        digest = None
+        if manifest is not None:
+            digest = manifest.get_digest(
+                [image], tool="cutout", ra=ra, dec=dec, half_width=half_width
+            )
+        remove_stale_output(output_path, overwrite, manifest, digest)
+
+        with span("command", tool="cutout", output=output_path.name) as attrs:
+            if output_path.is_file():
+                logger.info(f"UVOT file already exists: {output_path}")
+                attrs["cache"] = "skip"
+                cutouts.append(output_path)
+                continue
+
+            attrs["cache"] = "miss"
+            cutout = make_cutout(image, ra, dec, half_width)
+            if cutout is None:
+                continue
+
+            tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+            cutout.writeto(tmp_path, overwrite=True)
+            tmp_path.replace(output_path)
+            logger.info(f"UVOT file created at: {output_path}")
+            if manifest is not None:
+                manifest.record(output_path, digest)
+            cutouts.append(output_path)
+
+    return cutouts
+
+
+def stack_cutouts(  # pylint: disable=too-many-locals
+    cutout_paths: list[Path], ra: float, dec: float, half_width_arcsec: float
+) -> fits.HDUList:
+    """
+    Resample cutouts onto a common north-up grid centred on the target,
+    and stack their count rates as a cube, ordered by time
+
+    :param cutout_paths: Cutouts of a single filter
+    :param ra: Right Ascension of the centre in degrees
+    :param dec: Declination of the centre in degrees
+    :param half_width_arcsec: Half-width of the cube in arcseconds
+    :return: Cube, and a table with the observation, time and exposure
+        of each plane
+    """
+    planes = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FITSFixedWarning)
+        for path in cutout_paths:
+            with fits.open(path) as hdul:
+                header = hdul[1].header  # pylint: disable=no-member
+                data = np.array(hdul[1].data)  # pylint: disable=no-member
+            planes.append((header.get("TSTART", np.nan), path, data, header))
+    planes.sort(key=lambda x: x[0])
+
+    scale = float(
+        np.median(
+            [np.mean(proj_plane_pixel_scales(WCS(x[3], naxis=2))) for x in planes]
+        )
+    )
+    half_pix = int(np.ceil(half_width_arcsec / (scale * 3600.0)))
+    size = 2 * half_pix + 1
+
+    grid = WCS(naxis=2)
+    grid.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    grid.wcs.crval = [ra, dec]
+    grid.wcs.crpix = [half_pix + 1, half_pix + 1]
+    grid.wcs.cdelt = [-scale, scale]
+
+    yy, xx = np.mgrid[0:size, 0:size]
+    grid_ra, grid_dec = grid.pixel_to_world_values(xx, yy)
+
+    cube = np.full((len(planes), size, size), np.nan, dtype=np.float32)
+    for i, (_, _, data, header) in enumerate(planes):
+        x, y = WCS(header, naxis=2).world_to_pixel_values(grid_ra, grid_dec)
+        x, y = np.round(x).astype(int), np.round(y).astype(int)
+        mask = (x >= 0) & (x < data.shape[1]) & (y >= 0) & (y < data.shape[0])
+        cube[i][mask] = data[y[mask], x[mask]] / header["EXPOSURE"]
+
+    cube_header = grid.to_header()
+    cube_header["BUNIT"] = "count/s"
+    cube_header["FILTER"] = planes[0][3].get("FILTER", "")
+
+    table = fits.BinTableHDU.from_columns(
+        [
+            fits.Column(
+                name="PARENT_DIR",
+                format="16A",
+                array=[x[1].parents[2].name for x in planes],
+            ),
+            fits.Column(name="TSTART", format="D", array=[x[0] for x in planes]),
+            fits.Column(
+                name="TSTOP",
+                format="D",
+                array=[x[3].get("TSTOP", np.nan) for x in planes],
+            ),
+            fits.Column(
+                name="EXPOSURE",
+                format="D",
+                array=[x[3]["EXPOSURE"] for x in planes],
+            ),
+        ],
+        name="PLANES",
+    )
+    return fits.HDUList([fits.PrimaryHDU(cube, header=cube_header), table])
+
+
+def make_filter_cube(
+    directory: Path,
+    uvot_filter: str,
+    cutout_paths: list[Path],
+    overwrite: bool = False,
+) -> Path:
+    """
+    Function to stack the cutouts of a filter into a cube, unless the cube
+    was already made from the same cutouts
+
+    :param directory: Target directory, with the region files
+    :param uvot_filter: Filter name (see uvotredux.uvot.filters)
+    :param cutout_paths: Cutouts of the filter
+    :param overwrite: Overwrite existing files
+    :return: Path to the cube
+    """
+    ra, dec, half_width = get_cutout_extent(directory)
+    manifest = ReductionManifest(get_manifest_path(directory))
+
+    cube_path = get_cube_path(directory, uvot_filter)
+    cube_path.parent.mkdir(parents=True, exist_ok=True)
+
+    digest = manifest.get_digest(
+        cutout_paths, tool="cube", ra=ra, dec=dec, half_width=half_width
+    )
+    remove_stale_output(cube_path, overwrite, manifest, digest)
+
+    with span("command", tool="cube", output=cube_path.name) as attrs:
+        if cube_path.is_file():
+            logger.info(f"UVOT file already exists: {cube_path}")
+            attrs["cache"] = "skip"
+            return cube_path
+
+        attrs["cache"] = "miss"
+        cube = stack_cutouts(cutout_paths, ra, dec, half_width)
+        tmp_path = cube_path.with_name(f".{cube_path.name}.tmp")
+        cube.writeto(tmp_path, overwrite=True)
+        tmp_path.replace(cube_path)
+        logger.info(f"UVOT file created at: {cube_path}")
+        manifest.record(cube_path, digest)
+
+    return cube_path
+
+
+def make_target_cutouts(
+    directory: Path,
+    overwrite: bool = False,
+    workers: int = 1,
+) -> dict[str, Path]:
+    """
+    Function to make the cutouts of every summed image of a target,
+    and stack them into one cube per filter
+
+    :param directory: Target directory, with the reduced observations
+    :param overwrite: Overwrite existing files
+    :param workers: Number of worker processes for the cutouts
+    :return: Dictionary of cube paths by filter
+    """
+    directory = Path(directory)
+    all_swift_obs = sorted(get_observation_dirs(directory))
+
+    logger.info(f"Making cutouts of {len(all_swift_obs)} observations")
+
+    cutout_kwargs = {
+        "directory": directory,
+        "overwrite": overwrite,
+        "manifest_path": get_manifest_path(directory),
+    }
+
+    cutouts = []
+    if workers > 1:
+        with get_executor(workers) as executor:
+            futures = [
+                executor.submit(make_observation_cutouts, swift_obs, **cutout_kwargs)
+                for swift_obs in all_swift_obs
+            ]
+            for future in as_completed(futures):
+                cutouts += future.result()
+    else:
+        for swift_obs in all_swift_obs:
+            cutouts += make_observation_cutouts(swift_obs, **cutout_kwargs)
+
+    filters = sorted({x.stem[: -len(CUTOUT_SUFFIX)] for x in cutouts})
+    return {
+        uvot_filter: make_filter_cube(
+            directory,
+            uvot_filter,
+            sorted(x for x in cutouts if x.stem == f"{uvot_filter}{CUTOUT_SUFFIX}"),
+            overwrite=overwrite,
+        )
+        for uvot_filter in filters
+    }
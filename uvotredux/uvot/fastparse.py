@@ -0,0 +1,304 @@
+"""
+Module with a fast engine to parse many UVOT output files.
+
+The binary table of each file is memory mapped directly, without building
+astropy table objects, and only the requested columns are converted. Files are
+read on a pool of worker processes, and each column of the combined table is
+then allocated once, rather than building and concatenating a DataFrame per file.
+"""
+
+import logging
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+
+from uvotredux.utils.parallel import get_executor
+
+logger = logging.getLogger(__name__)
+
+
+FITS_BLOCK_SIZE = 2880
+FITS_CARD_SIZE = 80
+
+# numpy dtypes of the binary table formats read directly by the fast engine.
+# Logical values are single "T"/"F" bytes, marked by the otherwise unused "i1".
+BINTABLE_DTYPES = {
+    "L": "i1",
+    "B": "u1",
+    "I": ">i2",
+    "J": ">i4",
+    "K": ">i8",
+    "A": "S",
+    "E": ">f4",
+    "D": ">f8",
+}
+
+# Header keywords requiring column conversions, which are left to astropy
+SCALED_KEYWORDS = ("TSCAL", "TZERO", "TDIM")
+
+TFORM_REGEX = re.compile(r"^\s*(\d*)([A-Z])")
+
+
+def parse_header_value(value: str) -> str | int | float | bool:
+    """
+    Parse the value of a FITS header card
+
+    :param value: Card text after the "= " indicator
+    :return: Parsed value
+    """
+    value = value.strip()
+    if value.startswith("'"):
+        end = 1
+        while True:
+            end = value.index("'", end)
+            if value[end + 1 : end + 2] != "'":
+                break
+            end += 2
+        return value[1:end].replace("''", "'").rstrip()
+
+    value = value.split("/", 1)[0].strip()
+    if value in ("T", "F"):
+        return value == "T"
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def read_fits_header(f) -> dict:
+    """
+    Read a FITS header, leaving the file positioned at the start of the data
+
+    :param f: Binary file object, positioned at the start of a header
+    :return: Dictionary of header keywords and values
+    """
+    header = {}
+    while True:
+        block = f.read(FITS_BLOCK_SIZE)
+        if len(block) < FITS_BLOCK_SIZE:
+            raise ValueError(f"Unexpected end of FITS file {f.name}")
+        for i in range(0, FITS_BLOCK_SIZE, FITS_CARD_SIZE):
+            card = block[i : i + FITS_CARD_SIZE].decode("ascii")
+            key = card[:8].strip()
+            if key == "END":
+                return header
+            if card[8:10] == "= ":
+                header[key] = parse_header_value(card[10:])
+
+
+def get_data_size(header: dict) -> int:
+    """
+    Get the size in bytes of an HDU data unit, padded to whole FITS blocks
+
+    :param header: FITS header
+    :return: Size of the data unit
+    """
+    n_axis = header.get("NAXIS", 0)
+    if n_axis == 0:
+        return 0
+    size = int(np.prod([header[f"NAXIS{i + 1}"] for i in range(n_axis)]))
+    size = (
+        abs(header["BITPIX"])
+        // 8
+        * header.get("GCOUNT", 1)
+        * (header.get("PCOUNT", 0) + size)
+    )
+    return -(-size // FITS_BLOCK_SIZE) * FITS_BLOCK_SIZE
+
+
+def get_bintable_dtype(header: dict) -> np.dtype | None:
+    """
+    Get the numpy record dtype of a binary table
+
+    :param header: Header of the binary table extension
+    :return: Record dtype, or None if the table needs astropy conversions
+    """
+    if header.get("XTENSION") != "BINTABLE":
+        return None
+
+    names, formats = [], []
+    for i in range(1, header["TFIELDS"] + 1):
+        if any(f"{x}{i}" in header for x in SCALED_KEYWORDS):
+            return None
+        match = TFORM_REGEX.match(header[f"TFORM{i}"])
+        if match is None or match.group(2) not in BINTABLE_DTYPES:
+            return None
+        repeat = int(match.group(1)) if match.group(1) else 1
+        code = BINTABLE_DTYPES[match.group(2)]
+        if code == "S":
+            formats.append(f"S{repeat}")
+        elif repeat == 1:
+            formats.append(code)
+        else:
+            formats.append((code, (repeat,)))
+        names.append(header[f"TTYPE{i}"])
+
+    dtype = np.dtype({"names": names, "formats": formats})
+    if dtype.itemsize != header["NAXIS1"]:
+        return None
+    return dtype
+
+
+def convert_column(col: np.ndarray) -> np.ndarray:
+    """
+    Convert a raw binary table column to the values astropy would return
+
+    :param col: Raw column
+    :return: Converted column, in native byte order
+    """
+    if col.ndim > 1:
+        col = col.astype(col.dtype.newbyteorder("="))
+        col_list = np.empty(len(col), dtype=object)
+        col_list[:] = list(col)
+        return col_list
+    if col.dtype == np.dtype("i1"):
+        return col == ord("T")
+    if col.dtype.kind == "S":
+        return np.char.rstrip(np.char.decode(col, "ascii"))
+    return col.astype(col.dtype.newbyteorder("="))
+
+
+def read_astropy_columns(
+    output_file: Path,
+    columns: list[str] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Function to read columns from a single UVOT output file with astropy,
+    for tables with formats that are not read directly
+
+    :param output_file: Path to the uvotsource output file
+    :param columns: Columns to read, or None to read all columns
+    :return: Dictionary of column arrays, in native byte order
+    """
+    with fits.open(output_file, memmap=True) as hdul:
+        data = hdul[1].data  # pylint: disable=no-member
+        names = data.columns.names
+        if columns is not None:
+            names = [x for x in names if x in columns]
+
+        res = {}
+        for name in names:
+            col = np.array(data[name])
+            if col.ndim > 1:
+                col_list = np.empty(len(col), dtype=object)
+                col_list[:] = list(col)
+                col = col_list
+            elif col.dtype.byteorder not in ("=", "|"):
+                col = col.astype(col.dtype.newbyteorder("="))
+            res[name] = col
+
+    return res
+
+
+def read_output_columns(
+    output_file: Path,
+    columns: list[str] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Function to read columns from a single UVOT output file.
+
+    The headers are parsed directly, and the table rows are memory mapped with
+    a numpy record dtype, so only the requested columns are converted.
+    Tables with scaled or unusual column formats are read with astropy instead.
+
+    :param output_file: Path to the uvotsource output file
+    :param columns: Columns to read, or None to read all columns
+    :return: Dictionary of column arrays, in native byte order
+    """
+    with open(output_file, "rb") as f:
+        primary_header = read_fits_header(f)
+        f.seek(get_data_size(primary_header), os.SEEK_CUR)
+        header = read_fits_header(f)
+        offset = f.tell()
+
+    dtype = get_bintable_dtype(header)
+    if dtype is None:
+        logger.debug(f"Reading {output_file} with astropy")
+        return read_astropy_columns(output_file, columns)
+
+    names = list(dtype.names)
+    if columns is not None:
+        names = [x for x in names if x in columns]
+
+    n_rows = header["NAXIS2"]
+    if n_rows == 0:
+        data = np.zeros(0, dtype=dtype)
+    else:
+        data = np.memmap(
+            output_file, dtype=dtype, mode="r", offset=offset, shape=n_rows
+        )
+
+    res = {name: convert_column(data[name]) for name in names}
+    del data
+    return res
+
+
+def read_all_output_columns(
+    image_output_files: list[Path],
+    columns: list[str] | None = None,
+    workers: int = 1,
+) -> list[dict[str, np.ndarray]]:
+    """
+    Read the columns of multiple UVOT output files, in parallel if requested
+
+    :param image_output_files: List of UVOT output files
+    :param columns: Columns to read, or None to read all columns
+    :param workers: Number of worker processes used to read files
+    :return: List of column dictionaries, one per file
+    """
+    logger.info(
+        f"Parsing {len(image_output_files)} UVOT output files with {workers} workers"
+    )
+
+    if workers > 1 and len(image_output_files) > 1:
+        chunksize = max(1, len(image_output_files) // (4 * workers))
+        with get_executor(workers) as executor:
+            return list(
+                executor.map(
+                    read_output_columns,
+                    image_output_files,
+                    [columns] * len(image_output_files),
+                    chunksize=chunksize,
+                )
+            )
+
+    return [read_output_columns(x, columns) for x in image_output_files]
+
+
+def concatenate_output_columns(
+    all_cols: list[dict[str, np.ndarray]],
+    parent_dirs: list[str],
+    labels: dict[str, list] | None = None,
+) -> pd.DataFrame:
+    """
+    Concatenate the columns read from multiple UVOT output files
+
+    :param all_cols: List of column dictionaries, one per file
+    :param parent_dirs: Observation directory name of each file
+    :param labels: Additional label columns, with one value per file,
+        e.g. the SOURCE name of each file
+    :return: DataFrame with the combined results, with a PARENT_DIR column
+        and a column for each label
+    """
+    labels = {"PARENT_DIR": parent_dirs, **(labels or {})}
+
+    names = list(all_cols[0].keys())
+    if any(list(x.keys()) != names for x in all_cols):
+        logger.warning("UVOT output files have different columns, concatenating")
+        all_df = []
+        for i, cols in enumerate(all_cols):
+            df = pd.DataFrame(cols)
+            for label, values in labels.items():
+                df[label] = values[i]
+            all_df.append(df)
+        return pd.concat(all_df, ignore_index=True)
+
+    combined = {name: np.concatenate([x[name] for x in all_cols]) for name in names}
+    n_rows = [len(next(iter(x.values()), [])) for x in all_cols]
+    for label, values in labels.items():
+        combined[label] = np.repeat(values, n_rows)
+    return pd.DataFrame(combined, copy=False)
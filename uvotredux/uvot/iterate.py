@@ -3,20 +3,136 @@ Module to iterate over all the Swift UVOT observations in a directory and unpack
 """
 
 import logging
+from concurrent.futures import as_completed
 from pathlib import Path
 
-from uvotredux.download.regions import bkg_path, src_path
-from uvotredux.utils import get_observation_dirs
+from uvotredux.download.regions import bkg_path, get_source_regions, src_path
+from uvotredux.utils.parallel import get_executor
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.uvot.manifest import get_manifest_path
 from uvotredux.uvot.parse import parse_uvot_results
-from uvotredux.uvot.reduce import unpack_single_uvot_obs
+from uvotredux.uvot.reduce import (
+    get_reduction_extensions,
+    reduce_single_uvot_image,
+    unpack_single_uvot_obs,
+    unpack_uvot_images,
+)
 
 logger = logging.getLogger(__name__)
 
 
-def iterate_uvot_reduction(
+def get_reduction_inputs(directory: Path) -> tuple[list[Path], Path, Path]:
+    """
+    Function to get the swift observations and region files of a target,
+    checking that they exist
+
+    :param directory: Directory containing the swift observations
+    :return: List of swift observation directories, and the source
+        and background region paths
+    """
+    all_swift_obs = get_observation_dirs(directory)
+
+    if len(all_swift_obs) == 0:
+        raise FileNotFoundError(
+            f"No Swift observations found in directory: {directory}"
+        )
+
+    src_region_path = src_path(directory)
+    bkg_region_path = bkg_path(directory)
+
+    for path in [src_region_path, bkg_region_path]:
+        if not path.is_file():
+            raise FileNotFoundError(f"Region file {path} not found")
+
+    return all_swift_obs, src_region_path, bkg_region_path
+
+
+def parallel_uvot_reduction(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    swift_obs_dirs: list[Path],
+    src_region_path: Path,
+    bkg_region_path: Path,
+    overwrite: bool = False,
+    workers: int = 1,
+    manifest_path: Path | None = None,
+    source_regions: dict[str, Path] | None = None,
+    photometry: str = "uvotsource",
+    per_extension: bool = False,
+    decompress_workers: int = 1,
+    decompressor: str | None = None,
+):
+    """
+    Function to reduce swift observations on a pool of worker processes.
+    Each observation is unpacked as a separate task, and each of its images
+    (or each image extension, if measured separately) is then reduced as a
+    separate task once unpacking has finished.
+
+    :param swift_obs_dirs: List of swift observation directories
+    :param src_region_path: Path to the source region file
+    :param bkg_region_path: Path to the background region file
+    :param overwrite: Overwrite existing files
+    :param workers: Number of worker processes
+    :param manifest_path: Path to the reduction manifest, if inputs are tracked
+    :param source_regions: Region paths of additional named sources, by name
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param per_extension: Measure each extension of the images separately
+    :param decompress_workers: Number of threads to decompress the images
+        of each observation
+    :param decompressor: External decompressor, e.g. "pigz" or "auto",
+        defaulting to the UVOTREDUX_GUNZIP environment variable
+    :return: None
+    """
+    logger.info(
+        f"Reducing {len(swift_obs_dirs)} Swift observations with {workers} workers"
+    )
+
+    reduce_kwargs = {
+        "src_region_path": src_region_path,
+        "bkg_region_path": bkg_region_path,
+        "overwrite": overwrite,
+        "manifest_path": manifest_path,
+        "source_regions": source_regions,
+        "photometry": photometry,
+    }
+
+    with get_executor(workers) as executor:
+        unpack_futures = [
+            executor.submit(
+                unpack_uvot_images,
+                swift_obs / "uvot/image",
+                workers=decompress_workers,
+                decompressor=decompressor,
+            )
+            for swift_obs in sorted(swift_obs_dirs)
+        ]
+
+        image_futures = []
+        for future in as_completed(unpack_futures):
+            for image in future.result():
+                image_futures += [
+                    executor.submit(
+                        reduce_single_uvot_image,
+                        image,
+                        extension=extension,
+                        **reduce_kwargs,
+                    )
+                    for extension in get_reduction_extensions(image, per_extension)
+                ]
+
+        for future in as_completed(image_futures):
+            future.result()
+
+
+def iterate_uvot_reduction(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
     directory: Path | None = None,
     overwrite: bool = False,
     skyportal: bool = False,
+    workers: int = 1,
+    parse_engine: str = "astropy",
+    output_format: str = "csv",
+    photometry: str = "uvotsource",
+    per_extension: bool = False,
+    decompress_workers: int = 1,
+    decompressor: str | None = None,
 ):
     """
     Function to unpack all the swift observations in a directory
@@ -24,6 +140,16 @@ def iterate_uvot_reduction(
     :param directory: Directory containing the swift observations
     :param overwrite: Overwrite existing files
     :param skyportal: Convert the results to SkyPortal format
+    :param workers: Number of worker processes to use for the reduction
+    :param parse_engine: Engine used to parse the results ("astropy" or "fast")
+    :param output_format: Format of the results files (see OUTPUT_FORMATS)
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param per_extension: Measure each extension of the images separately,
+        instead of the summed images
+    :param decompress_workers: Number of threads to decompress the images
+        of each observation
+    :param decompressor: External decompressor, e.g. "pigz" or "auto",
+        defaulting to the UVOTREDUX_GUNZIP environment variable
     :return: None
     """
 
@@ -34,26 +160,34 @@ def iterate_uvot_reduction(
 
     logger.info(f"Unpacking Swift observations in directory: {directory}")
 
-    all_swift_obs = get_observation_dirs(directory)
-
-    if len(all_swift_obs) == 0:
-        raise FileNotFoundError(
-            f"No Swift observations found in directory: {directory}"
-        )
+    all_swift_obs, src_region_path, bkg_region_path = get_reduction_inputs(directory)
 
-    src_region_path = src_path(directory)
-    bkg_region_path = bkg_path(directory)
+    source_regions = get_source_regions(directory)
+    if len(source_regions) > 0:
+        logger.info(f"Also measuring sources: {', '.join(source_regions)}")
 
-    for path in [src_region_path, bkg_region_path]:
-        if not path.is_file():
-            raise FileNotFoundError(f"Region file {path} not found")
+    reduce_kwargs = {
+        "src_region_path": src_region_path,
+        "bkg_region_path": bkg_region_path,
+        "overwrite": overwrite,
+        "manifest_path": get_manifest_path(directory),
+        "source_regions": source_regions,
+        "photometry": photometry,
+        "per_extension": per_extension,
+        "decompress_workers": decompress_workers,
+        "decompressor": decompressor,
+    }
 
-    for swift_obs in sorted(all_swift_obs):
-        unpack_single_uvot_obs(
-            swift_obs,
-            src_region_path=src_region_path,
-            bkg_region_path=bkg_region_path,
-            overwrite=overwrite,
-        )
+    if workers > 1:
+        parallel_uvot_reduction(all_swift_obs, workers=workers, **reduce_kwargs)
+    else:
+        for swift_obs in sorted(all_swift_obs):
+            unpack_single_uvot_obs(swift_obs, **reduce_kwargs)
 
-    parse_uvot_results(directory, skyportal=skyportal)
+    parse_uvot_results(
+        directory,
+        skyportal=skyportal,
+        engine=parse_engine,
+        workers=workers,
+        output_format=output_format,
+    )
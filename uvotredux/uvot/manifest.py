@@ -0,0 +1,219 @@
+"""
+Module to track the inputs used to create each UVOT reduction product,
+so that only products with changed inputs are recreated
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import time
+from contextlib import closing
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "reduction_manifest.sqlite"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_manifest_path(directory: Path) -> Path:
+    """
+    Function to get the path to the reduction manifest of a target
+
+    :param directory: Target directory containing the swift observations
+    :return: Path to the manifest file
+    """
+    return Path(directory) / MANIFEST_NAME
+
+
+@functools.cache
+def get_heasoft_version() -> str:
+    """
+    Get the version of the installed HEASoft
+
+    :return: HEASoft version string
+    """
+    try:
+        res = subprocess.run(
+            ["fversion"], capture_output=True, text=True, check=True, timeout=60
+        )
+        return res.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return os.getenv("HEADAS", "unknown")
+
+
+def hash_file(path: Path) -> str:
+    """
+    Function to calculate the sha256 hash of a file, reading it in chunks
+
+    :param path: Path to the file
+    :return: Hex digest of the file contents
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ReductionManifest:
+    """
+    Per-target record of the input hash used to create each reduction product.
+
+    The manifest is an SQLite database, so it can be safely shared between
+    parallel worker processes. File hashes are cached by size and modification
+    time, so unchanged images are only ever hashed once.
+
+    Products without a record are normally recreated, as they may be left
+    from a failed run. Products which predate the manifest itself, e.g. those
+    of targets reduced before their inputs were tracked, are instead adopted
+    on first sight with their current inputs, so they are not all recomputed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.base_dir = self.path.parent
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection to the manifest database, creating tables if needed
+
+        :return: SQLite connection
+        """
+        is_new = not self.path.exists()
+        conn = sqlite3.connect(self.path, timeout=60.0)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        if is_new:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO meta VALUES ('created_at', ?)",
+                    (time.time(),),
+                )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS products "
+            "(path TEXT PRIMARY KEY, digest TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+        )
+        return conn
+
+    def _key(self, path: Path) -> str:
+        """
+        Get the manifest key for a path, relative to the target directory
+
+        :param path: Path to a file
+        :return: Key
+        """
+        return os.path.relpath(Path(path).absolute(), self.base_dir.absolute())
+
+    def file_digest(self, path: Path) -> str:
+        """
+        Get the hash of a file, reusing the cached value if unchanged
+
+        :param path: Path to the file
+        :return: Hex digest of the file contents
+        """
+        key = self._key(path)
+        stat = Path(path).stat()
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT size, mtime_ns, digest FROM files WHERE path = ?", (key,)
+            ).fetchone()
+            if (
+                row is not None
+                and row[0] == stat.st_size
+                and row[1] == stat.st_mtime_ns
+            ):
+                return row[2]
+
+            digest = hash_file(path)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    (key, stat.st_size, stat.st_mtime_ns, digest),
+                )
+        return digest
+
+    def get_digest(self, inputs: list[Path], **params) -> str:
+        """
+        Get the combined hash of all inputs used to create a product
+
+        :param inputs: Input files
+        :param params: Command parameters
+        :return: Hex digest
+        """
+        record = {
+            "inputs": [self.file_digest(x) for x in inputs],
+            "params": params,
+            "heasoft": get_heasoft_version(),
+        }
+        return hashlib.sha256(
+            json.dumps(record, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def is_current(self, output_path: Path, digest: str) -> bool:
+        """
+        Check whether a product was created from the given inputs
+
+        :param output_path: Path to the product
+        :param digest: Hash of the current inputs
+        :return: Boolean
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT digest FROM products WHERE path = ?",
+                (self._key(output_path),),
+            ).fetchone()
+        return row is not None and row[0] == digest
+
+    def record(self, output_path: Path, digest: str):
+        """
+        Record the inputs used to create a product
+
+        :param output_path: Path to the product
+        :param digest: Hash of the inputs
+        :return: None
+        """
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO products VALUES (?, ?)",
+                    (self._key(output_path), digest),
+                )
+
+    def adopt(self, output_path: Path, digest: str) -> bool:
+        """
+        Record an existing product without a record as created from the given
+        inputs, if the product predates the manifest
+
+        :param output_path: Path to the product
+        :param digest: Hash of the current inputs
+        :return: Whether the product was adopted
+        """
+        key = self._key(output_path)
+        with closing(self._connect()) as conn:
+            created_at = conn.execute(
+                "SELECT value FROM meta WHERE key = 'created_at'"
+            ).fetchone()
+            recorded = conn.execute(
+                "SELECT 1 FROM products WHERE path = ?", (key,)
+            ).fetchone()
+
+        if (
+            created_at is None
+            or recorded is not None
+            or Path(output_path).stat().st_mtime >= created_at[0]
+        ):
+            return False
+
+        logger.info(f"Adopting existing product into the manifest: {output_path}")
+        self.record(output_path, digest)
+        return True
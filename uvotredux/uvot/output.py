@@ -0,0 +1,169 @@
+"""
+Module to write and load the UVOT results in different file formats.
+
+Besides csv, the results can be saved in typed columnar formats (Parquet,
+Feather or HDF5) with an explicit schema, which are much faster to load.
+"""
+
+import importlib.util
+import logging
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from uvotredux.options import OUTPUT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+RESULTS_NAME = "uvot_results"
+SUMMARY_NAME = "uvot_summary"
+
+# Optional packages needed by pandas for each format
+FORMAT_DEPENDENCIES = {
+    "parquet": "pyarrow",
+    "feather": "pyarrow",
+    "hdf5": "tables",
+}
+
+HDF5_KEY = "results"
+
+FLOAT64_COLUMNS = ["MET", "JD", "MJD", "RA", "DEC", "EXPOSURE"]
+
+STRING_COLUMNS = ["ISOT", "SOURCE", "PARENT_DIR"]
+
+MAGNITUDE_REGEX = re.compile(r"(^|_)MAG(_|$)")
+
+
+def check_output_format(output_format: str):
+    """
+    Check that an output format is known, and that its dependencies are installed
+
+    :param output_format: Output format
+    :return: None
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format '{output_format}', "
+            f"choose from {list(OUTPUT_FORMATS)}"
+        )
+
+    module = FORMAT_DEPENDENCIES.get(output_format)
+    if module is not None and importlib.util.find_spec(module) is None:
+        raise ImportError(
+            f"The {output_format} output format requires {module}. "
+            f"Install it with 'pip install uvotredux[io]'."
+        )
+
+
+def get_results_path(
+    directory: Path,
+    summary: bool = False,
+    output_format: str = "csv",
+) -> Path:
+    """
+    Get the path of the results file of a target
+
+    :param directory: Target directory
+    :param summary: Whether to get the summary file rather than all results
+    :param output_format: Output format
+    :return: Path to the results file
+    """
+    name = SUMMARY_NAME if summary else RESULTS_NAME
+    return Path(directory) / f"{name}{OUTPUT_FORMATS[output_format]}"
+
+
+def apply_results_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the typed schema of the UVOT results.
+
+    Filters are stripped of their FITS padding and stored as categories,
+    times and coordinates as float64, magnitudes as float32, and timestamps and
+    observation IDs as strings.
+
+    :param df: DataFrame with the UVOT results
+    :return: Typed copy of the DataFrame
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col == "FILTER":
+            df[col] = df[col].astype(str).str.strip().astype("category")
+        elif col in STRING_COLUMNS:
+            df[col] = df[col].astype(str)
+        elif col in FLOAT64_COLUMNS:
+            df[col] = df[col].astype("float64")
+        elif MAGNITUDE_REGEX.search(col) and pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def write_uvot_results(df: pd.DataFrame, output_path: Path, output_format: str):
+    """
+    Write UVOT results to a file.
+
+    csv files are written as is, while the typed schema is applied
+    for the columnar formats.
+
+    :param df: DataFrame with the UVOT results
+    :param output_path: Output path
+    :param output_format: Output format
+    :return: None
+    """
+    check_output_format(output_format)
+
+    if output_format == "csv":
+        df.to_csv(output_path)
+        return
+
+    df = apply_results_schema(df)
+    if output_format == "parquet":
+        df.to_parquet(output_path)
+    elif output_format == "feather":
+        df.reset_index(drop=True).to_feather(output_path)
+    elif output_format == "hdf5":
+        df.to_hdf(output_path, key=HDF5_KEY, mode="w", format="table")
+
+    logger.debug(f"Saved UVOT results to {output_path}")
+
+
+def load_uvot_results(
+    directory: Path,
+    summary: bool = False,
+    output_format: str | None = None,
+) -> pd.DataFrame:
+    """
+    Load the UVOT results of a target, with the typed schema applied
+
+    :param directory: Target directory
+    :param summary: Whether to load the summary rather than all results
+    :param output_format: Format to load. If None, the most recently written
+        results file is loaded.
+    :return: DataFrame with the UVOT results
+    """
+    if output_format is None:
+        candidates = [
+            x
+            for x in OUTPUT_FORMATS
+            if get_results_path(directory, summary, x).is_file()
+        ]
+        if len(candidates) == 0:
+            raise FileNotFoundError(f"No UVOT results found in {directory}")
+        output_format = max(
+            candidates,
+            key=lambda x: get_results_path(directory, summary, x).stat().st_mtime,
+        )
+
+    check_output_format(output_format)
+    path = get_results_path(directory, summary, output_format)
+
+    logger.debug(f"Loading UVOT results from {path}")
+
+    if output_format == "parquet":
+        return pd.read_parquet(path)
+    if output_format == "feather":
+        return pd.read_feather(path)
+    if output_format == "hdf5":
+        return pd.read_hdf(path, key=HDF5_KEY)
+
+    df = pd.read_csv(path, index_col=0, dtype={x: str for x in STRING_COLUMNS})
+    return apply_results_schema(df)
@@ -2,76 +2,205 @@
 Module to parse the UVOT results
 """
 
+import functools
 import logging
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from astropy.io import fits
 from astropy.table import Table
 
-from uvotredux.utils import (
-    convert_met_to_utc,
-    convert_to_skyportal,
-    get_observation_dirs,
+from uvotredux.download.regions import PRIMARY_SOURCE_NAME
+from uvotredux.options import PARSE_ENGINES
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.utils.profiling import span
+from uvotredux.utils.skyportal import convert_to_skyportal
+from uvotredux.utils.time import convert_met_to_utc
+from uvotredux.uvot.fastparse import (
+    concatenate_output_columns,
+    read_all_output_columns,
 )
+from uvotredux.uvot.output import (
+    check_output_format,
+    get_results_path,
+    write_uvot_results,
+)
+from uvotredux.uvot.results_store import ResultsStore, get_results_store_path
 
 logger = logging.getLogger(__name__)
 
+SUMMARY_COLUMNS = [
+    "ISOT",
+    "MJD",
+    "RA",
+    "DEC",
+    "FILTER",
+    "EXPOSURE",
+    "AB_MAG",
+    "AB_MAG_ERR",
+    "AB_MAG_LIM",
+    "EXTENSION",
+    "SOURCE",
+    "PARENT_DIR",
+]
+
+
+def get_output_labels(output_path: Path) -> tuple[str, int]:
+    """
+    Function to get the source name and extension of a uvotsource output file,
+    named <filter>.out for the target or <filter>_<source>.out, with a
+    .<extension> suffix before .out for a single extension of the sky image
+
+    :param output_path: Path to the uvotsource output file
+    :return: Source name, and extension index (0 for the summed image)
+    """
+    name, _, extension = output_path.stem.partition(".")
+    _, _, source = name.partition("_")
+    return source if source else PRIMARY_SOURCE_NAME, int(extension or 0)
+
 
 def parse_single_uvot_results(
     log_file: Path,
-):
+) -> pd.DataFrame:
     """
     Function to parse the UVOT results from a single observation
 
     :param log_file: Path to the UVOT log file
-    :return: None
+    :return: DataFrame with the results
     """
     logger.info(f"Parsing UVOT results from: {log_file}")
 
     with fits.open(log_file) as hdul:
         res = Table(hdul[1].data).to_pandas()  # pylint: disable=no-member
 
-    time = convert_met_to_utc(float(res["MET"][0]))
-    res["JD"] = time.jd
-    res["ISOT"] = time.isot
-    res["MJD"] = time.mjd
     return res
 
 
+def add_time_columns(df: pd.DataFrame):
+    """
+    Function to add JD, ISOT and MJD columns for the MET of every row,
+    using a single vectorized time conversion
+
+    :param df: DataFrame with a MET column
+    :return: None
+    """
+    time = convert_met_to_utc(df["MET"].to_numpy(dtype=float))
+    df["JD"] = time.jd
+    df["ISOT"] = time.isot
+    df["MJD"] = time.mjd
+
+
+def read_uvot_columns(
+    image_output_files: list[Path],
+    engine: str = "astropy",
+    columns: list[str] | None = None,
+    workers: int = 1,
+) -> list[dict[str, np.ndarray]]:
+    """
+    Read the columns of multiple UVOT output files
+
+    :param image_output_files: List of UVOT output files
+    :param engine: Parse engine, either "astropy" (read each file into a table)
+        or "fast" (memory mapped, column projected and parallel)
+    :param columns: Columns to read from each file, or None to read all columns
+    :param workers: Number of worker processes used by the fast engine
+    :return: List of column dictionaries, one per file
+    """
+    if engine == "fast":
+        return read_all_output_columns(
+            image_output_files, columns=columns, workers=workers
+        )
+
+    if engine == "astropy":
+        all_cols = []
+        for uvot_image in image_output_files:
+            df = parse_single_uvot_results(uvot_image)
+            all_cols.append(
+                {
+                    x: df[x].to_numpy()
+                    for x in df.columns
+                    if columns is None or x in columns
+                }
+            )
+        return all_cols
+
+    raise ValueError(f"Unknown parse engine '{engine}', choose from {PARSE_ENGINES}")
+
+
 def combine_uvot_results(
     image_output_files: list[Path],
+    engine: str = "astropy",
+    columns: list[str] | None = None,
+    workers: int = 1,
+    results_store_path: Path | None = None,
 ) -> pd.DataFrame:
     """
     Combine the UVOT results from multiple observations
 
     :param image_output_files: List of UVOT output files
+    :param engine: Parse engine, either "astropy" (read each file into a table)
+        or "fast" (memory mapped, column projected and parallel)
+    :param columns: Columns to read from each file, or None to read all columns
+    :param workers: Number of worker processes used by the fast engine
+    :param results_store_path: Path to a results store, so that only new or
+        changed files are parsed. If None, all files are parsed.
     :return: DataFrame with the combined results
     """
-    # Parse each individual UVOT image
-    all_df = []
-    for uvot_image in sorted(image_output_files):
-        parent_dir = uvot_image.parents[2].name
-        df = parse_single_uvot_results(uvot_image)
-        df["PARENT_DIR"] = parent_dir
-        all_df.append(df)
-
-    new_df = pd.concat(all_df)
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ["MET"]))
+
+    image_output_files = sorted(image_output_files)
+
+    reader = functools.partial(
+        read_uvot_columns, engine=engine, columns=columns, workers=workers
+    )
+
+    if results_store_path is None:
+        all_cols = reader(image_output_files)
+    else:
+        all_cols = ResultsStore(results_store_path).update(
+            image_output_files,
+            reader=reader,
+            config={"engine": engine, "columns": columns},
+        )
+
+    sources, extensions = zip(*[get_output_labels(x) for x in image_output_files])
+    new_df = concatenate_output_columns(
+        all_cols,
+        [x.parents[2].name for x in image_output_files],
+        labels={"EXTENSION": list(extensions), "SOURCE": list(sources)},
+    )
+
+    add_time_columns(new_df)
+    for col in ["EXTENSION", "SOURCE", "PARENT_DIR"]:
+        new_df[col] = new_df.pop(col)
+
     new_df.sort_values(by="JD", inplace=True, ignore_index=True)
     return new_df
 
 
-def parse_uvot_results(
+def parse_uvot_results(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     directory: Path | None = None,
     skyportal: bool = False,
+    engine: str = "astropy",
+    columns: list[str] | None = None,
+    workers: int = 1,
+    output_format: str = "csv",
 ):
     """
     Function to parse the UVOT results from a directory
 
     :param directory: Directory containing the UVOT observations
     :param skyportal: Convert the results to SkyPortal format
+    :param engine: Parse engine, either "astropy" or "fast"
+    :param columns: Columns to read from each output file, or None for all.
+        The summary columns are always read.
+    :param workers: Number of worker processes used by the fast engine
+    :param output_format: Format of the results files (see OUTPUT_FORMATS)
     :return: None
     """
+    check_output_format(output_format)
 
     if directory is None:
         directory = Path.cwd()
@@ -97,30 +226,30 @@ def parse_uvot_results(
     if len(all_uvot_images) == 0:
         raise FileNotFoundError(f"No UVOT images found in directory: {directory}")
 
-    new_df = combine_uvot_results(all_uvot_images)
+    if columns is not None:
+        columns = list(columns) + SUMMARY_COLUMNS
+
+    with span("parse", engine=engine, n_files=len(all_uvot_images)):
+        new_df = combine_uvot_results(
+            all_uvot_images,
+            engine=engine,
+            columns=columns,
+            workers=workers,
+            results_store_path=get_results_store_path(directory),
+        )
 
     logger.info(f"Found {len(new_df)} UVOT results")
 
-    output_path = directory / "uvot_results.csv"
-    new_df.to_csv(output_path)
-
-    slim_df = new_df[
-        [
-            "ISOT",
-            "MJD",
-            "RA",
-            "DEC",
-            "FILTER",
-            "EXPOSURE",
-            "AB_MAG",
-            "AB_MAG_ERR",
-            "AB_MAG_LIM",
-            "PARENT_DIR",
-        ]
-    ]
-    slim_output_path = directory / "uvot_summary.csv"
-    slim_df.to_csv(slim_output_path)
+    with span("write_results", format=output_format, n_rows=len(new_df)):
+        output_path = get_results_path(directory, output_format=output_format)
+        write_uvot_results(new_df, output_path, output_format)
+
+        slim_df = new_df[SUMMARY_COLUMNS]
+        slim_output_path = get_results_path(
+            directory, summary=True, output_format=output_format
+        )
+        write_uvot_results(slim_df, slim_output_path, output_format)
     print(slim_df)
 
     if skyportal:
-        convert_to_skyportal(new_df)
+        convert_to_skyportal(new_df[new_df["SOURCE"] == PRIMARY_SOURCE_NAME])
@@ -4,52 +4,173 @@ Created by Brad Cenko
 Updated by Robert Stein on 2024-03-08 to use python3, pathlib, f-strings and gzip
 """
 
-import gzip
 import logging
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from astropy.io import fits
+
+from uvotredux.download.store import get_stored_path
+from uvotredux.options import PHOTOMETRY_ENGINES
+from uvotredux.utils.compression import decompress_gzip, get_external_decompressor
+from uvotredux.utils.heasoft import format_command, get_heasoft_executor
+from uvotredux.utils.profiling import span
 from uvotredux.uvot.filters import filter_dict
+from uvotredux.uvot.manifest import ReductionManifest
+from uvotredux.uvot.quicklook import (
+    QUICKLOOK_SIGMA,
+    is_exposed_image,
+    quicklook_photometry,
+    write_quicklook_output,
+)
 
 logger = logging.getLogger(__name__)
 
+UVOTSOURCE_PARAMS = {
+    "sigma": "3.0",
+    "syserr": "yes",
+    "output": "ALL",
+    "apercorr": "CURVEOFGROWTH",
+}
+
+
+def get_source_output_path(
+    uvot_dir: Path,
+    uvot_filter: str,
+    source: str | None = None,
+    extension: int | None = None,
+) -> Path:
+    """
+    Function to get the path of the uvotsource output for a filter and source,
+    named <filter>[_<source>][.<extension>].out
+
+    :param uvot_dir: UVOT image directory of an observation
+    :param uvot_filter: Filter of the summed image
+    :param source: Name of an additional source, or None for the target
+    :param extension: Index of a single extension of the sky image,
+        or None for the summed image
+    :return: Path to the uvotsource output file
+    """
+    name = uvot_filter if source is None else f"{uvot_filter}_{source}"
+    if extension is not None:
+        name += f".{extension}"
+    return uvot_dir / f"{name}.out"
+
+
+def get_image_extensions(image: Path) -> list[int]:
+    """
+    Function to get the extensions of a UVOT sky image with an exposure,
+    reading only the headers of the memory mapped file
+
+    :param image: Path to the uncompressed UVOT sky image
+    :return: List of extension indices
+    """
+    with fits.open(image, memmap=True) as hdul:
+        return [i for i, hdu in enumerate(hdul) if is_exposed_image(hdu.header)]
+
+
+def get_reduction_extensions(
+    image: Path, per_extension: bool = False
+) -> list[int | None]:
+    """
+    Function to get the reduction tasks of a UVOT sky image, either the summed
+    image (None) or each exposed extension
+
+    :param image: Path to the uncompressed UVOT sky image
+    :param per_extension: Measure each extension separately
+    :return: List of extension indices, or [None] for the summed image
+    """
+    if not per_extension:
+        return [None]
+    return get_image_extensions(image)
+
 
-def execute_command(
-    cmd: str,
+def remove_stale_output(
     output_path: Path,
     overwrite: bool = False,
+    manifest: ReductionManifest | None = None,
+    digest: str | None = None,
 ):
     """
-    Function to execute a command and handle the output
+    Function to remove an existing output which should be recreated, either
+    because overwrite is set, or because it was created from other inputs.
+    Outputs which predate the manifest are adopted instead (see
+    ReductionManifest.adopt).
 
-    :param cmd: Command to execute
-    :param output_path: Output path for the command
+    :param output_path: Output path
     :param overwrite: Bool to overwrite existing files
+    :param manifest: Manifest recording the inputs used for each product
+    :param digest: Hash of the inputs for the output
     :return: None
     """
     if output_path.is_file() and overwrite:
         logger.info(f"Removing existing UVOT file: {output_path}")
         output_path.unlink()
 
-    if output_path.is_file():
-        logger.info(f"UVOT file already exists: {output_path}")
-    else:
-        logger.info(f"Executing command: '{cmd}'")
-        subprocess.run(cmd, shell=True, check=True)
-        logger.info(f"UVOT file created at: {output_path}")
+    if (
+        output_path.is_file()
+        and (manifest is not None)
+        and not manifest.is_current(output_path, digest)
+        and not manifest.adopt(output_path, digest)
+    ):
+        logger.info(f"Inputs changed, removing stale UVOT file: {output_path}")
+        output_path.unlink()
+
+
+def execute_command(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    cmd: list[str | Path],
+    output_path: Path,
+    overwrite: bool = False,
+    manifest: ReductionManifest | None = None,
+    digest: str | None = None,
+    log_path: Path | None = None,
+):
+    """
+    Function to execute a HEASoft command and handle the output
+
+    If a manifest is provided, an existing output is only reused if it was
+    created from inputs with the same digest.
+
+    :param cmd: Tool and its arguments
+    :param output_path: Output path for the command
+    :param overwrite: Bool to overwrite existing files
+    :param manifest: Manifest recording the inputs used for each product
+    :param digest: Hash of the inputs for this command
+    :param log_path: Path to save the standard output of the tool, if any
+    :return: None
+    """
+    remove_stale_output(output_path, overwrite, manifest, digest)
+
+    with span("command", tool=str(cmd[0]), output=output_path.name) as attrs:
+        if output_path.is_file():
+            logger.info(f"UVOT file already exists: {output_path}")
+            attrs["cache"] = "skip"
+        else:
+            logger.info(f"Executing command: '{format_command(cmd)}'")
+            attrs["cache"] = "miss"
+            get_heasoft_executor().run(cmd, stdout_path=log_path)
+            logger.info(f"UVOT file created at: {output_path}")
+            if (manifest is not None) and output_path.is_file():
+                manifest.record(output_path, digest)
 
     if not output_path.is_file():
         logger.error(f"UVOT file not created: {output_path}")
-        logger.error(f"Command: {cmd}")
+        logger.error(f"Command: {format_command(cmd)}")
 
 
 def unpack_uvot_images(
     uvot_dir: Path,
+    workers: int = 1,
+    decompressor: str | None = None,
 ) -> list[Path]:
     """
     Function to unpack the swift UVOT images
 
     :param uvot_dir: Path to the UVOT directory
+    :param workers: Number of threads to use for decompression
+    :param decompressor: External decompressor to use, e.g. "pigz" or "auto".
+        Defaults to the UVOTREDUX_GUNZIP environment variable, or python.
     :return: List of unpacked images
     """
     swift_images = [x for x in uvot_dir.glob("*_sk.img") if x.is_file()]
@@ -58,67 +179,344 @@ def unpack_uvot_images(
     logger.info(f"Unpacking Swift observation: {uvot_dir.parent.parent}")
     logger.info(f"Found {len(swift_compressed_images)} compressed images")
 
-    # Uncompress the images
-    for image in swift_compressed_images:
+    to_uncompress = [
+        image
+        for image in swift_compressed_images
+        if not image.with_suffix("").is_file()
+    ]
+
+    executable = get_external_decompressor(decompressor) if to_uncompress else None
+    obs_id = uvot_dir.parent.parent.name
+
+    def uncompress(image: Path) -> Path:
         uncompressed_image = image.with_suffix("")
-        if not uncompressed_image.is_file():
-            logger.info(f"Uncompressing image: {image}")
-            with gzip.open(image, "rb") as f_in:
-                with open(uncompressed_image, "wb") as f_out:
-                    f_out.write(f_in.read())
-            swift_images.append(uncompressed_image)
+
+        # Images linked from the shared store are uncompressed in the store
+        stored_image = get_stored_path(image)
+        with span("decompress", obs_id=obs_id, file=image.name) as attrs:
+            if stored_image == image:
+                logger.info(f"Uncompressing image: {image}")
+                decompress_gzip(image, uncompressed_image, executable=executable)
+                attrs["cache"] = "miss"
+            else:
+                stored_uncompressed_image = stored_image.with_suffix("")
+                attrs["cache"] = "store"
+                if not stored_uncompressed_image.is_file():
+                    logger.info(f"Uncompressing stored image: {stored_image}")
+                    decompress_gzip(
+                        stored_image, stored_uncompressed_image, executable=executable
+                    )
+                    attrs["cache"] = "miss"
+                if uncompressed_image.is_symlink():
+                    uncompressed_image.unlink()
+                uncompressed_image.symlink_to(stored_uncompressed_image)
+        return uncompressed_image
+
+    # Uncompress the images
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            swift_images += list(executor.map(uncompress, to_uncompress))
+    else:
+        swift_images += [uncompress(image) for image in to_uncompress]
 
     return swift_images
 
 
-def unpack_single_uvot_obs(
-    swift_obs_dir: Path,
+def reduce_single_uvot_image(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    image: Path,
     src_region_path: Path,
     bkg_region_path: Path,
     overwrite: bool = False,
+    manifest_path: Path | None = None,
+    source_regions: dict[str, Path] | None = None,
+    photometry: str = "uvotsource",
+    extension: int | None = None,
 ):
     """
-    Function to unpack the swift UVOT observation and create the uvot images
+    Function to sum a single swift UVOT image and extract the source photometry.
+    The image is summed once, and every source is measured on the summed image.
+    With quick-look photometry, the sources are measured on the raw image
+    instead, without HEASoft. If an extension is given, the sources are only
+    measured on that snapshot of the raw image, without summing.
 
-    :param swift_obs_dir: Single swift observation directory
+    :param image: Path to the uncompressed UVOT sky image
     :param src_region_path: Path to the source region file
     :param bkg_region_path: Path to the background region file
     :param overwrite: Overwrite existing files
+    :param manifest_path: Path to the reduction manifest, if inputs are tracked
+    :param source_regions: Region paths of additional named sources, by name
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param extension: Index of a single extension to measure,
+        or None to measure the summed image
     :return: None
     """
-    uvot_dir = swift_obs_dir / "uvot/image"
+    if photometry not in PHOTOMETRY_ENGINES:
+        raise ValueError(
+            f"Unknown photometry engine '{photometry}', "
+            f"choose from {PHOTOMETRY_ENGINES}"
+        )
+
+    uvot_dir = image.parent
+    uvot_filter = filter_dict[image.name[14:16]]
+    uvot_save_path = uvot_dir / f"{uvot_filter}.fits"
 
-    swift_images = unpack_uvot_images(uvot_dir)
+    sources = {None: src_region_path}
+    sources.update(source_regions or {})
 
-    logger.info(f"Found {len(swift_images)} images")
+    if photometry == "quicklook":
+        with span(
+            "reduce_image", obs_id=uvot_dir.parent.parent.name, filter=uvot_filter
+        ):
+            for source, region_path in sources.items():
+                extract_quicklook_source(
+                    image,
+                    src_region_path=region_path,
+                    bkg_region_path=bkg_region_path,
+                    overwrite=overwrite,
+                    manifest_path=manifest_path,
+                    source=source,
+                    extension=extension,
+                )
+        return
 
-    for image in swift_images:
-        uvot_filter = filter_dict[image.name[14:16]]
-        uvot_save_path = uvot_dir / f"{uvot_filter}.fits"
+    # Snapshots are measured on the sky image, and summed images on the
+    # output of uvotimsum
+    manifest = imsum_digest = None
+    source_digests = {x: None for x in sources}
+    if manifest_path is not None:
+        manifest = ReductionManifest(manifest_path)
+        if extension is None:
+            imsum_digest = manifest.get_digest([image], tool="uvotimsum")
+            image_inputs, image_params = [], {"image": imsum_digest}
+        else:
+            image_inputs, image_params = [image], {"extension": extension}
+        source_digests = {
+            source: manifest.get_digest(
+                image_inputs + [region_path, bkg_region_path],
+                tool="uvotsource",
+                **image_params,
+                **UVOTSOURCE_PARAMS,
+            )
+            for source, region_path in sources.items()
+        }
 
+    if extension is not None:
+        with span(
+            "reduce_extension",
+            obs_id=uvot_dir.parent.parent.name,
+            filter=uvot_filter,
+            extension=extension,
+        ):
+            for source, region_path in sources.items():
+                extract_uvot_source(
+                    image,
+                    src_region_path=region_path,
+                    bkg_region_path=bkg_region_path,
+                    overwrite=overwrite,
+                    manifest=manifest,
+                    digest=source_digests[source],
+                    source=source,
+                    extension=extension,
+                )
+        return
+
+    with span("reduce_image", obs_id=uvot_dir.parent.parent.name, filter=uvot_filter):
         try:
             execute_command(
-                cmd=f"uvotimsum {image} {uvot_save_path}",
+                cmd=["uvotimsum", image, uvot_save_path],
                 output_path=uvot_save_path,
                 overwrite=overwrite,
+                manifest=manifest,
+                digest=imsum_digest,
             )
         except subprocess.CalledProcessError as e:
             logger.error(f"Error creating UVOT image: {e}")
-            continue
+            return
 
         if not uvot_save_path.is_file():
-            continue
+            return
+
+        for source, region_path in sources.items():
+            extract_uvot_source(
+                uvot_save_path,
+                src_region_path=region_path,
+                bkg_region_path=bkg_region_path,
+                overwrite=overwrite,
+                manifest=manifest,
+                digest=source_digests[source],
+                source=source,
+            )
+
+
+def extract_uvot_source(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    uvot_save_path: Path,
+    src_region_path: Path,
+    bkg_region_path: Path,
+    overwrite: bool = False,
+    manifest: ReductionManifest | None = None,
+    digest: str | None = None,
+    source: str | None = None,
+    extension: int | None = None,
+):
+    """
+    Function to extract the source photometry from a summed UVOT image,
+    or from a single extension of a UVOT sky image
+
+    :param uvot_save_path: Path to the summed UVOT image, or to the sky image
+        if an extension is given
+    :param src_region_path: Path to the source region file
+    :param bkg_region_path: Path to the background region file
+    :param overwrite: Overwrite existing files
+    :param manifest: Manifest recording the inputs used for each product
+    :param digest: Hash of the inputs for uvotsource
+    :param source: Name of an additional source, or None for the target
+    :param extension: Index of the extension of the sky image, if any
+    :return: None
+    """
+    if extension is None:
+        uvot_filter = uvot_save_path.stem
+        image_arg = f"{uvot_save_path}"
+    else:
+        uvot_filter = filter_dict[uvot_save_path.name[14:16]]
+        image_arg = f"{uvot_save_path}[{extension}]"
+
+    output_path = get_source_output_path(
+        uvot_save_path.parent, uvot_filter, source=source, extension=extension
+    )
+
+    cmd = [
+        "uvotsource",
+        f"image={image_arg}",
+        f"srcreg={src_region_path}",
+        f"bkgreg={bkg_region_path}",
+        f"outfile={output_path}",
+    ] + [f"{key}={val}" for key, val in UVOTSOURCE_PARAMS.items()]
+    try:
+        execute_command(
+            cmd,
+            output_path,
+            overwrite=overwrite,
+            manifest=manifest,
+            digest=digest,
+            log_path=output_path.with_suffix(".log"),
+        )
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error creating UVOT source data: {e}")
+
+
+def extract_quicklook_source(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    image: Path,
+    src_region_path: Path,
+    bkg_region_path: Path,
+    overwrite: bool = False,
+    manifest_path: Path | None = None,
+    source: str | None = None,
+    extension: int | None = None,
+):
+    """
+    Function to measure the source photometry on a UVOT sky image with the
+    quick-look engine, writing an output file like that of uvotsource
 
-        output_path = uvot_dir / f"{uvot_filter}.out"
+    :param image: Path to the uncompressed UVOT sky image
+    :param src_region_path: Path to the source region file
+    :param bkg_region_path: Path to the background region file
+    :param overwrite: Overwrite existing files
+    :param manifest_path: Path to the reduction manifest, if inputs are tracked
+    :param source: Name of an additional source, or None for the target
+    :param extension: Index of a single extension to measure,
+        or None to combine all extensions
+    :return: None
+    """
+    uvot_filter = filter_dict[image.name[14:16]]
+    output_path = get_source_output_path(
+        image.parent, uvot_filter, source=source, extension=extension
+    )
 
-        cmd = (
-            f"uvotsource image={uvot_save_path} srcreg={src_region_path} "
-            f"bkgreg={bkg_region_path} sigma=3.0 outfile={output_path} "
-            f"syserr=yes output=ALL apercorr=CURVEOFGROWTH "
-            f"> {output_path.with_suffix('.log')}"
+    manifest = digest = None
+    if manifest_path is not None:
+        manifest = ReductionManifest(manifest_path)
+        digest = manifest.get_digest(
+            [image, src_region_path, bkg_region_path],
+            tool="quicklook",
+            sigma=QUICKLOOK_SIGMA,
+            extension=extension,
         )
+
+    remove_stale_output(output_path, overwrite, manifest, digest)
+
+    with span("command", tool="quicklook", output=output_path.name) as attrs:
+        if output_path.is_file():
+            logger.info(f"UVOT file already exists: {output_path}")
+            attrs["cache"] = "skip"
+            return
+
+        attrs["cache"] = "miss"
         try:
-            execute_command(cmd, output_path, overwrite=overwrite)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error creating UVOT source data: {e}")
-            continue
+            measurement = quicklook_photometry(
+                image,
+                src_region_path=src_region_path,
+                bkg_region_path=bkg_region_path,
+                uvot_filter=uvot_filter,
+                extension=extension,
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"Error measuring quick-look photometry on {image}: {e}")
+            return
+
+        write_quicklook_output(measurement, output_path)
+        logger.info(f"UVOT file created at: {output_path}")
+        if manifest is not None:
+            manifest.record(output_path, digest)
+
+
+def unpack_single_uvot_obs(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    swift_obs_dir: Path,
+    src_region_path: Path,
+    bkg_region_path: Path,
+    overwrite: bool = False,
+    manifest_path: Path | None = None,
+    source_regions: dict[str, Path] | None = None,
+    photometry: str = "uvotsource",
+    per_extension: bool = False,
+    decompress_workers: int = 1,
+    decompressor: str | None = None,
+):
+    """
+    Function to unpack the swift UVOT observation and create the uvot images
+
+    :param swift_obs_dir: Single swift observation directory
+    :param src_region_path: Path to the source region file
+    :param bkg_region_path: Path to the background region file
+    :param overwrite: Overwrite existing files
+    :param manifest_path: Path to the reduction manifest, if inputs are tracked
+    :param source_regions: Region paths of additional named sources, by name
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param per_extension: Measure each extension of the images separately,
+        instead of the summed images
+    :param decompress_workers: Number of threads to decompress the images
+        of each observation
+    :param decompressor: External decompressor, e.g. "pigz" or "auto",
+        defaulting to the UVOTREDUX_GUNZIP environment variable
+    :return: None
+    """
+    uvot_dir = swift_obs_dir / "uvot/image"
+
+    with span("reduce_obs", obs_id=swift_obs_dir.name):
+        swift_images = unpack_uvot_images(
+            uvot_dir, workers=decompress_workers, decompressor=decompressor
+        )
+
+        logger.info(f"Found {len(swift_images)} images")
+
+        for image in swift_images:
+            for extension in get_reduction_extensions(image, per_extension):
+                reduce_single_uvot_image(
+                    image,
+                    src_region_path=src_region_path,
+                    bkg_region_path=bkg_region_path,
+                    overwrite=overwrite,
+                    manifest_path=manifest_path,
+                    source_regions=source_regions,
+                    photometry=photometry,
+                    extension=extension,
+                )
@@ -0,0 +1,284 @@
+"""
+Module for a persistent per-target store of parsed UVOT results,
+so that only new or changed output files are parsed on each run
+"""
+
+import io
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from uvotredux.utils.profiling import annotate
+
+logger = logging.getLogger(__name__)
+
+RESULTS_STORE_NAME = "uvot_results_store.sqlite"
+
+# Table of results stored as pickles by earlier versions, which are never loaded
+LEGACY_OUTPUTS_TABLE = "outputs"
+
+ColumnReader = Callable[[list[Path]], list[dict[str, np.ndarray]]]
+
+
+def get_results_store_path(directory: Path) -> Path:
+    """
+    Function to get the path to the results store of a target
+
+    :param directory: Target directory containing the swift observations
+    :return: Path to the results store
+    """
+    return Path(directory) / RESULTS_STORE_NAME
+
+
+def encode_columns(cols: dict[str, np.ndarray]) -> tuple[bytes, str]:
+    """
+    Encode the columns of an output file as an npz archive, without pickles.
+
+    Object columns are stored as plain arrays: rows of multi-dimensional
+    columns are stacked, and strings are stored as fixed-width unicode.
+
+    :param cols: Dictionary of column arrays
+    :return: npz bytes, and a JSON list of the name and encoding of each column
+    :raises TypeError: If a column can not be stored without pickles
+    """
+    arrays, encodings = {}, []
+    for i, (name, col) in enumerate(cols.items()):
+        encoding = "array"
+        if col.dtype == object:
+            if len(col) == 0:
+                col, encoding = np.zeros(0), "rows"
+            elif all(isinstance(x, str) for x in col):
+                col, encoding = col.astype(str), "str"
+            elif all(isinstance(x, np.ndarray) for x in col):
+                col, encoding = np.stack(col), "rows"
+            else:
+                raise TypeError(f"Column {name} can not be stored without pickles")
+        arrays[f"c{i}"] = col
+        encodings.append([name, encoding])
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue(), json.dumps(encodings)
+
+
+def decode_columns(data: bytes, encodings: str) -> dict[str, np.ndarray]:
+    """
+    Decode the columns of an output file (see encode_columns)
+
+    :param data: npz bytes
+    :param encodings: JSON list of the name and encoding of each column
+    :return: Dictionary of column arrays
+    """
+    cols = {}
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        for i, (name, encoding) in enumerate(json.loads(encodings)):
+            col = arrays[f"c{i}"]
+            if encoding == "str":
+                col = np.array(col, dtype=object)
+            elif encoding == "rows":
+                rows = np.empty(len(col), dtype=object)
+                rows[:] = list(col)
+                col = rows
+            cols[name] = col
+    return cols
+
+
+class ResultsStore:
+    """
+    Per-target record of the parsed rows of each UVOT output file.
+
+    Each output file is stored with its size and modification time, and the
+    columns parsed from it as numpy arrays, which are loaded without pickles.
+    Files are only parsed again if they change, or if their columns can not
+    be stored.
+    Parsing options (e.g. the projected columns) are also recorded, and the
+    store is cleared if they change.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.base_dir = self.path.parent
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection to the results store, creating tables if needed
+
+        :return: SQLite connection
+        """
+        conn = sqlite3.connect(self.path, timeout=60.0)
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (LEGACY_OUTPUTS_TABLE,),
+        ).fetchone():
+            with conn:
+                conn.execute(f"DROP TABLE IF EXISTS {LEGACY_OUTPUTS_TABLE}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS output_columns (path TEXT PRIMARY KEY, "
+            "size INTEGER, mtime_ns INTEGER, columns BLOB, encodings TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        return conn
+
+    def _key(self, path: Path) -> str:
+        """
+        Get the store key for a path, relative to the target directory
+
+        :param path: Path to a file
+        :return: Key
+        """
+        return os.path.relpath(Path(path).absolute(), self.base_dir.absolute())
+
+    def _check_config(self, conn: sqlite3.Connection, config: dict):
+        """
+        Clear the store if the parsing options have changed
+
+        :param conn: SQLite connection
+        :param config: Parsing options
+        :return: None
+        """
+        value = json.dumps(config, sort_keys=True)
+        row = conn.execute("SELECT value FROM config WHERE key = 'parse'").fetchone()
+        if row is not None and row[0] == value:
+            return
+
+        if row is not None:
+            logger.info("Parse options have changed, clearing the results store")
+        with conn:
+            conn.execute("DELETE FROM output_columns")
+            conn.execute("INSERT OR REPLACE INTO config VALUES ('parse', ?)", (value,))
+
+    def _load(
+        self,
+        conn: sqlite3.Connection,
+        keys: list[str],
+        all_cols: list[dict[str, np.ndarray] | None],
+    ) -> list[dict[str, np.ndarray]]:
+        """
+        Fill in the stored columns of files that were not parsed
+
+        :param conn: SQLite connection
+        :param keys: Store keys of the files
+        :param all_cols: Columns of each file, or None if not yet loaded
+        :return: List of column dictionaries, in the order of the keys
+        """
+        index = {key: i for i, key in enumerate(keys)}
+        for key, data, encodings in conn.execute(
+            "SELECT path, columns, encodings FROM output_columns"
+        ):
+            i = index.get(key)
+            if i is not None and all_cols[i] is None:
+                all_cols[i] = decode_columns(data, encodings)
+        return all_cols
+
+    def _encode_rows(
+        self,
+        parsed: dict[Path, dict[str, np.ndarray]],
+        stats: dict[Path, os.stat_result],
+    ) -> tuple[list[tuple], set[str]]:
+        """
+        Encode the rows of newly parsed files for the store
+
+        :param parsed: Columns of each parsed file
+        :param stats: Stat of each parsed file, from before it was parsed
+        :return: Rows to store, and keys of the files which can not be stored
+        """
+        rows, unstored = [], set()
+        for path, cols in parsed.items():
+            try:
+                data, encodings = encode_columns(cols)
+            except TypeError as e:
+                logger.warning(f"Not storing the results of {path}: {e}")
+                unstored.add(self._key(path))
+                continue
+            stat = stats[path]
+            rows.append(
+                (self._key(path), stat.st_size, stat.st_mtime_ns, data, encodings)
+            )
+        return rows, unstored
+
+    def get_changed_files(self, image_output_files: list[Path]) -> list[Path]:
+        """
+        Get the output files which are not in the store, or have changed
+
+        :param image_output_files: List of UVOT output files
+        :return: List of new or changed files
+        """
+        with closing(self._connect()) as conn:
+            stored = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute(
+                    "SELECT path, size, mtime_ns FROM output_columns"
+                )
+            }
+
+        changed = []
+        for path in image_output_files:
+            stat = path.stat()
+            if stored.get(self._key(path)) != (stat.st_size, stat.st_mtime_ns):
+                changed.append(path)
+        return changed
+
+    def update(
+        self,
+        image_output_files: list[Path],
+        reader: ColumnReader,
+        config: dict | None = None,
+    ) -> list[dict[str, np.ndarray]]:
+        """
+        Update the store for the current output files, and return the columns
+        of all of them.
+
+        New or changed files are parsed with the reader, unchanged files are
+        loaded from the store, and files that no longer exist are removed.
+
+        :param image_output_files: List of all current UVOT output files
+        :param reader: Function to parse the columns of a list of output files
+        :param config: Parsing options used by the reader
+        :return: List of column dictionaries, in the order of the files
+        """
+        with closing(self._connect()) as conn:
+            self._check_config(conn, config if config is not None else {})
+
+        keys = [self._key(x) for x in image_output_files]
+        changed = self.get_changed_files(image_output_files)
+        # Stat before parsing, so files modified while parsing are parsed again
+        stats = {x: x.stat() for x in changed}
+        parsed = dict(zip(changed, reader(changed))) if len(changed) > 0 else {}
+
+        with closing(self._connect()) as conn:
+            deleted = {
+                row[0] for row in conn.execute("SELECT path FROM output_columns")
+            } - set(keys)
+
+            annotate(
+                parsed=len(changed),
+                cache_hits=len(image_output_files) - len(changed),
+                removed=len(deleted),
+            )
+            logger.info(
+                f"Results store: {len(changed)} new or changed output files, "
+                f"{len(image_output_files) - len(changed)} unchanged, "
+                f"{len(deleted)} removed"
+            )
+
+            rows, unstored = self._encode_rows(parsed, stats)
+
+            with conn:
+                conn.executemany(
+                    "DELETE FROM output_columns WHERE path = ?",
+                    [(x,) for x in deleted | unstored],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO output_columns VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+            return self._load(conn, keys, [parsed.get(x) for x in image_output_files])
@@ -0,0 +1,224 @@
+"""
+Module to watch targets for new Swift visits, and reduce them as they appear.
+
+Each target is polled for new observations, reusing its cached archive query so
+that only observations since the latest known one are queried. Only the new
+observations are downloaded and reduced, and the results store means only
+their outputs are parsed. Targets without new data are polled less and less
+often, up to a maximum interval.
+"""
+
+import json
+import logging
+import os
+import shlex
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable
+
+from uvotredux.download.data import (
+    download_single_observation,
+    find_observations,
+    remove_incomplete_downloads,
+)
+from uvotredux.download.fetch import Fetcher, fetch_swift_archive
+from uvotredux.download.regions import (
+    bkg_path,
+    create_regions,
+    get_source_regions,
+    src_path,
+)
+from uvotredux.options import DEFAULT_MAX_POLL_INTERVAL, DEFAULT_POLL_INTERVAL
+from uvotredux.quota import enforce_quota, in_use
+from uvotredux.uvot.manifest import get_manifest_path
+from uvotredux.uvot.output import load_uvot_results
+from uvotredux.uvot.parse import parse_uvot_results
+from uvotredux.uvot.reduce import unpack_single_uvot_obs
+
+logger = logging.getLogger(__name__)
+
+# Environment variable with the target name, for hook commands
+HOOK_TARGET_ENV = "UVOTREDUX_TARGET"
+
+MeasurementHook = Callable[[str, dict], None]
+
+
+def make_command_hook(command: str) -> MeasurementHook:
+    """
+    Make a hook which runs a command for each new measurement, with the
+    measurement as JSON on its standard input and the target name in
+    UVOTREDUX_TARGET
+
+    :param command: Command to run, e.g. "python notify.py"
+    :return: Hook function
+    """
+    argv = shlex.split(command)
+
+    def hook(name: str, measurement: dict):
+        res = subprocess.run(
+            argv,
+            input=json.dumps(measurement),
+            text=True,
+            env={**os.environ, HOOK_TARGET_ENV: name},
+            check=False,
+        )
+        if res.returncode != 0:
+            logger.error(f"Hook '{command}' failed for {name}: {res.returncode}")
+
+    return hook
+
+
+def get_known_observations(directory: Path) -> set[str]:
+    """
+    Get the observations of a target which are already in its results
+
+    :param directory: Target directory
+    :return: Set of observation IDs
+    """
+    try:
+        return set(load_uvot_results(directory, summary=True)["PARENT_DIR"])
+    except FileNotFoundError:
+        return set()
+
+
+def poll_target(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    target: dict,
+    hook: MeasurementHook | None = None,
+    store_dir: Path | None = None,
+    parse_engine: str = "astropy",
+    output_format: str = "csv",
+    photometry: str = "uvotsource",
+    per_extension: bool = False,
+    query_ttl: float = 0.0,
+    quota: int | None = None,
+    fetcher: Fetcher = fetch_swift_archive,
+) -> list[str]:
+    """
+    Poll a target for new observations, and download and reduce them
+
+    :param target: Target record, with "name", "ra", "dec", "output_dir"
+        and the set of "known" observation IDs, which is updated
+    :param hook: Function called with the target name and each new measurement
+    :param store_dir: Shared observation store directory, if used
+    :param parse_engine: Engine used to parse the results ("astropy" or "fast")
+    :param output_format: Format of the results files (see OUTPUT_FORMATS)
+    :param photometry: Photometry engine, "uvotsource" or "quicklook"
+    :param per_extension: Measure each extension of the images separately
+    :param query_ttl: Time in seconds for which a cached archive query is reused.
+        By default the archive is always queried, but only for observations
+        after the latest cached one.
+    :param quota: Disk quota of the data directory in bytes, enforced before
+        new observations are downloaded, if given
+    :param fetcher: Function to fetch a single observation
+    :return: List of new observation IDs which were reduced
+    """
+    directory = Path(target["output_dir"])
+    create_regions(ra=target["ra"], dec=target["dec"], base_dir=directory)
+
+    obs_ids = find_observations(
+        target["ra"], target["dec"], directory=directory, query_ttl=query_ttl
+    )
+    new_obs_ids = sorted(set(obs_ids) - target["known"])
+    if len(new_obs_ids) == 0:
+        return []
+
+    logger.info(f"Found {len(new_obs_ids)} new observations of {target['name']}")
+
+    with in_use(directory):
+        if quota is not None:
+            enforce_quota(directory.parent, quota, store_dir=store_dir)
+
+        remove_incomplete_downloads(directory, store_dir=store_dir)
+        reduced = []
+        for obs_id in new_obs_ids:
+            try:
+                download_single_observation(
+                    obs_id, directory, fetcher=fetcher, store_dir=store_dir
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error(f"Failed to download observation {obs_id}: {e}")
+                continue
+            unpack_single_uvot_obs(
+                directory / obs_id,
+                src_region_path=src_path(directory),
+                bkg_region_path=bkg_path(directory),
+                manifest_path=get_manifest_path(directory),
+                source_regions=get_source_regions(directory),
+                photometry=photometry,
+                per_extension=per_extension,
+            )
+            target["known"].add(obs_id)
+            reduced.append(obs_id)
+
+    if len(reduced) == 0:
+        return []
+
+    parse_uvot_results(directory, engine=parse_engine, output_format=output_format)
+
+    if hook is not None:
+        df = load_uvot_results(directory, output_format=output_format)
+        for _, row in df[df["PARENT_DIR"].isin(reduced)].iterrows():
+            hook(target["name"], json.loads(row.to_json()))
+
+    return reduced
+
+
+def watch_targets(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    targets: list[dict],
+    interval: float = DEFAULT_POLL_INTERVAL,
+    max_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+    hook: MeasurementHook | None = None,
+    max_polls: int | None = None,
+    **kwargs,
+):
+    """
+    Watch targets for new observations, reducing them as they appear.
+
+    Each target is polled every interval. If a poll finds no new observations
+    or fails, the interval of that target is doubled, up to max_interval,
+    and it is reset once new observations are found.
+
+    :param targets: List of target records, with "name", "ra", "dec"
+        and "output_dir" (see uvotredux.batch.resolve_targets)
+    :param interval: Seconds between polls of a target with new data
+    :param max_interval: Maximum seconds between polls of a target
+    :param hook: Function called with the target name and each new measurement
+    :param max_polls: Stop after polling each target this many times,
+        or None to watch forever
+    :param kwargs: Additional arguments for poll_target,
+        e.g. store_dir or output_format
+    :return: None
+    """
+    for target in targets:
+        target["known"] = get_known_observations(Path(target["output_dir"]))
+        target["interval"] = interval
+        target["next_poll"] = time.monotonic()
+        target["n_polls"] = 0
+        logger.info(
+            f"Watching {target['name']} with {len(target['known'])} known observations"
+        )
+
+    while True:
+        active = [x for x in targets if max_polls is None or x["n_polls"] < max_polls]
+        if len(active) == 0:
+            return
+
+        target = min(active, key=lambda x: x["next_poll"])
+        time.sleep(max(0.0, target["next_poll"] - time.monotonic()))
+
+        try:
+            new_obs_ids = poll_target(target, hook=hook, **kwargs)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f"Polling {target['name']} failed: {e}")
+            new_obs_ids = []
+
+        if len(new_obs_ids) > 0:
+            target["interval"] = interval
+        else:
+            target["interval"] = min(2.0 * target["interval"], max_interval)
+        target["next_poll"] = time.monotonic() + target["interval"]
+        target["n_polls"] += 1
+        logger.debug(
+            f"Next poll of {target['name']} in {target['interval']:.0f} seconds"
+        )
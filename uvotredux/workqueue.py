@@ -0,0 +1,483 @@
+"""
+Module for a work queue on the shared data directory, so that any number of
+worker processes, on any node that mounts the directory, can reduce targets
+together without extra services.
+
+The queue is an SQLite database. A target is added as one task per observation,
+which unpacks its images and then adds one task per image. Workers claim tasks
+with a lease, and renew it with heartbeats while the task runs. Tasks whose
+lease expires (e.g. because the node died) are claimed again by other workers.
+Once all the reduction tasks of a target have finished, a final task parses
+its results.
+
+SQLite relies on file locks, so the data directory must be on a filesystem
+with working locks (e.g. NFSv4 or Lustre), mounted at the same path on each node.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Callable
+
+from uvotredux.download.regions import bkg_path, get_source_regions, src_path
+from uvotredux.options import DEFAULT_HEARTBEAT, DEFAULT_LEASE
+from uvotredux.utils.heasoft import get_heasoft_executor
+from uvotredux.uvot.iterate import get_reduction_inputs
+from uvotredux.uvot.manifest import get_manifest_path
+from uvotredux.uvot.parse import parse_uvot_results
+from uvotredux.uvot.reduce import (
+    get_reduction_extensions,
+    reduce_single_uvot_image,
+    unpack_uvot_images,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+DEFAULT_POLL_INTERVAL = 10.0
+
+# Tasks are claimed in this order, so that started targets are finished first
+TASK_PRIORITY = {"parse": 0, "reduce_image": 1, "unpack": 2}
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+class WorkQueue:
+    """
+    Queue of reduction tasks, shared between worker processes and nodes.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lease: float = DEFAULT_LEASE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.path = Path(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection to the queue, creating tables if needed
+
+        :return: SQLite connection
+        """
+        conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS targets (target TEXT PRIMARY KEY, config TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT, kind TEXT, "
+            "priority INTEGER, payload TEXT, status TEXT, attempts INTEGER, "
+            "worker TEXT, lease_until REAL, error TEXT)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, priority, id)"
+        )
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Context manager for a transaction which holds the write lock,
+        so that no two workers can claim the same task
+
+        :return: SQLite connection
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _add_tasks(conn: sqlite3.Connection, target: str, tasks: list[tuple]):
+        """
+        Add tasks for a target
+
+        :param conn: SQLite connection
+        :param target: Target directory
+        :param tasks: List of task kinds and payloads
+        :return: None
+        """
+        conn.executemany(
+            "INSERT INTO tasks (target, kind, priority, payload, status, attempts) "
+            "VALUES (?, ?, ?, ?, 'pending', 0)",
+            [
+                (target, kind, TASK_PRIORITY[kind], json.dumps(payload))
+                for kind, payload in tasks
+            ],
+        )
+
+    def _add_parse_if_finished(self, conn: sqlite3.Connection, target: str):
+        """
+        Add the parse task of a target once all its reduction tasks have finished
+
+        :param conn: SQLite connection
+        :param target: Target directory
+        :return: None
+        """
+        counts = conn.execute(
+            "SELECT SUM(kind != 'parse' AND status IN (?, ?)), SUM(kind = 'parse') "
+            "FROM tasks WHERE target = ?",
+            (*ACTIVE_STATUSES, target),
+        ).fetchone()
+        if not counts[0] and not counts[1]:
+            logger.info(f"All reduction tasks finished for {target}, adding parse")
+            self._add_tasks(conn, target, [("parse", {})])
+
+    def enqueue_target(self, directory: Path, config: dict | None = None) -> int:
+        """
+        Add the reduction of a target to the queue, with one task per observation.
+        Previous tasks of the target are replaced, unless some are still active.
+
+        :param directory: Target directory, with the downloaded observations
+        :param config: Reduction options, e.g. overwrite or output_format
+        :return: Number of tasks added
+        """
+        directory = Path(directory).absolute()
+        all_swift_obs, _, _ = get_reduction_inputs(directory)
+        target = str(directory)
+
+        with self._transaction() as conn:
+            active = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE target = ? AND status IN (?, ?)",
+                (target, *ACTIVE_STATUSES),
+            ).fetchone()[0]
+            if active > 0:
+                logger.warning(f"{target} already has {active} active tasks")
+                return 0
+
+            conn.execute("DELETE FROM tasks WHERE target = ?", (target,))
+            conn.execute(
+                "INSERT OR REPLACE INTO targets VALUES (?, ?)",
+                (target, json.dumps(config if config is not None else {})),
+            )
+            self._add_tasks(
+                conn,
+                target,
+                [("unpack", {"obs_dir": str(x)}) for x in sorted(all_swift_obs)],
+            )
+
+        logger.info(f"Queued {len(all_swift_obs)} observations of {target}")
+        return len(all_swift_obs)
+
+    def _release_expired(self, conn: sqlite3.Connection):
+        """
+        Return tasks with expired leases to the queue,
+        or mark them as failed after too many attempts
+
+        :param conn: SQLite connection
+        :return: None
+        """
+        expired = conn.execute(
+            "SELECT id, target, attempts FROM tasks "
+            "WHERE status = 'running' AND lease_until < ?",
+            (time.time(),),
+        ).fetchall()
+        for row in expired:
+            logger.warning(f"Lease of task {row['id']} expired, releasing it")
+            if row["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', worker = NULL, "
+                    "error = 'lease expired' WHERE id = ?",
+                    (row["id"],),
+                )
+                self._add_parse_if_finished(conn, row["target"])
+            else:
+                conn.execute(
+                    "UPDATE tasks SET status = 'pending', worker = NULL WHERE id = ?",
+                    (row["id"],),
+                )
+
+    def claim(self, worker: str) -> dict | None:
+        """
+        Claim the next pending task
+
+        :param worker: Worker ID
+        :return: Task, with its target config, or None if no task is pending
+        """
+        with self._transaction() as conn:
+            self._release_expired(conn)
+            row = conn.execute(
+                "SELECT tasks.*, targets.config FROM tasks "
+                "JOIN targets ON tasks.target = targets.target "
+                "WHERE status = 'pending' ORDER BY priority, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, time.time() + self.lease, row["id"]),
+            )
+
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        task["config"] = json.loads(task["config"])
+        return task
+
+    def heartbeat(self, task_id: int, worker: str) -> bool:
+        """
+        Renew the lease of a running task
+
+        :param task_id: Task ID
+        :param worker: Worker ID
+        :return: Whether the worker still holds the lease
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_until = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease, task_id, worker),
+            )
+        return cursor.rowcount > 0
+
+    def complete(
+        self, task_id: int, worker: str, new_tasks: list[tuple] | None = None
+    ) -> bool:
+        """
+        Mark a task as done, and add any tasks that follow from it
+
+        :param task_id: Task ID
+        :param worker: Worker ID
+        :param new_tasks: List of kinds and payloads of new tasks for the target
+        :return: Whether the worker still held the lease, so the result was kept
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT target FROM tasks "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (task_id, worker),
+            ).fetchone()
+            if row is None:
+                logger.warning(f"Lease of task {task_id} was lost, result ignored")
+                return False
+            conn.execute(
+                "UPDATE tasks SET status = 'done', worker = NULL WHERE id = ?",
+                (task_id,),
+            )
+            self._add_tasks(conn, row["target"], new_tasks or [])
+            self._add_parse_if_finished(conn, row["target"])
+        return True
+
+    def fail(self, task_id: int, worker: str, error: str):
+        """
+        Record a failed attempt at a task, which is retried
+        until it has been attempted max_attempts times
+
+        :param task_id: Task ID
+        :param worker: Worker ID
+        :param error: Error message
+        :return: None
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT target, attempts FROM tasks "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (task_id, worker),
+            ).fetchone()
+            if row is None:
+                return
+            status = "failed" if row["attempts"] >= self.max_attempts else "pending"
+            conn.execute(
+                "UPDATE tasks SET status = ?, worker = NULL, error = ? WHERE id = ?",
+                (status, error, task_id),
+            )
+            if status == "failed":
+                self._add_parse_if_finished(conn, row["target"])
+
+    def get_status(self) -> list[tuple[str, str, int]]:
+        """
+        Count the tasks of each target by status
+
+        :return: List of target, status and number of tasks
+        """
+        with closing(self._connect()) as conn:
+            return [
+                tuple(row)
+                for row in conn.execute(
+                    "SELECT target, status, COUNT(*) FROM tasks "
+                    "GROUP BY target, status ORDER BY target, status"
+                )
+            ]
+
+    def has_active_tasks(self) -> bool:
+        """
+        Check whether any tasks are pending or running
+
+        :return: Boolean
+        """
+        with closing(self._connect()) as conn:
+            return (
+                conn.execute(
+                    "SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)", ACTIVE_STATUSES
+                ).fetchone()[0]
+                > 0
+            )
+
+
+def run_task(task: dict) -> list[tuple]:
+    """
+    Run a task claimed from the queue
+
+    :param task: Task
+    :return: List of kinds and payloads of the tasks that follow from it
+    """
+    directory = Path(task["target"])
+    config = task["config"]
+    payload = task["payload"]
+
+    if task["kind"] == "unpack":
+        images = unpack_uvot_images(
+            Path(payload["obs_dir"]) / "uvot/image",
+            workers=config.get("decompress_workers", 1),
+            decompressor=config.get("decompressor"),
+        )
+        per_extension = config.get("per_extension", False)
+        return [
+            ("reduce_image", {"image": str(x), "extension": extension})
+            for x in images
+            for extension in get_reduction_extensions(x, per_extension)
+        ]
+
+    if task["kind"] == "reduce_image":
+        reduce_single_uvot_image(
+            Path(payload["image"]),
+            src_region_path=src_path(directory),
+            bkg_region_path=bkg_path(directory),
+            overwrite=config.get("overwrite", False),
+            manifest_path=get_manifest_path(directory),
+            source_regions=get_source_regions(directory),
+            photometry=config.get("photometry", "uvotsource"),
+            extension=payload.get("extension"),
+        )
+        return []
+
+    if task["kind"] == "parse":
+        parse_uvot_results(
+            directory,
+            skyportal=config.get("skyportal", False),
+            engine=config.get("parse_engine", "astropy"),
+            output_format=config.get("output_format", "csv"),
+        )
+        return []
+
+    raise ValueError(f"Unknown task kind '{task['kind']}'")
+
+
+@contextmanager
+def keep_alive(renew: Callable[[], bool], interval: float):
+    """
+    Context manager which calls a renewal function in a background thread,
+    until it returns False or the context exits
+
+    :param renew: Function which renews a lease, and returns whether it succeeded
+    :param interval: Seconds between heartbeats
+    :return: None
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            if not renew():
+                return
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def keep_lease(queue: WorkQueue, task_id: int, worker: str, interval: float):
+    """
+    Context manager which renews the lease of a task in a background thread
+
+    :param queue: Work queue
+    :param task_id: Task ID
+    :param worker: Worker ID
+    :param interval: Seconds between heartbeats
+    :return: None
+    """
+
+    def renew() -> bool:
+        if not queue.heartbeat(task_id, worker):
+            logger.warning(f"Lost the lease of task {task_id}")
+            return False
+        return True
+
+    return keep_alive(renew, interval)
+
+
+def run_worker(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    queue_path: Path,
+    lease: float = DEFAULT_LEASE,
+    heartbeat: float = DEFAULT_HEARTBEAT,
+    wait: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    max_tasks: int | None = None,
+) -> int:
+    """
+    Run a worker, which claims and runs tasks from the queue.
+
+    The worker stops once no tasks are pending or running, unless asked to wait
+    for new tasks. While other workers still run tasks, it polls for the tasks
+    that may follow from them.
+
+    :param queue_path: Path to the work queue
+    :param lease: Seconds for which each claimed task is leased
+    :param heartbeat: Seconds between renewals of the lease
+    :param wait: Keep polling for new tasks when the queue is empty
+    :param poll_interval: Seconds between polls when no task is pending
+    :param max_tasks: Maximum number of tasks to run, or None for no limit
+    :return: Number of tasks run
+    """
+    if heartbeat >= lease:
+        raise ValueError(
+            f"The heartbeat interval ({heartbeat}s) must be shorter "
+            f"than the lease ({lease}s)"
+        )
+
+    queue = WorkQueue(queue_path, lease=lease)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    get_heasoft_executor()
+
+    logger.info(f"Worker {worker} using queue {queue_path}")
+
+    n_tasks = 0
+    while max_tasks is None or n_tasks < max_tasks:
+        task = queue.claim(worker)
+        if task is None:
+            if wait or queue.has_active_tasks():
+                time.sleep(poll_interval)
+                continue
+            break
+
+        logger.info(f"Running {task['kind']} task {task['id']} for {task['target']}")
+        try:
+            with keep_lease(queue, task["id"], worker, heartbeat):
+                new_tasks = run_task(task)
+            queue.complete(task["id"], worker, new_tasks)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f"Task {task['id']} failed: {e}")
+            queue.fail(task["id"], worker, repr(e))
+        n_tasks += 1
+
+    logger.info(f"Worker {worker} finished after {n_tasks} tasks")
+    return n_tasks
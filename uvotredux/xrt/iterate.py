@@ -1,12 +1,17 @@
 """
-Module to iterate over all the Swift UVOT observations in a directory and
-unpack them
+Module to iterate over all the Swift XRT observations in a directory and
+reduce them
 """
 
 import logging
+from concurrent.futures import as_completed
 from pathlib import Path
 
-from uvotredux.utils import get_observation_dirs
+from uvotredux.download.regions import src_path
+from uvotredux.utils.parallel import get_executor
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.uvot.manifest import get_manifest_path
+from uvotredux.xrt.parse import parse_xrt_results
 from uvotredux.xrt.reduce import unpack_single_xrt_obs
 
 logger = logging.getLogger(__name__)
@@ -14,17 +19,22 @@ logger = logging.getLogger(__name__)
 
 def iterate_xrt_reduction(
     directory: Path | None = None,
-    src_region_name: str = "src.reg",
-    bkg_region_name: str = "bkg.reg",
     overwrite: bool = False,
+    workers: int = 1,
+    output_format: str = "csv",
 ):
     """
-    Function to unpack all the swift observations in a directory
+    Function to run xrtpipeline on all the swift observations in a directory,
+    and measure the XRT count rates.
+
+    Each observation is reduced as a separate task on a pool of worker
+    processes, each with its own PFILES directory. Observations which were
+    already reduced from the same inputs are skipped.
 
     :param directory: Directory containing the swift observations
-    :param src_region_name: Path to the source region file
-    :param bkg_region_name: Path to the background region file
     :param overwrite: Overwrite existing files
+    :param workers: Number of worker processes
+    :param output_format: Format of the results file (see OUTPUT_FORMATS)
     :return: None
     """
 
@@ -33,28 +43,41 @@ def iterate_xrt_reduction(
 
     directory = Path(directory)
 
-    logger.info(f"Unpacking Swift observations in directory: {directory}")
+    logger.info(f"Reducing Swift XRT observations in directory: {directory}")
 
-    all_swift_obs = get_observation_dirs(directory)
+    all_swift_obs = [
+        x for x in get_observation_dirs(directory) if (x / "xrt/event").is_dir()
+    ]
 
     if len(all_swift_obs) == 0:
         raise FileNotFoundError(
-            f"No Swift observations found in directory: {directory}"
+            f"No Swift XRT observations found in directory: {directory}"
         )
 
-    src_region_path = directory / src_region_name
-    bkg_region_path = directory / bkg_region_name
+    src_region_path = src_path(directory)
+    if not src_region_path.is_file():
+        raise FileNotFoundError(f"Region file {src_region_path} not found")
 
-    for path in [src_region_path, bkg_region_path]:
-        if not path.is_file():
-            raise FileNotFoundError(f"Region file {path} not found")
+    reduce_kwargs = {
+        "src_region_path": src_region_path,
+        "overwrite": overwrite,
+        "manifest_path": get_manifest_path(directory),
+    }
 
-    for swift_obs in sorted(all_swift_obs):
-        unpack_single_xrt_obs(
-            swift_obs,
-            src_region_path=src_region_path,
-            # bkg_region_path=bkg_region_path,
-            # overwrite=overwrite,
-        )
+    logger.info(
+        f"Reducing {len(all_swift_obs)} XRT observations with {workers} workers"
+    )
+
+    if workers > 1:
+        with get_executor(workers) as executor:
+            futures = [
+                executor.submit(unpack_single_xrt_obs, swift_obs, **reduce_kwargs)
+                for swift_obs in sorted(all_swift_obs)
+            ]
+            for future in as_completed(futures):
+                future.result()
+    else:
+        for swift_obs in sorted(all_swift_obs):
+            unpack_single_xrt_obs(swift_obs, **reduce_kwargs)
 
-    # parse_uvot_results(directory, skyportal=skyportal)
+    parse_xrt_results(directory, output_format=output_format)
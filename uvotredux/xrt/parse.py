@@ -0,0 +1,161 @@
+"""
+Module to measure the XRT count rates from the cleaned event files,
+and combine them into a results table.
+
+Events between 0.3 and 10 keV are counted in a circle around the source,
+and the background is estimated from an annulus around it. Rates are not
+corrected for the PSF fraction outside the circle or for pile-up.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from uvotredux.download.regions import load_circle_region, src_path
+from uvotredux.options import OUTPUT_FORMATS
+from uvotredux.utils.paths import get_observation_dirs
+from uvotredux.utils.profiling import span
+from uvotredux.uvot.output import check_output_format, write_uvot_results
+from uvotredux.uvot.parse import add_time_columns
+from uvotredux.xrt.reduce import get_xrt_output_dir
+
+logger = logging.getLogger(__name__)
+
+XRT_RESULTS_NAME = "xrt_results"
+
+# Source circle (20 pixels), and background annulus, in arcseconds
+XRT_SRC_RADIUS_ARCSEC = 47.1
+XRT_BKG_RADII_ARCSEC = (70.7, 165.0)
+
+# PI channels of 0.3 to 10 keV (10 eV per channel)
+XRT_PI_RANGE = (30, 1000)
+
+
+def get_xrt_results_path(directory: Path, output_format: str = "csv") -> Path:
+    """
+    Get the path of the XRT results file of a target
+
+    :param directory: Target directory
+    :param output_format: Output format
+    :return: Path to the results file
+    """
+    return Path(directory) / f"{XRT_RESULTS_NAME}{OUTPUT_FORMATS[output_format]}"
+
+
+def get_event_wcs(header: fits.Header, columns: list[str]) -> WCS:
+    """
+    Get the sky coordinate system of the X and Y columns of an event file
+
+    :param header: Header of the events extension
+    :param columns: Names of the columns in the events extension
+    :return: WCS, with one-based pixel coordinates as in the X and Y columns
+    """
+    wcs = WCS(naxis=2)
+    for i, name in enumerate(["X", "Y"]):
+        n = columns.index(name) + 1
+        wcs.wcs.ctype[i] = header[f"TCTYP{n}"]
+        wcs.wcs.crpix[i] = header[f"TCRPX{n}"]
+        wcs.wcs.crval[i] = header[f"TCRVL{n}"]
+        wcs.wcs.cdelt[i] = header[f"TCDLT{n}"]
+    return wcs
+
+
+def measure_xrt_events(event_path: Path, ra: float, dec: float) -> dict:
+    """
+    Measure the count rate of a source in a cleaned XRT event file
+
+    :param event_path: Path to the cleaned event file
+    :param ra: Right Ascension of the source in degrees
+    :param dec: Declination of the source in degrees
+    :return: Dictionary with the measurement
+    """
+    with fits.open(event_path, memmap=True) as hdul:
+        hdu = hdul["EVENTS"]
+        header = hdu.header
+        columns = list(hdu.columns.names)
+        wcs = get_event_wcs(header, columns)
+        pi = hdu.data["PI"]
+        mask = (pi >= XRT_PI_RANGE[0]) & (pi <= XRT_PI_RANGE[1])
+        x = np.asarray(hdu.data["X"][mask], dtype=float)
+        y = np.asarray(hdu.data["Y"][mask], dtype=float)
+
+    # Pixel coordinates are zero-based in astropy, and one-based in the columns
+    x0, y0 = wcs.world_to_pixel_values(ra, dec)
+    scale = abs(wcs.wcs.cdelt[0]) * 3600.0
+    radius = np.hypot(x - float(x0) - 1.0, y - float(y0) - 1.0) * scale
+
+    src_counts = int(np.sum(radius <= XRT_SRC_RADIUS_ARCSEC))
+    bkg_counts = int(
+        np.sum(
+            (radius >= XRT_BKG_RADII_ARCSEC[0]) & (radius <= XRT_BKG_RADII_ARCSEC[1])
+        )
+    )
+    bkg_scale = XRT_SRC_RADIUS_ARCSEC**2.0 / (
+        XRT_BKG_RADII_ARCSEC[1] ** 2.0 - XRT_BKG_RADII_ARCSEC[0] ** 2.0
+    )
+
+    exposure = float(header.get("EXPOSURE", header.get("ONTIME", 0.0)))
+    tstart, tstop = float(header["TSTART"]), float(header["TSTOP"])
+    rate = rate_err = np.nan
+    if exposure > 0.0:
+        rate = (src_counts - bkg_counts * bkg_scale) / exposure
+        rate_err = float(np.sqrt(src_counts + bkg_counts * bkg_scale**2.0)) / exposure
+
+    return {
+        "MET": 0.5 * (tstart + tstop),
+        "TSTART": tstart,
+        "TSTOP": tstop,
+        "MODE": str(header.get("DATAMODE", event_path.name[14:16])).strip(),
+        "EXPOSURE": exposure,
+        "RA": ra,
+        "DEC": dec,
+        "SRC_COUNTS": src_counts,
+        "BKG_COUNTS": bkg_counts,
+        "BKG_SCALE": bkg_scale,
+        "RATE": rate,
+        "RATE_ERR": rate_err,
+    }
+
+
+def parse_xrt_results(
+    directory: Path,
+    output_format: str = "csv",
+) -> pd.DataFrame:
+    """
+    Function to measure the XRT count rates of every observation of a target,
+    and save them as a results table
+
+    :param directory: Directory containing the swift observations
+    :param output_format: Format of the results file (see OUTPUT_FORMATS)
+    :return: DataFrame with the results
+    """
+    check_output_format(output_format)
+    directory = Path(directory)
+    ra, dec, _ = load_circle_region(src_path(directory))
+
+    rows = []
+    for swift_obs in sorted(get_observation_dirs(directory)):
+        for event_path in sorted(get_xrt_output_dir(swift_obs).glob("sw*x*po_cl.evt*")):
+            logger.info(f"Measuring XRT count rate in: {event_path}")
+            row = measure_xrt_events(event_path, ra, dec)
+            row["PARENT_DIR"] = swift_obs.name
+            rows.append(row)
+
+    if len(rows) == 0:
+        raise FileNotFoundError(f"No XRT event files found in directory: {directory}")
+
+    with span("write_results", format=output_format, n_rows=len(rows)):
+        df = pd.DataFrame(rows)
+        add_time_columns(df)
+        df["PARENT_DIR"] = df.pop("PARENT_DIR")
+        df.sort_values(by="MET", inplace=True, ignore_index=True)
+        write_uvot_results(
+            df, get_xrt_results_path(directory, output_format), output_format
+        )
+
+    logger.info(f"Found {len(df)} XRT results")
+    return df
@@ -3,65 +3,112 @@ Module to reduce XRT data
 """
 
 import logging
+import subprocess
 from pathlib import Path
 
+from uvotredux.download.regions import load_circle_region
+from uvotredux.utils.profiling import span
+from uvotredux.uvot.manifest import ReductionManifest
+from uvotredux.uvot.reduce import execute_command
+
 logger = logging.getLogger(__name__)
 
+XRTPIPELINE_PARAMS = {
+    "createexpomap": "no",
+    "cleanup": "yes",
+    "clobber": "yes",
+}
+
+XRTPIPELINE_LOG_NAME = "xrtpipeline.log"
+
+
+def get_xrt_output_dir(swift_obs_dir: Path) -> Path:
+    """
+    Function to get the directory of the xrtpipeline products of an observation
+
+    :param swift_obs_dir: Single swift observation directory
+    :return: Output directory, next to the observation directory
+    """
+    return swift_obs_dir.parent / (swift_obs_dir.name + "_xrt")
+
+
+def get_xrt_inputs(swift_obs_dir: Path) -> list[Path]:
+    """
+    Function to get the input files of xrtpipeline for an observation,
+    i.e. the XRT event and housekeeping files and the auxiliary files
+
+    :param swift_obs_dir: Single swift observation directory
+    :return: Sorted list of input files
+    """
+    return sorted(
+        x
+        for subdir in ["xrt", "auxil"]
+        for x in (swift_obs_dir / subdir).rglob("*")
+        if x.is_file() and x.name != XRTPIPELINE_LOG_NAME
+    )
+
 
 def unpack_single_xrt_obs(
     swift_obs_dir: Path,
     src_region_path: Path,
-    # bkg_region_path: Path,
-    # overwrite: bool = False,
+    overwrite: bool = False,
+    manifest_path: Path | None = None,
 ):
     """
-    Function to unpack the swift XRT observation and create the XRT images
+    Function to run xrtpipeline on a single swift XRT observation,
+    creating the cleaned event files.
+
+    If a manifest is provided, the observation is skipped if it was already
+    processed from the same inputs and source position.
 
     :param swift_obs_dir: Single swift observation directory
     :param src_region_path: Path to the source region file
-    :param bkg_region_path: Path to the background region file
     :param overwrite: Overwrite existing files
+    :param manifest_path: Path to the reduction manifest, if inputs are tracked
     :return: None
     """
     xrt_indir = swift_obs_dir / "xrt/event"
+    if not xrt_indir.is_dir():
+        logger.info(f"No XRT events found for observation: {swift_obs_dir}")
+        return
 
-    xrt_outdir = swift_obs_dir.parent / (swift_obs_dir.name + "_xrt")
+    xrt_outdir = get_xrt_output_dir(swift_obs_dir)
     xrt_outdir.mkdir(parents=True, exist_ok=True)
+    log_path = xrt_outdir / XRTPIPELINE_LOG_NAME
 
-    # swift_events = [x for x in xrt_indir.glob("*_uf.evt") if x.is_file()]
-    # swift_compressed_events = [
-    #   x for x in xrt_indir.glob("*_uf.evt.gz") if x.is_file()
-    # ]
-    #
-    # logger.info(f"Unpacking Swift observation: {swift_obs_dir}")
-    #
-    # logger.info(f"Found {len(swift_compressed_events)} compressed events")
-    #
-    # for image in swift_compressed_events:
-    #     uncompressed_image = image.with_suffix("")
-    #     if not uncompressed_image.is_file():
-    #         logger.info(f"Uncompressing image: {image}")
-    #         with gzip.open(image, "rb") as f_in:
-    #             with open(uncompressed_image, "wb") as f_out:
-    #                 f_out.write(f_in.read())
-    #         swift_events.append(uncompressed_image)
-    #
-    # logger.info(f"Found {len(swift_events)} events")
-
-    with open(src_region_path, "r", encoding="utf8") as f:
-        src_region = f.read()
-        ra, dec, _ = src_region.split("(")[1].split(",")
-        ra = ra.replace(":", " ")
-        dec = dec.replace(":", " ")
-
-    # for event in swift_events:
-    #     print(event)
-    #
-    cmd = (
-        f"xrtpipeline indir={swift_obs_dir} outdir={xrt_outdir} "
-        f"steminputs={swift_obs_dir.name} "
-        f"stemoutputs={swift_obs_dir.name} clobber=yes srcra='{ra}' "
-        f"srcdec='{dec}' > {xrt_indir / 'xrtpipeline.log'} "
-    )
+    ra, dec, _ = load_circle_region(src_region_path)
+
+    manifest = digest = None
+    if manifest_path is not None:
+        manifest = ReductionManifest(manifest_path)
+        digest = manifest.get_digest(
+            get_xrt_inputs(swift_obs_dir),
+            tool="xrtpipeline",
+            srcra=ra,
+            srcdec=dec,
+            **XRTPIPELINE_PARAMS,
+        )
+
+    cmd = [
+        "xrtpipeline",
+        f"indir={swift_obs_dir}",
+        f"outdir={xrt_outdir}",
+        f"steminputs=sw{swift_obs_dir.name}",
+        f"stemoutputs=sw{swift_obs_dir.name}",
+        f"srcra={ra}",
+        f"srcdec={dec}",
+    ] + [f"{key}={val}" for key, val in XRTPIPELINE_PARAMS.items()]
 
-    print(cmd)
+    # The log is only recorded in the manifest once xrtpipeline has succeeded
+    with span("reduce_xrt_obs", obs_id=swift_obs_dir.name):
+        try:
+            execute_command(
+                cmd,
+                output_path=log_path,
+                overwrite=overwrite,
+                manifest=manifest,
+                digest=digest,
+                log_path=log_path,
+            )
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error running xrtpipeline: {e}")